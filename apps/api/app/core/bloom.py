@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+from hashlib import blake2b
+
+from sqlalchemy import and_, or_, select, func
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import cache_bus
+from app.core.config import settings
+from app.db import database, models
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Sized for `capacity` items at `error_rate` false positives. Uses double
+    hashing on a single blake2b digest to derive the k bit positions.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        # Setting a bit is a read-modify-write on a byte, so writers serialize
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str) -> None:
+        positions = self._positions(key)
+        with self._lock:
+            changed = False
+            for pos in positions:
+                byte, mask = pos >> 3, 1 << (pos & 7)
+                if not self._bits[byte] & mask:
+                    self._bits[byte] |= mask
+                    changed = True
+            # Re-adding a key sets no new bit, so it isn't counted twice
+            if changed:
+                self.count += 1
+
+    def update(self, keys) -> None:
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_false_positive_rate(self) -> float:
+        """Measured from the fraction of bits currently set."""
+        set_bits = int.from_bytes(self._bits, "little").bit_count()
+        return (set_bits / self.num_bits) ** self.num_hashes
+
+
+class ShortCodeFilter:
+    """
+    Membership index over every short code in the `links` table.
+
+    If the filter says a code is absent it definitely is, so the redirect can
+    answer 404 without a query of its own. Until the first build finishes
+    every lookup is treated as "maybe", i.e. goes to the database as before.
+
+    Bloom filters can't forget: deleted codes stay "maybe" (and cost a query)
+    until the next rebuild, which runs once deletions pass a share of the
+    filter or it fills past its capacity.
+
+    New codes from other workers arrive over the cache bus when Redis is
+    configured, and in any case from a periodic scan of the links created
+    since the previous scan started, minus `refresh_margin` for transactions
+    that commit after rows created later than theirs. A miss is rejected
+    outright while the last scan started less than `refresh_interval` ago,
+    so unknown codes don't reach the database; only when the periodic scan
+    has fallen behind does a miss wait for a fresh one, which concurrent
+    misses share.
+    """
+
+    def __init__(self, enabled: bool, error_rate: float, min_capacity: int, chunk_size: int,
+                 refresh_interval: float, refresh_margin: float, stale_ratio: float):
+        self.enabled = enabled
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.chunk_size = chunk_size
+        self.refresh_interval = refresh_interval
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.stale_ratio = stale_ratio
+        self._bloom: BloomFilter | None = None
+        self._task: asyncio.Task | None = None
+        self._refreshing: asyncio.Future | None = None
+        # Event loop time the last scan started at
+        self._refresh_started = float("-inf")
+        # The next scan reads links created at or after this
+        self.scanned_since: datetime | None = None
+        self.deleted = 0
+        self.rebuilds = 0
+        self.refreshes = 0
+        self.rejected = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    async def might_exist(self, short_code: str) -> bool:
+        bloom = self._bloom
+        if bloom is None or short_code in bloom:
+            return True
+        now = asyncio.get_running_loop().time()
+        # A code created by another worker since then arrives over the bus or with the next scan
+        if now - self._refresh_started <= self.refresh_interval:
+            self.rejected += 1
+            return False
+        # The periodic scan is behind (stalled, or failing): don't trust the filter without one
+        try:
+            await self._refreshed_after(now)
+        except Exception:
+            logger.exception("Error refreshing short code filter, treating %r as maybe", short_code)
+            return True
+        if short_code in self._bloom:
+            return True
+        self.rejected += 1
+        return False
+
+    def add(self, short_code: str, broadcast: bool = True) -> None:
+        bloom = self._bloom
+        if bloom is not None:
+            bloom.add(short_code)
+        if broadcast:
+            cache_bus.publish("short-code-added", short_code=short_code)
+
+    def discard(self, *short_codes: str) -> None:
+        """Records deletions; their bits are only cleared by the next rebuild."""
+        if short_codes:
+            self.count_deleted(len(short_codes))
+            cache_bus.publish("short-codes-deleted", count=len(short_codes))
+
+    def count_deleted(self, count: int) -> None:
+        self.deleted += count
+
+    def needs_rebuild(self) -> bool:
+        bloom = self._bloom
+        if bloom is None:
+            return True
+        return bloom.count > bloom.capacity or self.deleted > bloom.count * self.stale_ratio
+
+    async def _load_all(self, bloom: BloomFilter) -> None:
+        """
+        Adds every code, one keyset-paginated chunk at a time so neither
+        memory nor a pool connection is held for the whole table.
+        """
+        after_id = 0
+        while True:
+            async with database.AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(models.Link.id, models.Link.short_code)
+                    .where(models.Link.id > after_id)
+                    .order_by(models.Link.id)
+                    .limit(self.chunk_size)
+                )
+                rows = result.all()
+            if not rows:
+                return
+            await run_in_threadpool(bloom.update, [row.short_code for row in rows])
+            after_id = rows[-1].id
+            if len(rows) < self.chunk_size:
+                return
+
+    async def _load_since(self, bloom: BloomFilter, since: datetime) -> None:
+        """Adds the codes of links created at or after `since`, in (created_at, id) chunks."""
+        link = models.Link
+        after = None
+        while True:
+            query = select(link.id, link.short_code, link.created_at).where(link.created_at >= since)
+            if after is not None:
+                query = query.where(or_(
+                    link.created_at > after[0],
+                    and_(link.created_at == after[0], link.id > after[1]),
+                ))
+            async with database.AsyncSessionLocal() as db:
+                result = await db.execute(query.order_by(link.created_at, link.id).limit(self.chunk_size))
+                rows = result.all()
+            if not rows:
+                return
+            await run_in_threadpool(bloom.update, [row.short_code for row in rows])
+            after = (rows[-1].created_at, rows[-1].id)
+            if len(rows) < self.chunk_size:
+                return
+
+    async def rebuild(self) -> None:
+        """Builds a fresh filter from the links table and swaps it in."""
+        async with database.AsyncSessionLocal() as db:
+            max_id = (await db.execute(select(func.max(models.Link.id)))).scalar() or 0
+        # Leave headroom for growth so the filter isn't rebuilt right away
+        bloom = BloomFilter(max(self.min_capacity, int(max_id * 1.5)), self.error_rate)
+        deleted_before = self.deleted
+        started = datetime.utcnow()
+        await self._load_all(bloom)
+        self._bloom = bloom
+        self.scanned_since = started - self.refresh_margin
+        self.deleted -= deleted_before
+        self.rebuilds += 1
+        # Catch codes created while the build was running, in a scan into the new filter
+        await self._refreshed_after(asyncio.get_running_loop().time())
+
+    async def refresh(self) -> None:
+        """Adds codes created since the last scan (e.g. by other workers). Concurrent calls share a scan."""
+        if self._bloom is None:
+            return
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh())
+        await asyncio.shield(self._refreshing)
+
+    async def _refresh(self) -> None:
+        try:
+            bloom = self._bloom
+            self._refresh_started = asyncio.get_running_loop().time()
+            started = datetime.utcnow()
+            await self._load_since(bloom, self.scanned_since)
+            # A scan into a filter replaced meanwhile doesn't count for the new one
+            if self._bloom is bloom:
+                self.scanned_since = max(self.scanned_since, started - self.refresh_margin)
+            self.refreshes += 1
+        finally:
+            self._refreshing = None
+
+    async def _refreshed_after(self, moment: float) -> None:
+        """Waits for a scan that started at or after `moment` (event loop time) to finish."""
+        while self._bloom is not None and self._refresh_started < moment:
+            await self.refresh()
+
+    async def _run(self):
+        while True:
+            try:
+                if self.needs_rebuild():
+                    await self.rebuild()
+                else:
+                    await self.refresh()
+            except Exception:
+                logger.exception("Error refreshing short code filter")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self):
+        """Builds the filter in the background. Called from the app lifespan."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        bloom = self._bloom
+        if bloom is None:
+            return {"enabled": self.enabled, "ready": False}
+        return {
+            "enabled": self.enabled,
+            "ready": True,
+            "capacity": bloom.capacity,
+            "count": bloom.count,
+            "num_bits": bloom.num_bits,
+            "num_hashes": bloom.num_hashes,
+            "memory_bytes": bloom.memory_bytes,
+            "target_false_positive_rate": bloom.error_rate,
+            "estimated_false_positive_rate": bloom.estimated_false_positive_rate(),
+            "scanned_since": self.scanned_since.isoformat(),
+            "deleted_since_rebuild": self.deleted,
+            "rebuilds": self.rebuilds,
+            "refreshes": self.refreshes,
+            "rejected_lookups": self.rejected,
+        }
+
+
+# Single, importable instance started and stopped by the app lifespan
+short_code_filter = ShortCodeFilter(
+    enabled=settings.SHORT_CODE_FILTER_ENABLED,
+    error_rate=settings.SHORT_CODE_FILTER_ERROR_RATE,
+    min_capacity=settings.SHORT_CODE_FILTER_MIN_CAPACITY,
+    chunk_size=settings.SHORT_CODE_FILTER_CHUNK_SIZE,
+    refresh_interval=settings.SHORT_CODE_FILTER_REFRESH_SECONDS,
+    refresh_margin=settings.SHORT_CODE_FILTER_REFRESH_MARGIN_SECONDS,
+    stale_ratio=settings.SHORT_CODE_FILTER_STALE_RATIO,
+)
+
+# Keep the filters of other workers in step without waiting for their next scan
+cache_bus.subscribe("short-code-added", lambda payload: short_code_filter.add(payload["short_code"], broadcast=False))
+cache_bus.subscribe("short-codes-deleted", lambda payload: short_code_filter.count_deleted(payload["count"]))
@@ -0,0 +1,146 @@
+import csv
+import json
+from typing import AsyncIterator, NamedTuple, Optional
+
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+
+# Longest accepted line; anything longer is reported and skipped, so a body
+# without newlines can't grow the buffer without bound
+MAX_LINE_BYTES = 8192
+
+MAX_URL_LENGTH = 255
+MAX_TAG_LENGTH = 100
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streams a response while the request body is still being read.
+
+    On ASGI < 2.4 servers (uvicorn) Starlette's StreamingResponse watches
+    `receive` for a disconnect while streaming, which would swallow the body
+    chunks the generator still has to read. A client that goes away is
+    noticed anyway: reading the body raises ClientDisconnect, and so does
+    sending to it.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+class BulkRow(NamedTuple):
+    """One parsed line of a bulk upload; `error` is set when it can't be used."""
+    line: int
+    original_url: Optional[str] = None
+    tag: Optional[str] = None
+    error: Optional[str] = None
+
+
+def upload_format(content_type: str | None) -> str | None:
+    """"csv" or "ndjson" for a request Content-Type, None if unsupported."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return FORMATS.get(media_type)
+
+
+def _line_text(line: bytes, skipped: bool) -> str | None:
+    line = line.rstrip(b"\r")
+    if skipped or len(line) > MAX_LINE_BYTES:
+        return None
+    return line.decode("utf-8", errors="replace")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str | None]]:
+    """
+    Splits a streamed body into (line number, text) pairs without reading it
+    all. Lines longer than MAX_LINE_BYTES, in encoded bytes, come out as
+    (line number, None).
+    """
+    # Split before decoding: a newline byte is never part of a multi-byte
+    # UTF-8 character, and lengths are then counted in bytes
+    buffer = b""
+    line_no = 0
+    skipping = False
+    async for chunk in chunks:
+        lines = (buffer + chunk).split(b"\n")
+        # The last piece has no newline yet, the next chunk continues it
+        buffer = lines.pop()
+        for line in lines:
+            line_no += 1
+            yield line_no, _line_text(line, skipping)
+            skipping = False
+        if len(buffer) > MAX_LINE_BYTES:
+            # Drop the rest of this line, it's reported once its newline arrives
+            buffer = b""
+            skipping = True
+    if buffer or skipping:
+        yield line_no + 1, _line_text(buffer, skipping)
+
+
+def _validate(line: int, original_url, tag) -> BulkRow:
+    if not isinstance(original_url, str) or not original_url.strip():
+        return BulkRow(line, error="original_url is required")
+    original_url = original_url.strip()
+    if len(original_url) > MAX_URL_LENGTH:
+        return BulkRow(line, error=f"original_url is longer than {MAX_URL_LENGTH} characters")
+    if tag is not None and not isinstance(tag, str):
+        return BulkRow(line, error="tag must be a string")
+    tag = (tag.strip() or None) if tag else None
+    if tag and len(tag) > MAX_TAG_LENGTH:
+        return BulkRow(line, error=f"tag is longer than {MAX_TAG_LENGTH} characters")
+    return BulkRow(line, original_url=original_url, tag=tag)
+
+
+async def parse_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[BulkRow]:
+    """
+    Parses a streamed CSV or NDJSON upload of (original_url, tag) records,
+    one record per line; blank lines are skipped. A CSV header row naming
+    the columns is optional. NDJSON lines are objects with the same keys.
+    """
+    columns = None
+    async for line_no, text in iter_lines(chunks):
+        if text is None:
+            yield BulkRow(line_no, error=f"line is longer than {MAX_LINE_BYTES} bytes")
+            continue
+        if not text.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield BulkRow(line_no, error=f"invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield BulkRow(line_no, error="each line must be a JSON object")
+                continue
+            yield _validate(line_no, record.get("original_url"), record.get("tag"))
+            continue
+
+        try:
+            fields = next(csv.reader([text]))
+        except csv.Error as e:
+            yield BulkRow(line_no, error=f"invalid CSV: {e}")
+            continue
+        if columns is None:
+            columns = {"original_url": 0, "tag": 1}
+            header = [field.strip().lower() for field in fields]
+            if "original_url" in header:
+                columns = {name: header.index(name) for name in ("original_url", "tag") if name in header}
+                continue
+        url_index, tag_index = columns.get("original_url"), columns.get("tag")
+        yield _validate(
+            line_no,
+            fields[url_index] if url_index is not None and url_index < len(fields) else None,
+            fields[tag_index] if tag_index is not None and tag_index < len(fields) else None,
+        )
@@ -0,0 +1,474 @@
+import json
+import logging
+import queue
+import threading
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Callable, NamedTuple, Optional
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional, without it every cache is process-local
+    redis = None
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+# --- Cached values ---
+
+class CachedLink(NamedTuple):
+    """The minimal slice of a Link the redirect endpoint needs."""
+    id: int
+    original_url: str
+    expires_at: Optional[datetime]
+
+    def to_json(self) -> list:
+        return [self.id, self.original_url, self.expires_at.isoformat() if self.expires_at else None]
+
+    @classmethod
+    def from_json(cls, data: list) -> "CachedLink":
+        link_id, original_url, expires_at = data
+        return cls(link_id, original_url, datetime.fromisoformat(expires_at) if expires_at else None)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The authenticated user as seen by the endpoints. A plain value rather
+    than an ORM object so it can be cached and shared between requests.
+    """
+    id: int
+    email: str
+    created_at: Optional[datetime]
+    is_active: bool
+    is_superuser: bool
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            created_at=user.created_at,
+            is_active=bool(user.is_active),
+            is_superuser=bool(user.is_superuser),
+            token_version=user.token_version or 0,
+        )
+
+    def to_json(self) -> dict:
+        data = asdict(self)
+        data["created_at"] = self.created_at.isoformat() if self.created_at else None
+        return data
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Principal":
+        created_at = data.get("created_at")
+        return cls(**{**data, "created_at": datetime.fromisoformat(created_at) if created_at else None})
+
+
+# --- Backends ---
+
+class CacheBackend:
+    """
+    A single cache tier. Sync methods are used from the threadpool, the
+    async ones from the event loop; backends without I/O can keep the
+    default async methods, which just call the sync ones.
+    """
+
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+    async def aget(self, key: str) -> Any:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    async def adelete(self, *keys: str) -> None:
+        self.delete(*keys)
+
+
+class InProcessBackend(CacheBackend):
+    """Bounded LRU + TTL cache in this process's memory."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Sync endpoints run in the threadpool, so every access takes the lock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl_seconds": self._cache.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Cache tier on a Redis-protocol server, shared by every worker and node.
+    Values are stored as JSON under `<namespace>:<key>`.
+
+    `delete()` leaves a tombstone for `tombstone_ttl` seconds and `set()`
+    only writes absent keys, so a value loaded from the database before a
+    delete and set after it can't bring the key back.
+    """
+
+    # Not valid JSON, so it can't be mistaken for a value
+    TOMBSTONE = "!deleted"
+
+    def __init__(self, client, async_client, namespace: str, ttl: int, tombstone_ttl: int):
+        self._client = client
+        self._async_client = async_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _loads(self, raw) -> Any:
+        if raw is None or raw == self.TOMBSTONE:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def get(self, key: str) -> Any:
+        return self._loads(self._client.get(self._key(key)))
+
+    def set(self, key: str, value: Any) -> None:
+        self._client.set(self._key(key), json.dumps(value), ex=self.ttl, nx=True)
+
+    def _tombstones(self, pipeline, keys) -> None:
+        for key in keys:
+            pipeline.set(self._key(key), self.TOMBSTONE, ex=self.tombstone_ttl)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            with self._client.pipeline(transaction=False) as pipeline:
+                self._tombstones(pipeline, keys)
+                pipeline.execute()
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=f"{self.namespace}:*"):
+            self._client.delete(key)
+
+    async def aget(self, key: str) -> Any:
+        return self._loads(await self._async_client.get(self._key(key)))
+
+    async def aset(self, key: str, value: Any) -> None:
+        await self._async_client.set(self._key(key), json.dumps(value), ex=self.ttl, nx=True)
+
+    async def adelete(self, *keys: str) -> None:
+        if keys:
+            async with self._async_client.pipeline(transaction=False) as pipeline:
+                self._tombstones(pipeline, keys)
+                await pipeline.execute()
+
+    def stats(self) -> dict:
+        return {"namespace": self.namespace, "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+# --- Two-tier cache ---
+
+class TieredCache:
+    """
+    Near (in-process) cache in front of an optional far (shared) tier.
+
+    Reads try near, then far, then give up so the caller can load from the
+    database and `set()` the result into both tiers. `invalidate()` drops the
+    keys from near and far right away, then the bus tells every other node
+    to drop its near copy.
+
+    A key stays tombstoned for `tombstone_ttl` seconds after it's dropped,
+    in near and far: a `set()` of a value read before the delete but
+    finishing after it is ignored instead of caching the stale value for
+    the whole TTL.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: int, tombstone_ttl: int,
+                 encode: Callable[[Any], Any], decode: Callable[[Any], Any]):
+        self.name = name
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.encode = encode
+        self.decode = decode
+        self.near: CacheBackend = InProcessBackend(maxsize=maxsize, ttl=ttl)
+        self.far: CacheBackend | None = None
+        self._tombstones = TTLCache(maxsize=maxsize, ttl=tombstone_ttl)
+        # Held across the tombstone check and the near write in set()
+        self._lock = threading.Lock()
+
+    def _set_near(self, key: str, value: Any) -> bool:
+        with self._lock:
+            if key in self._tombstones:
+                return False
+            self.near.set(key, value)
+            return True
+
+    async def get(self, key: str) -> Any:
+        value = self.near.get(key)
+        if value is not None or self.far is None:
+            return value
+        raw = await self.far.aget(key)
+        if raw is None:
+            return None
+        value = self.decode(raw)
+        self._set_near(key, value)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        if self._set_near(key, value) and self.far is not None:
+            await self.far.aset(key, self.encode(value))
+
+    def drop_near(self, *keys: str) -> None:
+        """Tombstones keys and drops them from this process's tier."""
+        with self._lock:
+            for key in keys:
+                self._tombstones[key] = True
+        self.near.delete(*keys)
+
+    def invalidate(self, *keys: str) -> None:
+        """Drops keys everywhere, e.g. after a delete or an update."""
+        if not keys:
+            return
+        self.drop_near(*keys)
+        if self.far is not None:
+            # Synchronous, so a read right after this can't refill near from far
+            self.far.delete(*keys)
+            cache_bus.publish("invalidate", cache=self.name, keys=list(keys))
+
+    async def ainvalidate(self, *keys: str) -> None:
+        """invalidate() for the event loop."""
+        if not keys:
+            return
+        self.drop_near(*keys)
+        if self.far is not None:
+            await self.far.adelete(*keys)
+            cache_bus.publish("invalidate", cache=self.name, keys=list(keys))
+
+    def clear(self) -> None:
+        self.near.clear()
+        if self.far is not None:
+            self.far.clear()
+
+    def stats(self) -> dict:
+        return {
+            "near": self.near.stats(),
+            "far": self.far.stats() if self.far is not None else None,
+        }
+
+
+# --- Invalidation bus ---
+
+class CacheBus:
+    """
+    Broadcasts cache events to every node over Redis pub/sub.
+
+    `publish()` never blocks the caller: events go to an outbox drained by a
+    publisher thread. A listener thread applies events from other nodes; a
+    node ignores its own events because it applied them locally already.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.node_id = uuid.uuid4().hex
+        self._caches: dict[str, TieredCache] = {}
+        self._handlers: dict[str, list[Callable[[dict], None]]] = {"invalidate": [self._drop_near]}
+        self._client = None
+        self._outbox: queue.SimpleQueue = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self.published = 0
+        self.received = 0
+
+    def register(self, cache: TieredCache) -> TieredCache:
+        self._caches[cache.name] = cache
+        return cache
+
+    def subscribe(self, event: str, handler: Callable[[dict], None]) -> None:
+        """Runs `handler(payload)` for `event` published by other nodes."""
+        self._handlers.setdefault(event, []).append(handler)
+
+    def publish(self, event: str, **payload) -> None:
+        if self._client is not None:
+            self._outbox.put((event, payload))
+
+    def connect(self, client) -> None:
+        self._client = client
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._publish_loop, name="cache-bus-publisher", daemon=True),
+            threading.Thread(target=self._listen_loop, name="cache-bus-listener", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self) -> None:
+        if self._client is None:
+            return
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self._client = None
+
+    def _drop_near(self, payload: dict) -> None:
+        cache = self._caches.get(payload["cache"])
+        if cache is not None:
+            cache.drop_near(*payload["keys"])
+
+    def _publish_loop(self):
+        # Drain what's left after close() so no invalidation is lost on shutdown
+        while not (self._stop.is_set() and self._outbox.empty()):
+            try:
+                event, payload = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                message = {"node": self.node_id, "event": event, "payload": payload}
+                self._client.publish(self.channel, json.dumps(message))
+                self.published += 1
+            except Exception:
+                logger.exception("Error publishing cache event %s", event)
+
+    def _listen_loop(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        try:
+            while not self._stop.is_set():
+                try:
+                    message = pubsub.get_message(timeout=1.0)
+                except Exception:
+                    logger.exception("Error reading cache events")
+                    self._stop.wait(1.0)
+                    continue
+                if not message:
+                    continue
+                # One bad message mustn't stop the listener for the life of the process
+                try:
+                    data = json.loads(message["data"])
+                    if data["node"] == self.node_id:
+                        continue
+                    event, payload = data["event"], data["payload"]
+                except (ValueError, TypeError, KeyError) as e:
+                    logger.warning("Ignoring malformed cache event %r: %r", message.get("data"), e)
+                    continue
+                self.received += 1
+                for handler in self._handlers.get(event, []):
+                    try:
+                        handler(payload)
+                    except Exception:
+                        logger.exception("Error handling cache event %s", event)
+        finally:
+            pubsub.close()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._client is not None,
+            "channel": self.channel,
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+cache_bus = CacheBus(channel=settings.CACHE_BUS_CHANNEL)
+
+# short_code -> CachedLink, for the redirect endpoint
+link_cache = cache_bus.register(TieredCache(
+    "links",
+    maxsize=settings.LINK_CACHE_MAXSIZE,
+    ttl=settings.LINK_CACHE_TTL_SECONDS,
+    tombstone_ttl=settings.CACHE_TOMBSTONE_SECONDS,
+    encode=CachedLink.to_json,
+    decode=CachedLink.from_json,
+))
+
+# JWT subject (email) -> Principal, for get_current_user
+user_cache = cache_bus.register(TieredCache(
+    "users",
+    maxsize=settings.USER_CACHE_MAXSIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    tombstone_ttl=settings.CACHE_TOMBSTONE_SECONDS,
+    encode=Principal.to_json,
+    decode=Principal.from_json,
+))
+
+
+def connect_shared_cache(client, async_client) -> None:
+    """
+    Adds a Redis far tier to every cache and starts the invalidation bus.
+    Takes ready-made clients so tests can pass fakeredis ones.
+    """
+    for cache in (link_cache, user_cache):
+        cache.far = RedisBackend(
+            client, async_client,
+            namespace=f"{settings.CACHE_KEY_PREFIX}:{cache.name}",
+            ttl=cache.ttl,
+            tombstone_ttl=cache.tombstone_ttl,
+        )
+    cache_bus.connect(client)
+
+
+def connect_shared_cache_from_url(url: str) -> None:
+    if redis is None:
+        raise RuntimeError("REDIS_URL is set but the 'redis' package is not installed")
+    connect_shared_cache(
+        redis.Redis.from_url(url, decode_responses=True),
+        aioredis.Redis.from_url(url, decode_responses=True),
+    )
+
+
+def disconnect_shared_cache() -> None:
+    cache_bus.close()
+    for cache in (link_cache, user_cache):
+        cache.far = None
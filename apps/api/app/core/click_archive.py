@@ -0,0 +1,318 @@
+"""
+The cold archive of raw clicks: compressed Parquet files under
+CLICK_ARCHIVE_DIR, written by app/jobs/archive_clicks.py for the days
+older than CLICK_RETENTION_DAYS. The click_archive_days table lists the
+archived days; reads of a date range take those days from the files and
+the rest from the clicks table (see live_range).
+
+Each day is first written to a file of its own, clicks/YYYY/MM/YYYY-MM-DD.parquet.
+Once a whole month is archived the job compacts its days into one
+clicks/YYYY/YYYY-MM.parquet, since a read pays for every file it opens;
+readers take a day from its month's file whenever there is one. Files are
+written and compacted a row group at a time, so memory doesn't grow with
+a day's or a month's clicks: row groups follow created_at, and the clicks
+within one are sorted by (link_id, id). They're written under a temporary
+name, synced and renamed into place, so a file is either complete or
+absent.
+"""
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+
+from app.core.config import settings
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.dataset
+    import pyarrow.parquet
+except ImportError:  # Without it clicks can't be archived, nor archived ones read
+    pyarrow = None
+
+# Column order of the rows written and read, the clicks table's
+COLUMNS = ("id", "link_id", "created_at", "ip_address", "country", "referrer", "browser", "device_type")
+
+# Rows per Parquet row group, the unit a filtered read can skip, and the
+# most clicks the writes hold in memory
+ROW_GROUP_SIZE = 64 * 1024
+
+SCHEMA = pyarrow.schema([
+    ("id", pyarrow.int64()),
+    ("link_id", pyarrow.int64()),
+    ("created_at", pyarrow.timestamp("us")),
+    ("ip_address", pyarrow.string()),
+    ("country", pyarrow.string()),
+    ("referrer", pyarrow.string()),
+    ("browser", pyarrow.string()),
+    ("device_type", pyarrow.string()),
+]) if pyarrow is not None else None
+
+
+class ArchiveUnavailable(Exception):
+    """Archived clicks a read needs can't be read: pyarrow isn't installed, or a file is missing."""
+
+
+def available() -> bool:
+    return bool(settings.CLICK_ARCHIVE_DIR) and pyarrow is not None
+
+
+def utc_naive(moment: datetime) -> datetime:
+    """`moment` as the naive UTC datetime the clicks are stored with."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time())
+
+
+def day_bounds(start: Optional[datetime], end: Optional[datetime]) -> tuple[Optional[date], Optional[date]]:
+    """First and last day touched by start <= created_at < end, None where the range is open."""
+    first_day = utc_naive(start).date() if start is not None else None
+    last_day = (utc_naive(end) - timedelta(microseconds=1)).date() if end is not None else None
+    return first_day, last_day
+
+
+def live_range(archived: list, start: Optional[datetime],
+               end: Optional[datetime]) -> Optional[tuple[Optional[datetime], Optional[datetime]]]:
+    """
+    The part of start <= created_at < end still in the clicks table, in
+    naive UTC like the column, given the click_archive_days rows overlapping
+    the range, oldest first: from the day after the last archived one on,
+    or None when it's all archived. Days are archived without gaps, so if
+    the range reaches past the last of them, that one is the last archived
+    day overall.
+    """
+    start = utc_naive(start) if start is not None else None
+    end = utc_naive(end) if end is not None else None
+    if not archived:
+        return start, end
+    horizon = day_start(archived[-1].day + timedelta(days=1))
+    if end is not None and end <= horizon:
+        return None
+    if start is not None and start > horizon:
+        return start, end
+    return horizon, end
+
+
+def day_path(day: date) -> str:
+    return os.path.join(settings.CLICK_ARCHIVE_DIR, "clicks", f"{day:%Y}", f"{day:%m}", f"{day.isoformat()}.parquet")
+
+
+def month_path(day: date) -> str:
+    """The compacted file of the month `day` is in."""
+    return os.path.join(settings.CLICK_ARCHIVE_DIR, "clicks", f"{day:%Y}", f"{day:%Y-%m}.parquet")
+
+
+def _sync_directory(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _row_groups(batches: Iterable) -> Iterator:
+    """Record batches regrouped into tables of ROW_GROUP_SIZE rows (the last fewer), each sorted by (link_id, id)."""
+    order = [("link_id", "ascending"), ("id", "ascending")]
+    pending = pyarrow.Table.from_batches([], schema=SCHEMA)
+    for batch in batches:
+        pending = pyarrow.concat_tables([pending, pyarrow.Table.from_batches([batch], schema=SCHEMA)])
+        while pending.num_rows >= ROW_GROUP_SIZE:
+            yield pending.slice(0, ROW_GROUP_SIZE).sort_by(order)
+            pending = pending.slice(ROW_GROUP_SIZE)
+    if pending.num_rows:
+        yield pending.sort_by(order)
+
+
+def _write(path: str, batches: Iterable) -> int:
+    """
+    Writes record batches to `path` a row group at a time, replacing the
+    file. Writes nothing if there are no rows. Returns the number of rows.
+    """
+    directory = os.path.dirname(path)
+    partial = path + ".partial"
+    written = 0
+    writer = None
+    try:
+        for table in _row_groups(batches):
+            if writer is None:
+                os.makedirs(directory, exist_ok=True)
+                writer = pyarrow.parquet.ParquetWriter(partial, SCHEMA, compression=settings.CLICK_ARCHIVE_COMPRESSION)
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+            written += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        return 0
+    with open(partial, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+    # The rename itself is only durable once the directory is synced
+    _sync_directory(directory)
+    return written
+
+
+def _read_batches(path: str) -> Iterator:
+    return pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=ROW_GROUP_SIZE)
+
+
+def _remove(paths: Iterable[str]) -> None:
+    directories = set()
+    for path in paths:
+        os.remove(path)
+        directories.add(os.path.dirname(path))
+    for directory in directories:
+        _sync_directory(directory)
+
+
+def write_day(day: date, chunks: Iterable[list[tuple]]) -> int:
+    """
+    Writes a day's clicks, given as chunks of tuples in COLUMNS order (read
+    as they're written), as the day's file, replacing any earlier one; no
+    file if there are none. Returns the number of clicks written.
+    """
+    batches = (
+        pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(zip(*chunk), SCHEMA)],
+            schema=SCHEMA,
+        )
+        for chunk in chunks
+        if chunk
+    )
+    return _write(day_path(day), batches)
+
+
+def paths(days: Iterable[date]) -> list[str]:
+    """
+    The files holding `days` (sorted): each month's compacted file, or its
+    day files. Raises ArchiveUnavailable if one is missing.
+    """
+    found = []
+    for day in days:
+        path = month_path(day)
+        if not os.path.exists(path):
+            path = day_path(day)
+            if not os.path.exists(path):
+                raise ArchiveUnavailable(f"Archived clicks of {day} are missing, expected {path}")
+        if not found or found[-1] != path:
+            found.append(path)
+    return found
+
+
+def _filter(link_ids: list[int], start: Optional[datetime], end: Optional[datetime]):
+    field = pyarrow.dataset.field
+    expression = field("link_id").isin(link_ids)
+    if start is not None:
+        expression &= field("created_at") >= utc_naive(start)
+    if end is not None:
+        expression &= field("created_at") < utc_naive(end)
+    return expression
+
+
+def check(days: list[date]) -> list[str]:
+    """
+    The files holding `days`, or ArchiveUnavailable if they can't be read:
+    lets a streamed response fail before it starts rather than halfway.
+    """
+    if days and pyarrow is None:
+        raise ArchiveUnavailable(f"pyarrow isn't installed, can't read {len(days)} archived day(s) of clicks")
+    return paths(days)
+
+
+def _open(days: list[date]):
+    files = check(days)
+    return pyarrow.dataset.dataset(files, schema=SCHEMA, format="parquet") if files else None
+
+
+def link_stats(link_id: int, days: list[date], start: Optional[datetime], end: Optional[datetime],
+               dimensions: dict[str, str]) -> list[tuple]:
+    """
+    The archived clicks of one link on `days` with start <= created_at < end,
+    grouped like crud.get_link_click_stats: (dimension name, value, count,
+    last created_at) per value of each column in `dimensions`.
+    """
+    dataset = _open(days)
+    if dataset is None:
+        return []
+    table = dataset.to_table(columns=["created_at", *dimensions.values()], filter=_filter([link_id], start, end))
+    rows = []
+    for name, column in dimensions.items():
+        grouped = table.group_by(column).aggregate([([], "count_all"), ("created_at", "max")])
+        rows.extend(
+            (name, value, count, last_clicked_at)
+            for value, count, last_clicked_at in zip(
+                grouped.column(column).to_pylist(),
+                grouped.column("count_all").to_pylist(),
+                grouped.column("created_at_max").to_pylist(),
+            )
+        )
+    return rows
+
+
+def iter_clicks(link_ids: list[int], days: list[date], start: Optional[datetime], end: Optional[datetime],
+                chunk_size: int) -> Iterator[list[tuple]]:
+    """
+    The archived clicks of `link_ids` on `days` with start <= created_at < end,
+    as tuples in COLUMNS order, at most `chunk_size` at a time: file by
+    file, and by (link_id, id) within a file. Reads one batch at a time.
+    """
+    dataset = _open(days)
+    if dataset is None:
+        return
+    batches = dataset.to_batches(columns=list(COLUMNS), filter=_filter(link_ids, start, end), batch_size=chunk_size)
+    for batch in batches:
+        if batch.num_rows:
+            yield list(zip(*(batch.column(name).to_pylist() for name in COLUMNS)))
+
+
+# --- Compaction ---
+
+def compact_month(days: list[date]) -> Optional[str]:
+    """
+    Merges the day files of `days`, all the archived days of one month,
+    into the month's file, then removes them. Returns the month's file,
+    None if there was nothing to merge.
+    """
+    day_paths = [path for path in map(day_path, days) if os.path.exists(path)]
+    if not day_paths:
+        return None
+    path = month_path(days[0])
+    # Otherwise they're left over from a compaction stopped before removing them
+    if not os.path.exists(path):
+        _write(path, (batch for day_path in day_paths for batch in _read_batches(day_path)))
+    _remove(day_paths)
+    try:
+        os.rmdir(os.path.dirname(day_paths[0]))
+    except OSError:  # Not empty
+        pass
+    return path
+
+
+def link_ids(path: str) -> list[int]:
+    """The distinct links with clicks in an archive file."""
+    found = set()
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=ROW_GROUP_SIZE, columns=["link_id"]):
+        found.update(pyarrow.compute.unique(batch.column("link_id")).to_pylist())
+    return sorted(found)
+
+
+def drop_links(path: str, link_ids: Iterable[int]) -> list[datetime]:
+    """
+    Rewrites an archive file without the clicks of `link_ids`, or removes
+    it if none are left. Returns the created_at of each click dropped.
+    """
+    dropped_ids = pyarrow.array(list(link_ids), pyarrow.int64())
+    removed = []
+
+    def kept():
+        for batch in _read_batches(path):
+            dropped = pyarrow.compute.is_in(batch.column("link_id"), dropped_ids)
+            removed.extend(batch.filter(dropped).column("created_at").to_pylist())
+            yield batch.filter(pyarrow.compute.invert(dropped))
+
+    if not _write(path, kept()):
+        _remove([path])
+    return removed
@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app import crud_async
+from app.core import click_archive
+from app.db import database
+
+COLUMNS = [
+    "click_id", "link_id", "short_code", "created_at", "ip_address",
+    "country", "referrer", "browser", "device_type",
+]
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+async def _link_pages(user_id: int, page_size: int) -> AsyncIterator[dict[int, str]]:
+    """A user's links as {id: short_code} pages, in id order."""
+    after_id = 0
+    while True:
+        async with database.AsyncSessionLocal() as db:
+            rows = await crud_async.get_link_ids_page(db, user_id, after_id, page_size)
+        if not rows:
+            return
+        yield {row.id: row.short_code for row in rows}
+        after_id = rows[-1].id
+
+
+def _export_rows(rows, short_codes: dict[int, str]) -> list[dict]:
+    return [
+        {
+            "click_id": click_id,
+            "link_id": link_id,
+            "short_code": short_codes[link_id],
+            "created_at": created_at.isoformat() if created_at else None,
+            "ip_address": ip_address,
+            "country": country,
+            "referrer": referrer,
+            "browser": browser,
+            "device_type": device_type,
+        }
+        for click_id, link_id, created_at, ip_address, country, referrer, browser, device_type in rows
+    ]
+
+
+async def iter_click_chunks(links: AsyncIterator[dict[int, str]], chunk_size: int,
+                            start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[list[dict]]:
+    """
+    Raw clicks of every link in `links`, `chunk_size` at a time. Each chunk
+    is read with keyset pagination in its own short session, so a pool
+    connection is only held for one query, never while the client is
+    still downloading the previous chunk. Clicks on archived days come
+    first for each page of links, read from the archive files off the
+    event loop.
+    """
+    async with database.AsyncSessionLocal() as db:
+        archived = await crud_async.get_archived_days(db, start, end)
+    archived_days = [day.day for day in archived if day.clicks]
+    live = click_archive.live_range(archived, start, end)
+
+    async for short_codes in links:
+        link_ids = sorted(short_codes)
+        if archived_days:
+            chunks = click_archive.iter_clicks(link_ids, archived_days, start, end, chunk_size)
+            while (rows := await run_in_threadpool(next, chunks, None)) is not None:
+                yield _export_rows(rows, short_codes)
+        if live is None:
+            continue
+        after = (0, 0)
+        while True:
+            async with database.AsyncSessionLocal() as db:
+                rows = await crud_async.get_clicks_page(db, link_ids, after, chunk_size, *live)
+            if not rows:
+                break
+            yield _export_rows(rows, short_codes)
+            after = (rows[-1].link_id, rows[-1].id)
+            if len(rows) < chunk_size:
+                break
+
+
+async def check_archive(start: Optional[datetime], end: Optional[datetime]) -> None:
+    """Raises click_archive.ArchiveUnavailable if the export would need archived clicks it can't read."""
+    async with database.AsyncSessionLocal() as db:
+        archived = await crud_async.get_archived_days(db, start, end)
+    await run_in_threadpool(click_archive.check, [day.day for day in archived if day.clicks])
+
+
+def link_clicks(link_id: int, short_code: str, chunk_size: int,
+                start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[list[dict]]:
+    async def single():
+        yield {link_id: short_code}
+    return iter_click_chunks(single(), chunk_size, start, end)
+
+
+def account_clicks(user_id: int, chunk_size: int,
+                   start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[list[dict]]:
+    # Links are batched so each click query covers many small links at once
+    return iter_click_chunks(_link_pages(user_id, page_size=500), chunk_size, start, end)
+
+
+def _encode(rows: list[dict], fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(json.dumps(row) + "\n" for row in rows)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS, lineterminator="\n")
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+async def encode_export(chunks: AsyncIterator[list[dict]], fmt: str, compress: bool) -> AsyncIterator[bytes]:
+    """Serializes click chunks as CSV (with a header) or NDJSON, gzipped on request."""
+    gzip = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+
+    def out(text: str) -> bytes:
+        data = text.encode()
+        return gzip.compress(data) if gzip else data
+
+    if fmt == "csv":
+        yield out(",".join(COLUMNS) + "\n")
+    async for rows in chunks:
+        data = out(_encode(rows, fmt))
+        if data:
+            yield data
+    if gzip:
+        yield gzip.flush()
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+from starlette.concurrency import run_in_threadpool
+
+from app import crud_async
+from app.core.config import settings
+from app.core.geoip import geoip
+from app.core.metrics import click_flush_duration
+from app.db import database
+
+logger = logging.getLogger(__name__)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Lost connections, deadlocks, lock and pool timeouts: worth retrying as is."""
+    if isinstance(error, (OperationalError, PoolTimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class ClickIngestor:
+    """
+    Buffers clicks in a bounded in-memory queue and writes them in batches.
+
+    A background task drains the queue and flushes a batch as soon as it holds
+    `batch_size` clicks or `flush_interval` seconds have passed since its first
+    click. When the queue is full, `record()` waits for room, which slows the
+    redirects down to the speed of the writer instead of growing memory.
+
+    A write failing on a transient error is retried `retries` times with
+    exponential backoff; any other error splits the batch in halves, down to
+    the single bad click, so one bad row doesn't lose the rest.
+    """
+
+    def __init__(self, mode: str, max_queue: int, batch_size: int, flush_interval: float,
+                 retries: int = 3, retry_backoff: float = 0.5):
+        self.mode = mode
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._stopping = False
+        # Counters for monitoring
+        self.flushed = 0
+        self.batches = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.last_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        """Starts the background writer. Called from the app lifespan."""
+        if self.mode != "buffered" or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._stopping = False
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything still queued and stops the writer."""
+        if not self.running:
+            return
+        # From here on record() writes directly, so nothing new lands behind the sentinel
+        self._stopping = True
+        await self._queue.put(None)  # Sentinel: flush and exit
+        await self._worker
+        # Clicks of record() calls that were waiting for room when the sentinel went in.
+        # Each get() lets a waiting put() in, which runs while the flush awaits
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self._queue.empty():
+                click = self._queue.get_nowait()
+                if click is not None:
+                    batch.append(click)
+            await self._flush(batch)
+        self._worker = None
+        self._queue = None
+
+    async def record(self, link_id: int, **click_data):
+        """
+        Queues a click for the background writer. In "sync" mode, or when
+        the writer isn't running (e.g. no lifespan), the click is written
+        before returning.
+        """
+        click = {"link_id": link_id, "created_at": datetime.utcnow(), **click_data}
+        if not self.running or self._stopping:
+            await self._flush([click])
+            return
+        await self._queue.put(click)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            click = await self._queue.get()
+            if click is None:
+                return
+            batch = [click]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    click = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if click is None:
+                    stop = True
+                    break
+                batch.append(click)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: list[dict]):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(geoip.resolve_countries, batch)
+        except Exception:
+            logger.exception("Error resolving the countries of %d clicks, storing them without", len(batch))
+        await self._write(batch)
+        self.last_flush_seconds = time.perf_counter() - started
+        click_flush_duration.observe(self.last_flush_seconds)
+        self.batches += 1
+
+    async def _write(self, batch: list[dict]):
+        """Writes a batch, retrying transient errors and isolating bad clicks."""
+        attempt = 0
+        while True:
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    written = await crud_async.create_click_logs(db, batch)
+            except Exception as e:
+                error = e
+            else:
+                self.flushed += written
+                self.skipped += len(batch) - written
+                return
+            if not _is_transient(error):
+                break
+            if attempt == self.retries:
+                # The database is unreachable, splitting the batch wouldn't help
+                self.dropped += len(batch)
+                logger.error("Dropping %d clicks after %d attempts: %s", len(batch), attempt + 1, error)
+                return
+            delay = self.retry_backoff * 2 ** attempt
+            attempt += 1
+            logger.warning("Error writing %d clicks, retrying in %.1fs: %s", len(batch), delay, error)
+            await asyncio.sleep(delay)
+
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            await self._write(batch[:middle])
+            await self._write(batch[middle:])
+            return
+        self.dropped += 1
+        logger.error("Dropping a click of link %s: %s", batch[0]["link_id"], error)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_maxsize": self.max_queue,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+
+# Single, importable instance started and stopped by the app lifespan
+click_ingestor = ClickIngestor(
+    mode=settings.CLICK_INGEST_MODE,
+    max_queue=settings.CLICK_QUEUE_MAXSIZE,
+    batch_size=settings.CLICK_BATCH_SIZE,
+    flush_interval=settings.CLICK_FLUSH_INTERVAL_SECONDS,
+    retries=settings.CLICK_WRITE_RETRIES,
+    retry_backoff=settings.CLICK_WRITE_RETRY_BACKOFF_SECONDS,
+)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import ClassVar
+from typing import ClassVar, Optional
 class Settings(BaseSettings):
     # This tells BaseSettings to look for an .env file
     model_config = SettingsConfigDict(
@@ -18,5 +18,137 @@ class Settings(BaseSettings):
     # it's good practice to have all env settings here.
     DATABASE_URL: str
 
+    # --- Database connection pools ---
+    # Applied to both the sync and the async engine, so one worker can hold up
+    # to 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections; keep
+    # workers * that below MySQL's max_connections
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    # How long a request waits for a free connection before failing
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    # Reconnect before MySQL's wait_timeout drops idle connections
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Test connections on checkout, so a dropped one is replaced instead of erroring
+    DB_POOL_PRE_PING: bool = True
+
+    # --- Schema migrations ---
+    # Run `alembic upgrade head` at startup (app/db/migrate.py). Workers starting
+    # at once take turns, waiting up to the timeout for the one migrating
+    DB_MIGRATE_ON_STARTUP: bool = True
+    DB_MIGRATE_LOCK_TIMEOUT_SECONDS: int = 600
+
+    # --- Redirect link cache ---
+    # Bounded LRU of short_code -> link, entries expire after the TTL
+    LINK_CACHE_MAXSIZE: int = 100_000
+    LINK_CACHE_TTL_SECONDS: int = 300
+
+    # --- Shared cache ---
+    # Decoded-user lookups for get_current_user, kept short-lived
+    USER_CACHE_MAXSIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: int = 60
+    # When set, caches get a Redis far tier and invalidations are broadcast
+    # to every worker over pub/sub
+    REDIS_URL: Optional[str] = None
+    CACHE_KEY_PREFIX: str = "linkshorty"
+    CACHE_BUS_CHANNEL: str = "linkshorty:cache-events"
+    # How long an invalidated key refuses new values, in every tier: longer
+    # than a cache miss takes to load from the database and set() the result
+    CACHE_TOMBSTONE_SECONDS: int = 10
+
+    # --- Click ingestion ---
+    # "buffered" queues clicks for a background writer, "sync" writes each click
+    # before the redirect returns (handy for tests)
+    CLICK_INGEST_MODE: str = "buffered"
+    CLICK_QUEUE_MAXSIZE: int = 10_000
+    CLICK_BATCH_SIZE: int = 500
+    CLICK_FLUSH_INTERVAL_SECONDS: float = 1.0
+    # Retries of a batch failing on a transient database error, the first
+    # after the backoff and each later one after twice the previous wait
+    CLICK_WRITE_RETRIES: int = 3
+    CLICK_WRITE_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # Distinct user-agent strings kept by the memoized classifier
+    UA_CACHE_MAXSIZE: int = 4096
+
+    # --- Short-code allocation ---
+    # Key of the permutation that turns sequence numbers into codes. Defaults
+    # to SECRET_KEY; once links exist it must never change, or new codes can
+    # repeat old ones, so set it explicitly before rotating SECRET_KEY
+    SHORT_CODE_KEY: Optional[str] = None
+    # Sequence numbers each worker reserves per round trip
+    SHORT_CODE_BLOCK_SIZE: int = 1000
+    # Rows per multi-row INSERT in POST /links/bulk
+    LINK_BULK_CHUNK_SIZE: int = 500
+
+    # Clicks read per query by the CSV/NDJSON click exports
+    CLICK_EXPORT_CHUNK_SIZE: int = 5000
+
+    # Rows each admin counter (and each of its hours) is split across in
+    # stat_counters; every write adds to one of them at random, so concurrent
+    # writers rarely wait on the same row lock. Reads sum them
+    STAT_COUNTER_SHARDS: int = 16
+
+    # --- Click retention ---
+    # app/jobs/archive_clicks.py moves raw clicks older than this many days
+    # to Parquet files in CLICK_ARCHIVE_DIR, one per day; link stats and
+    # click exports read them back. 0 keeps every click in the database.
+    # Every API host must see the same directory
+    CLICK_RETENTION_DAYS: int = 0
+    CLICK_ARCHIVE_DIR: Optional[str] = None
+    # Parquet codec of the archive files (zstd, snappy, gzip, ...)
+    CLICK_ARCHIVE_COMPRESSION: str = "zstd"
+
+    # --- Metrics ---
+    # Prometheus text format at /metrics, served unauthenticated on
+    # METRICS_PORT, which is not to be published. METRICS_ON_API_PORT also
+    # adds it to the API's own port, for deployments that can only expose one
+    # and keep /metrics from the internet some other way.
+    METRICS_ENABLED: bool = True
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: Optional[int] = 9100
+    METRICS_ON_API_PORT: bool = False
+    # Several workers need PROMETHEUS_MULTIPROC_DIR set in the environment (see
+    # app/core/metrics.py); each then copies its cache, queue and pool figures
+    # for the others' /metrics this often
+    METRICS_PUBLISH_SECONDS: float = 5.0
+
+    # --- SQL profiling (development, tests) ---
+    # Per-request query counts and N+1 detection, see app/core/sql_profiler.py
+    SQL_PROFILING_ENABLED: bool = False
+    # A statement shape run this many times in one request is flagged
+    SQL_PROFILE_REPEAT_THRESHOLD: int = 5
+    # Fail requests that go over their endpoint's @query_budget
+    SQL_QUERY_BUDGET_ENFORCE: bool = False
+
+    # --- Password hashing ---
+    # bcrypt runs on its own pool: this many hashes at once, this many waiting,
+    # and logins/registrations beyond that get a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+
+    # --- IP geolocation ---
+    # IP2Location BIN file (any DB1+ edition); unset stores clicks without a country
+    GEOIP_DB_PATH: Optional[str] = None
+    # Lookups are memoized per network prefix of these lengths
+    GEOIP_CACHE_MAXSIZE: int = 65_536
+    GEOIP_IPV4_PREFIX: int = 24
+    GEOIP_IPV6_PREFIX: int = 48
+
+    # --- Negative-lookup filter for unknown short codes ---
+    SHORT_CODE_FILTER_ENABLED: bool = True
+    SHORT_CODE_FILTER_ERROR_RATE: float = 0.01
+    SHORT_CODE_FILTER_MIN_CAPACITY: int = 1_000_000
+    # Rows read per query while (re)building
+    SHORT_CODE_FILTER_CHUNK_SIZE: int = 20_000
+    # How often codes created by other workers are pulled in; a code created
+    # elsewhere can 404 for this long when the cache bus (Redis) is off
+    SHORT_CODE_FILTER_REFRESH_SECONDS: float = 1.0
+    # Each scan re-reads links created this long before the previous one
+    # started: longer than a link insert's transaction, plus clock skew
+    # between API hosts
+    SHORT_CODE_FILTER_REFRESH_MARGIN_SECONDS: float = 10.0
+    # Rebuild once this share of the filtered codes has been deleted
+    SHORT_CODE_FILTER_STALE_RATIO: float = 0.1
+
 # Create a single, importable instance of your settings
 settings = Settings()
\ No newline at end of file
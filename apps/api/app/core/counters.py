@@ -0,0 +1,111 @@
+"""
+Maintained row counts for the admin totals (the stat_counters table).
+
+Every flush that adds or deletes users, links or clicks through the ORM bumps
+the counters on the same connection, so they commit or roll back together
+with the rows they count; that covers the cascades of a user or link delete
+too. The two Core bulk inserts (bulk link upload, the click writer) add their
+own counts with `counter_rows` in the same transaction.
+
+Each counter row is split over STAT_COUNTER_SHARDS shards, so writers don't
+all queue on the lock of the one total row (and of the current hour's).
+"""
+import random
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+from app.db.dialect import upsert_increment
+
+COUNTED_MODELS = {models.User: "users", models.Link: "links", models.Click: "clicks"}
+
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _created_at(obj) -> Optional[datetime]:
+    """The row's created_at as naive UTC, read without triggering a load; None if not set."""
+    created_at = inspect(obj).dict.get("created_at")
+    if created_at is not None and created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at
+
+
+def shard_of(connection) -> int:
+    """
+    The stat_counters shard writes on `connection` add to: picked at random
+    once per database connection, so a transaction keeps to one shard and
+    two transactions can't lock two shards of a row in opposite orders.
+    """
+    info = connection.info
+    if "stat_counter_shard" not in info:
+        info["stat_counter_shard"] = random.randrange(settings.STAT_COUNTER_SHARDS)
+    return info["stat_counter_shard"]
+
+
+def counter_rows(name: str, created: Iterable[datetime] = (),
+                 removed: Iterable[Optional[datetime]] = (), shard: int = 0) -> list[dict]:
+    """
+    stat_counters increments for rows of `name` created at the given times
+    and deleted rows created at the `removed` times (None when unknown):
+    the change to the total plus one row per hour that gained or lost rows,
+    all in `shard`, sorted so concurrent writers lock in one order.
+    """
+    per_hour = Counter(hour_of(moment) for moment in created)
+    net = sum(per_hour.values())
+    for moment in removed:
+        net -= 1
+        if moment is not None:
+            per_hour[hour_of(moment)] -= 1
+    rows = [
+        {"name": name, "bucket": bucket, "shard": shard, "value": count}
+        for bucket, count in sorted(per_hour.items())
+        if count
+    ]
+    if net:
+        rows.insert(0, {"name": name, "bucket": models.StatCounter.TOTAL_BUCKET, "shard": shard, "value": net})
+    return rows
+
+
+def increment_statement(dialect_name: str):
+    table = models.StatCounter.__table__
+    return upsert_increment(dialect_name, table, key_columns=["name", "bucket", "shard"], counter_columns=["value"])
+
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_rows(session: Session, flush_context) -> None:
+    # session.new / session.deleted still list what this flush wrote,
+    # including children removed by a delete cascade. Rows count in the hour
+    # of their created_at, both ways, so the hourly buckets agree with a
+    # count of the rows by created_at.
+    now = datetime.utcnow()
+    created = {name: [] for name in COUNTED_MODELS.values()}
+    removed = {name: [] for name in COUNTED_MODELS.values()}
+    for obj in session.new:
+        name = COUNTED_MODELS.get(type(obj))
+        if name:
+            created[name].append(_created_at(obj) or now)
+    for obj in session.deleted:
+        name = COUNTED_MODELS.get(type(obj))
+        if name:
+            # Take the row out of its creation hour too, so growth only counts
+            # rows that still exist
+            removed[name].append(_created_at(obj))
+
+    if not any(created.values()) and not any(removed.values()):
+        return
+    connection = session.connection()
+    shard = shard_of(connection)
+    rows = [
+        row
+        for name in COUNTED_MODELS.values()
+        for row in counter_rows(name, created[name], removed[name], shard)
+    ]
+    if rows:
+        connection.execute(increment_statement(connection.dialect.name), rows)
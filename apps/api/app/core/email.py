@@ -2,6 +2,8 @@ import os
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
+from app.core.metrics import emails_sent
+
 def send_welcome_email(to_email: str, name: str):
     """
     Sends a welcome email to a new user.
@@ -10,6 +12,7 @@ def send_welcome_email(to_email: str, name: str):
     FROM_EMAIL = os.getenv("FROM_EMAIL")
 
     if not SENDGRID_API_KEY or not FROM_EMAIL:
+        emails_sent.labels("welcome", "not_configured").inc()
         print("--- SENDGRID NOT CONFIGURED ---")
         print(f"Email: Welcome email would be sent to {to_email} for user {name}")
         print("-------------------------------")
@@ -35,7 +38,9 @@ def send_welcome_email(to_email: str, name: str):
         sg = SendGridAPIClient(SENDGRID_API_KEY)
         response = sg.send(message)
         print(f"Welcome email sent to {to_email}, status code: {response.status_code}")
+        emails_sent.labels("welcome", "sent").inc()
     except Exception as e:
+        emails_sent.labels("welcome", "failed").inc()
         print(f"Error sending welcome email to {to_email}: {e}")
         
 def send_verification_email(to_email: str, token: str):
@@ -50,6 +55,7 @@ def send_verification_email(to_email: str, token: str):
     verification_link = f"{NEXT_PUBLIC_BASE_URL}/verify-email?token={token}"
 
     if not SENDGRID_API_KEY or not FROM_EMAIL:
+        emails_sent.labels("verification", "not_configured").inc()
         print("--- SENDGRID NOT CONFIGURED ---")
         print(f"Email: Verification email would be sent to {to_email}")
         print(f"Link: {verification_link}")
@@ -84,5 +90,7 @@ def send_verification_email(to_email: str, token: str):
         sg = SendGridAPIClient(SENDGRID_API_KEY)
         response = sg.send(message)
         print(f"Verification email sent to {to_email}, status code: {response.status_code}")
+        emails_sent.labels("verification", "sent").inc()
     except Exception as e:
+        emails_sent.labels("verification", "failed").inc()
         print(f"Error sending verification email to {to_email}: {e}")
\ No newline at end of file
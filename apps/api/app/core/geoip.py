@@ -0,0 +1,133 @@
+import ipaddress
+import logging
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from app.core.config import settings
+
+try:
+    import IP2Location
+except ImportError:  # Without it (or without a BIN file) clicks are stored with no country
+    IP2Location = None
+
+logger = logging.getLogger(__name__)
+
+
+class GeoIPResolver:
+    """
+    Resolves client IPs to ISO 3166 country codes from an IP2Location BIN file.
+
+    The file is opened in SHARED_MEMORY mode, i.e. mmap'd, when it's
+    writable: the library maps it read-write, so a read-only file is read
+    with plain file I/O instead. Both go through the OS page cache, so every
+    worker on the host shares the same copy.
+    Lookups are memoized per network prefix (/24 for IPv4, /48 for IPv6 by
+    default): clients in the same prefix almost always share a country, and
+    it keeps the cache small under traffic from many distinct addresses.
+    """
+
+    def __init__(self, db_path: Optional[str], cache_size: int, ipv4_prefix: int, ipv6_prefix: int):
+        self.db_path = db_path
+        self.ipv4_prefix = ipv4_prefix
+        self.ipv6_prefix = ipv6_prefix
+        self._db = None
+        self._failed = False
+        self._lock = threading.Lock()
+        self._lookup = lru_cache(maxsize=cache_size)(self._lookup_uncached)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.db_path) and IP2Location is not None
+
+    def _open(self):
+        # Opened on first use; a missing or broken file disables lookups once
+        # instead of failing every click batch
+        if self._db is not None or self._failed:
+            return self._db
+        with self._lock:
+            if self._db is None and not self._failed:
+                try:
+                    self._db = self._open_reader()
+                except Exception:
+                    self._failed = True
+                    logger.exception("Error opening GeoIP database %s, clicks are stored without a country",
+                                     self.db_path)
+        return self._db
+
+    def _open_reader(self):
+        try:
+            return IP2Location.IP2Location(self.db_path, "SHARED_MEMORY")
+        except OSError as e:  # Read-only file or filesystem
+            logger.info("Can't map GeoIP database %s read-write (%s), using file I/O", self.db_path, e)
+            return IP2Location.IP2Location(self.db_path, "FILE_IO")
+
+    def _prefix(self, ip: str) -> Optional[str]:
+        """The network address lookups are cached under, or None if `ip` isn't an IP."""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        prefix = self.ipv4_prefix if address.version == 4 else self.ipv6_prefix
+        return str(ipaddress.ip_network((address, prefix), strict=False).network_address)
+
+    def _lookup_uncached(self, prefix: str) -> Optional[str]:
+        db = self._open()
+        if db is None:
+            return None
+        # The reader seeks and reads through one file position, on the mmap
+        # too, so lookups are serialized; only cache misses get here
+        with self._lock:
+            country = db.get_country_short(prefix)
+        # "-" for unallocated/private ranges, error strings for bad input
+        if country and len(country) == 2 and country.isalpha():
+            return country
+        return None
+
+    def country(self, ip: Optional[str]) -> Optional[str]:
+        """Two-letter country code for `ip`, or None when it can't be resolved."""
+        if not ip or not self.enabled:
+            return None
+        prefix = self._prefix(ip)
+        if prefix is None:
+            return None
+        return self._lookup(prefix)
+
+    def resolve_countries(self, clicks: list[dict]) -> None:
+        """
+        Fills in `country` for a batch of clicks from their `ip_address`.
+        Blocking (file reads on a cache miss), so run it in the threadpool.
+        """
+        for click in clicks:
+            if click.get("country") is None:
+                click["country"] = self.country(click.get("ip_address"))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            self._lookup.cache_clear()
+
+    def stats(self) -> dict:
+        info = self._lookup.cache_info()
+        return {
+            "enabled": self.enabled,
+            "loaded": self._db is not None,
+            "db_path": self.db_path,
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+        }
+
+
+# Single, importable instance used by the click writer
+geoip = GeoIPResolver(
+    db_path=settings.GEOIP_DB_PATH,
+    cache_size=settings.GEOIP_CACHE_MAXSIZE,
+    ipv4_prefix=settings.GEOIP_IPV4_PREFIX,
+    ipv6_prefix=settings.GEOIP_IPV6_PREFIX,
+)
@@ -0,0 +1,364 @@
+"""
+Prometheus metrics through prometheus_client, rendered in the text
+exposition format at /metrics on METRICS_PORT (see MetricsServer).
+
+Counters and histograms written on the hot paths (every request, every
+query, every pool wait) are prometheus_client metrics. Values that already
+live elsewhere (cache hit counts, queue depths, pool gauges) are read from
+the owners' stats() at scrape time instead of being tracked twice.
+
+Every worker process counts on its own. To run several (uvicorn --workers
+N), point the PROMETHEUS_MULTIPROC_DIR environment variable at an empty
+directory, cleared on every deploy: prometheus_client then keeps the
+metrics in files there and any worker's /metrics adds up all of them. The
+scrape-time values only live in each worker's memory, so in that mode
+every worker also copies them to the files every METRICS_PUBLISH_SECONDS.
+Without it, run a single worker per /metrics endpoint.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Optional
+
+import prometheus_client
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.core.config import settings
+from app.db.pool import BUCKETS_MS
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds; fine enough at the low end for redirects served from the cache
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A _created sample next to every counter and histogram doubles the series for nothing here
+prometheus_client.disable_created_metrics()
+
+# --- Metrics recorded on the hot paths ---
+
+http_request_duration = Histogram(
+    "linkshorty_http_request_duration_seconds",
+    "Time to serve a request, by route template and response status.",
+    ("method", "route", "status"),
+    buckets=LATENCY_BUCKETS,
+)
+db_queries = Counter(
+    "linkshorty_db_queries",
+    "SQL statements executed, by engine.",
+    ("engine",),
+)
+db_pool_wait = Histogram(
+    "linkshorty_db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    ("engine",),
+    buckets=tuple(bound / 1000 for bound in BUCKETS_MS),
+)
+db_pool_timeouts = Counter(
+    "linkshorty_db_pool_timeouts",
+    "Requests that gave up waiting for a pooled connection.",
+    ("engine",),
+)
+click_flush_duration = Histogram(
+    "linkshorty_click_flush_duration_seconds",
+    "Time to write one batch of buffered clicks.",
+    buckets=LATENCY_BUCKETS,
+)
+password_hash_duration = Histogram(
+    "linkshorty_password_hash_duration_seconds",
+    "Time bcrypt took to hash or check one password.",
+    buckets=LATENCY_BUCKETS,
+)
+password_hash_queue_wait = Histogram(
+    "linkshorty_password_hash_queue_wait_seconds",
+    "Time a password hash waited for a hashing worker.",
+    buckets=LATENCY_BUCKETS,
+)
+emails_sent = Counter(
+    "linkshorty_emails",
+    "Emails attempted, by kind and outcome (sent, failed, not_configured).",
+    ("kind", "outcome"),
+)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request into http_request_duration."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500  # If the app raises before responding
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Templates, not raw paths, so every short code shares one series
+            route = scope.get("route")
+            http_request_duration.labels(
+                scope["method"], route.path if route is not None else "(unmatched)", str(status_code),
+            ).observe(time.perf_counter() - started)
+
+
+# --- Metrics read from the running components at scrape time ---
+
+class ScrapeTimeMetric:
+    """A counter or gauge whose (label values, value) pairs come from `read()`."""
+
+    def __init__(self, name: str, kind: str, documentation: str, labelnames: tuple[str, ...],
+                 read: Callable[[], Iterable[tuple[tuple, float]]]):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.read = read
+
+    def values(self) -> list[tuple[tuple, float]]:
+        try:
+            return list(self.read())
+        except Exception:
+            logger.exception("Error collecting metric %s", self.name)
+            return []
+
+
+class ScrapeTimeCollector(Collector):
+    """Reports the scrape-time metrics of this process to a registry."""
+
+    def __init__(self, metrics: list[ScrapeTimeMetric]):
+        self.metrics = metrics
+
+    def collect(self):
+        for metric in self.metrics:
+            family_class = CounterMetricFamily if metric.kind == "counter" else GaugeMetricFamily
+            family = family_class(metric.name, metric.documentation, labels=metric.labelnames)
+            for labelvalues, value in metric.values():
+                family.add_metric(labelvalues, value)
+            yield family
+
+
+class MultiprocessPublisher:
+    """
+    Copies this worker's scrape-time metrics to the multiprocess files:
+    counters by what they went up since the last copy, gauges as they are,
+    summed over the live workers.
+    """
+
+    def __init__(self, metrics: list[ScrapeTimeMetric]):
+        self._metrics = [
+            (
+                metric,
+                Counter(metric.name, metric.documentation, metric.labelnames, registry=None)
+                if metric.kind == "counter"
+                else Gauge(metric.name, metric.documentation, metric.labelnames, registry=None,
+                           multiprocess_mode="livesum"),
+            )
+            for metric in metrics
+        ]
+        self._published: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def publish(self) -> None:
+        with self._lock:
+            for metric, target in self._metrics:
+                for labelvalues, value in metric.values():
+                    child = target.labels(*labelvalues)
+                    if metric.kind != "counter":
+                        child.set(value)
+                        continue
+                    key = (metric.name, labelvalues)
+                    previous = self._published.get(key, 0)
+                    # Lower than last time means the owner started counting over
+                    child.inc(value - previous if value >= previous else value)
+                    self._published[key] = value
+
+    def start(self, interval: float) -> None:
+        def run():
+            while True:
+                time.sleep(interval)
+                self.publish()
+
+        threading.Thread(target=run, name="metrics-publisher", daemon=True).start()
+
+
+def forget_dead_workers(path: str) -> None:
+    """
+    Drops the live gauges of workers that exited: uvicorn restarts workers
+    without telling prometheus_client, which would keep summing their last
+    values.
+    """
+    pids = set()
+    for filename in os.listdir(path):
+        match = re.fullmatch(r"gauge_live\w+_(\d+)\.db", filename)
+        if match:
+            pids.add(int(match.group(1)))
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid, path)
+        except PermissionError:  # Alive, someone else's
+            pass
+
+
+_publisher: Optional[MultiprocessPublisher] = None
+
+
+def install_collectors() -> None:
+    """Registers the scrape-time metrics and the query and pool hooks. Called once by app.main."""
+    global _publisher
+    from sqlalchemy import event
+
+    from app.core.cache import link_cache, user_cache
+    from app.core.click_ingest import click_ingestor
+    from app.core.password_hashing import password_hasher
+    from app.db import database
+
+    engines = {"sync": (database.engine, database.sync_pool_monitor),
+               "async": (database.async_engine.sync_engine, database.async_pool_monitor)}
+    for name, (engine, monitor) in engines.items():
+        queries = db_queries.labels(name)
+        event.listen(engine, "before_cursor_execute", lambda *_, queries=queries: queries.inc())
+        wait, timeouts = db_pool_wait.labels(name), db_pool_timeouts.labels(name)
+
+        def on_wait(seconds: float, timed_out: bool, wait=wait, timeouts=timeouts) -> None:
+            wait.observe(seconds)
+            if timed_out:
+                timeouts.inc()
+
+        monitor.on_wait = on_wait
+
+    def cache_requests():
+        for cache in (link_cache, user_cache):
+            for tier, backend in (("near", cache.near), ("far", cache.far)):
+                if backend is None:
+                    continue
+                stats = backend.stats()
+                yield (cache.name, tier, "hit"), stats["hits"]
+                yield (cache.name, tier, "miss"), stats["misses"]
+
+    def click_ingest_gauges():
+        stats = click_ingestor.stats()
+        yield ("queued",), stats["queue_depth"]
+        yield ("capacity",), stats["queue_maxsize"]
+
+    def click_ingest_counters():
+        stats = click_ingestor.stats()
+        yield ("written",), stats["flushed"]
+        yield ("skipped",), stats["skipped"]
+        yield ("dropped",), stats["dropped"]
+
+    def pool_gauges():
+        for name, (engine, monitor) in engines.items():
+            stats = monitor.stats(engine)
+            for key in ("size", "checked_out", "overflow"):
+                if key in stats:
+                    yield (name, key), stats[key]
+
+    def password_hashing():
+        stats = password_hasher.stats()
+        yield ("running",), stats["running"]
+        yield ("queued",), stats["queue_depth"]
+
+    scrape_time_metrics = [
+        ScrapeTimeMetric("linkshorty_cache_requests", "counter",
+                         "Cache lookups by cache, tier and result; the redirect cache is cache=\"links\".",
+                         ("cache", "tier", "result"), cache_requests),
+        ScrapeTimeMetric("linkshorty_click_ingest_queue", "gauge",
+                         "Clicks waiting for the writer, and the queue's capacity.", ("state",), click_ingest_gauges),
+        ScrapeTimeMetric("linkshorty_click_ingest_clicks", "counter",
+                         "Clicks the writer wrote, skipped (link deleted) or dropped.", ("outcome",),
+                         click_ingest_counters),
+        ScrapeTimeMetric("linkshorty_db_pool_connections", "gauge",
+                         "Connection pool size, checked-out and overflow connections.", ("engine", "state"),
+                         pool_gauges),
+        ScrapeTimeMetric("linkshorty_password_hash_tasks", "gauge",
+                         "bcrypt hashes running and waiting on the hashing pool.", ("state",), password_hashing),
+    ]
+    if MULTIPROCESS_DIR:
+        forget_dead_workers(MULTIPROCESS_DIR)
+        _publisher = MultiprocessPublisher(scrape_time_metrics)
+        _publisher.start(settings.METRICS_PUBLISH_SECONDS)
+    else:
+        REGISTRY.register(ScrapeTimeCollector(scrape_time_metrics))
+
+
+def render() -> bytes:
+    """The /metrics body: this process's metrics, or every worker's in multiprocess mode."""
+    if not MULTIPROCESS_DIR:
+        return prometheus_client.generate_latest(REGISTRY)
+    if _publisher is not None:
+        _publisher.publish()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry)
+
+
+# --- Separate listener ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the logs
+
+
+class MetricsServer:
+    """
+    Serves /metrics on its own port from a daemon thread, away from the
+    public API. With several workers only the first binds the port, which
+    only reports them all in multiprocess mode.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> None:
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        except OSError:
+            if MULTIPROCESS_DIR:
+                logger.info("Metrics port %s:%s taken, another worker serves them", self.host, self.port)
+            else:
+                logger.error(
+                    "Can't listen on the metrics port %s:%s; if another worker holds it, set "
+                    "PROMETHEUS_MULTIPROC_DIR so it reports this one's metrics too",
+                    self.host, self.port, exc_info=True,
+                )
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
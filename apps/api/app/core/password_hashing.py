@@ -0,0 +1,116 @@
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.core import security
+from app.core.config import settings
+from app.core.metrics import password_hash_duration, password_hash_queue_wait
+
+
+class HashingPoolSaturated(Exception):
+    """Every hashing worker is busy and the wait queue is full (served as a 503)."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so threads hash in parallel, but each hash is
+    ~250ms of CPU. Left on the shared threadpool, a login burst could start
+    dozens of them at once and starve the event loop of CPU; here at most
+    `workers` run at a time and at most `queue_limit` more wait. Past that,
+    callers get HashingPoolSaturated right away instead of queueing for
+    seconds.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        # Counters for monitoring
+        self._pending = 0  # Queued or running
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._hash_seconds: deque[float] = deque(maxlen=1000)
+        self._wait_seconds: deque[float] = deque(maxlen=1000)
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HashingPoolSaturated()
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        queued_at = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self.completed += 1
+                    self._hash_seconds.append(finished - started)
+                    self._wait_seconds.append(started - queued_at)
+                password_hash_duration.observe(finished - started)
+                password_hash_queue_wait.observe(started - queued_at)
+
+        try:
+            return self._executor.submit(task)
+        except RuntimeError:  # Shut down
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(security.get_password_hash, password))
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self._submit(security.verify_password, plain_password, hashed_password))
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _quantiles(samples) -> dict:
+        if len(samples) < 2:
+            return {"p50_ms": None, "p99_ms": None}
+        cuts = statistics.quantiles(samples, n=100)
+        return {"p50_ms": round(cuts[49] * 1000, 2), "p99_ms": round(cuts[98] * 1000, 2)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            hash_seconds = list(self._hash_seconds)
+            wait_seconds = list(self._wait_seconds)
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "running": self._running,
+                "queue_depth": self._pending - self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                # Over the last 1000 hashes
+                "hash_latency": self._quantiles(hash_seconds),
+                "queue_wait": self._quantiles(wait_seconds),
+            }
+
+
+# Single, importable instance used by registration and login
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
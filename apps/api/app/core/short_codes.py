@@ -0,0 +1,197 @@
+import threading
+from collections import deque
+from hashlib import blake2b
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.db import database, models
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+# Legacy token_urlsafe(6) codes are 8 characters, so 7 can't clash with them;
+# 62**7 is ~3.5 trillion codes
+CODE_LENGTH = 7
+
+
+class FeistelPermutation:
+    """
+    Keyed bijection of [0, 62**length).
+
+    A balanced Feistel network over the smallest even number of bits that
+    covers the domain, with keyed blake2b as the round function. Outputs that
+    fall outside the domain are fed through again ("cycle walking"), which
+    keeps the mapping a bijection on the domain itself; on average that takes
+    1.25 passes for 7 base62 characters.
+    """
+
+    def __init__(self, key: bytes, length: int, rounds: int = 4):
+        self.length = length
+        self.domain = len(ALPHABET) ** length
+        half_bits = ((self.domain - 1).bit_length() + 1) // 2
+        self.half_bits = half_bits
+        self.half_mask = (1 << half_bits) - 1
+        self.rounds = rounds
+        self.key = blake2b(key, digest_size=32, person=b"short-codes").digest()
+
+    def _round(self, i: int, value: int) -> int:
+        digest = blake2b(value.to_bytes(8, "little"), key=self.key, digest_size=8, salt=i.to_bytes(16, "little")).digest()
+        return int.from_bytes(digest, "little") & self.half_mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for i in range(self.rounds):
+            left, right = right, left ^ self._round(i, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.domain:
+            raise ValueError(f"{value} is outside the code space")
+        value = self._encrypt(value)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+    def encode(self, value: int) -> str:
+        """The fixed-length base62 code for sequence number `value`."""
+        n = self.permute(value)
+        chars = []
+        for _ in range(self.length):
+            n, digit = divmod(n, len(ALPHABET))
+            chars.append(ALPHABET[digit])
+        return "".join(reversed(chars))
+
+
+class ShortCodeAllocator:
+    """
+    Hands out unique short codes without checking the links table.
+
+    Each worker reserves a block of sequence numbers from the
+    `short_code_sequence` row (one UPDATE per block) and maps them through
+    the keyed permutation, so consecutive links get unrelated-looking codes
+    and two sequence numbers can never give the same code. Legacy codes are
+    8 characters long, the allocated ones 7, so the two never collide.
+
+    Numbers left in a block when a worker exits are simply never used.
+    """
+
+    SEQUENCE_ID = 1
+
+    def __init__(self, key: bytes, length: int, block_size: int):
+        self.permutation = FeistelPermutation(key, length)
+        self.block_size = block_size
+        self._blocks: deque[list[int]] = deque()
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reserved_blocks = 0
+
+    def _take(self, n: int) -> list[int]:
+        """Up to `n` sequence numbers from the reserved blocks."""
+        values = []
+        with self._lock:
+            while self._blocks and len(values) < n:
+                block = self._blocks[0]
+                count = min(n - len(values), block[1] - block[0])
+                values.extend(range(block[0], block[0] + count))
+                block[0] += count
+                if block[0] == block[1]:
+                    self._blocks.popleft()
+            self.allocated += len(values)
+        return values
+
+    def _add_block(self, start: int, size: int) -> None:
+        with self._lock:
+            self._blocks.append([start, start + size])
+            self.reserved_blocks += 1
+
+    def _reserve_statements(self, size: int):
+        sequence = models.ShortCodeSequence.__table__
+        bump = (
+            update(sequence)
+            .where(sequence.c.id == self.SEQUENCE_ID)
+            .values(next_value=sequence.c.next_value + size)
+        )
+        read = select(sequence.c.next_value).where(sequence.c.id == self.SEQUENCE_ID)
+        create = insert(sequence).values(id=self.SEQUENCE_ID, next_value=size)
+        return bump, read, create
+
+    def reserve_block_sync(self, size: int) -> int:
+        """Claims the next `size` numbers in their own transaction and returns the first."""
+        bump, read, create = self._reserve_statements(size)
+        while True:
+            with database.SessionLocal() as db:
+                # The UPDATE locks the row until commit, so the read-back is ours
+                if db.execute(bump).rowcount:
+                    end = db.execute(read).scalar_one()
+                    db.commit()
+                    return end - size
+                try:
+                    db.execute(create)
+                    db.commit()
+                    return 0
+                except IntegrityError:
+                    # Another worker created the row first, bump it instead
+                    db.rollback()
+
+    async def reserve_block(self, size: int) -> int:
+        bump, read, create = self._reserve_statements(size)
+        while True:
+            async with database.AsyncSessionLocal() as db:
+                if (await db.execute(bump)).rowcount:
+                    end = (await db.execute(read)).scalar_one()
+                    await db.commit()
+                    return end - size
+                try:
+                    await db.execute(create)
+                    await db.commit()
+                    return 0
+                except IntegrityError:
+                    await db.rollback()
+
+    def _block_size_for(self, missing: int) -> int:
+        # Whole blocks, so a bulk request doesn't leave odd-sized remainders
+        return -(-missing // self.block_size) * self.block_size
+
+    async def next_codes(self, n: int) -> list[str]:
+        """`n` fresh codes, reserving as many blocks as needed in one round trip."""
+        values = self._take(n)
+        # Concurrent callers may each reserve when the blocks run out; the
+        # extra blocks are queued and used up, not wasted
+        while len(values) < n:
+            size = self._block_size_for(n - len(values))
+            self._add_block(await self.reserve_block(size), size)
+            values.extend(self._take(n - len(values)))
+        return [self.permutation.encode(value) for value in values]
+
+    def next_codes_sync(self, n: int) -> list[str]:
+        values = self._take(n)
+        while len(values) < n:
+            size = self._block_size_for(n - len(values))
+            self._add_block(self.reserve_block_sync(size), size)
+            values.extend(self._take(n - len(values)))
+        return [self.permutation.encode(value) for value in values]
+
+    async def next_code(self) -> str:
+        return (await self.next_codes(1))[0]
+
+    def next_code_sync(self) -> str:
+        return self.next_codes_sync(1)[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            remaining = sum(end - start for start, end in self._blocks)
+        return {
+            "code_length": self.permutation.length,
+            "block_size": self.block_size,
+            "reserved_blocks": self.reserved_blocks,
+            "allocated": self.allocated,
+            "remaining_in_blocks": remaining,
+        }
+
+
+# Single, importable instance shared by the sync and async create paths
+short_code_allocator = ShortCodeAllocator(
+    key=(settings.SHORT_CODE_KEY or settings.SECRET_KEY).encode(),
+    length=CODE_LENGTH,
+    block_size=settings.SHORT_CODE_BLOCK_SIZE,
+)
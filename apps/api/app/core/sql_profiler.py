@@ -0,0 +1,154 @@
+"""
+Opt-in per-request SQL profiling (SQL_PROFILING_ENABLED).
+
+Engine events count every statement a request runs, the time spent in the
+database, and how often each statement shape repeats; a shape that repeats
+SQL_PROFILE_REPEAT_THRESHOLD times or more is reported as a likely N+1.
+The summary goes out in X-DB-* response headers (covering the queries run
+before the response started) and, when something is flagged, in a log line
+covering the whole request.
+
+Endpoints can declare how many statements they may run with @query_budget.
+With SQL_QUERY_BUDGET_ENFORCE on (tests, CI), the statement that goes over
+the budget raises QueryBudgetExceeded instead of running.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    """An endpoint ran more statements than its @query_budget allows."""
+
+
+def query_budget(max_queries: int):
+    """
+    Declares how many SQL statements an endpoint may run per request,
+    dependencies included. Put it under the route decorator.
+    """
+    def decorate(endpoint):
+        endpoint.__query_budget__ = max_queries
+        return endpoint
+    return decorate
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with IN lists of any length collapsed, so batches of one shape compare equal."""
+    return _WHITESPACE.sub(" ", _IN_LIST.sub("(...)", statement)).strip()
+
+
+class RequestProfile:
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {route.path if route is not None else '(unmatched)'}"
+
+    @property
+    def budget(self) -> Optional[int]:
+        # The router has put the endpoint in the scope by the time it runs
+        return getattr(self.scope.get("endpoint"), "__query_budget__", None)
+
+    def repeated(self) -> list[tuple[str, int]]:
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= settings.SQL_PROFILE_REPEAT_THRESHOLD
+        ]
+
+    def headers(self) -> list[tuple[bytes, bytes]]:
+        headers = [
+            (b"x-db-query-count", str(self.count).encode()),
+            (b"x-db-time-ms", f"{self.seconds * 1000:.2f}".encode()),
+        ]
+        repeated = self.repeated()
+        if repeated:
+            headers.append((b"x-db-n-plus-one", ", ".join(f"{count}x" for _, count in repeated).encode()))
+        return headers
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is None:
+        return
+    budget = profile.budget
+    if settings.SQL_QUERY_BUDGET_ENFORCE and budget is not None and profile.count >= budget:
+        raise QueryBudgetExceeded(
+            f"{profile.route} exceeded its budget of {budget} queries, next one was: {statement_shape(statement)}"
+        )
+    conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    started = conn.info.get("profile_started")
+    if profile is None or not started:
+        return
+    profile.seconds += time.perf_counter() - started.pop()
+    profile.count += 1
+    profile.shapes[statement_shape(statement)] += 1
+
+
+def install(*engines) -> None:
+    """Starts profiling statements run on `engines` (sync engines, or async_engine.sync_engine)."""
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLProfilerMiddleware:
+    """Gives each HTTP request a RequestProfile and reports it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(scope)
+        token = current_profile.set(profile)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + profile.headers()}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            current_profile.reset(token)
+            self._log(profile)
+
+    @staticmethod
+    def _log(profile: RequestProfile) -> None:
+        repeated = profile.repeated()
+        budget = profile.budget
+        over_budget = budget is not None and profile.count > budget
+        if not repeated and not over_budget:
+            return
+        logger.warning(
+            "SQL profile %s: %d queries, %.1f ms%s%s",
+            profile.route, profile.count, profile.seconds * 1000,
+            f" (budget {budget})" if over_budget else "",
+            "".join(f"\n  possible N+1, {count}x: {shape[:300]}" for shape, count in repeated),
+        )
@@ -0,0 +1,43 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+from user_agents import parse
+
+from app.core.config import settings
+
+
+class UserAgentInfo(NamedTuple):
+    """Everything the click log needs from a User-Agent header."""
+    browser: str
+    device_type: str
+    is_bot: bool
+
+
+@lru_cache(maxsize=settings.UA_CACHE_MAXSIZE)
+def _classify(user_agent_str: str) -> UserAgentInfo:
+    try:
+        ua = parse(user_agent_str)
+    except Exception:
+        return UserAgentInfo(browser="unknown", device_type="desktop", is_bot=False)
+
+    device_type = "mobile" if ua.is_mobile else "tablet" if ua.is_tablet else "desktop"
+    return UserAgentInfo(browser=ua.browser.family, device_type=device_type, is_bot=ua.is_bot)
+
+
+def classify_user_agent(user_agent_str: str | None) -> UserAgentInfo:
+    """
+    Parses a User-Agent header once and returns browser, device type and bot flag.
+    Results are memoized per UA string, since real traffic only has a few
+    thousand distinct ones.
+    """
+    return _classify(user_agent_str or "")
+
+
+def user_agent_cache_stats() -> dict:
+    info = _classify.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
@@ -1,20 +1,30 @@
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session, joinedload, subqueryload
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session, joinedload, subqueryload, selectinload
 from .db import models, schemas
 from .core.security import get_password_hash
 from app.core.config import settings
-from typing import List
-from sqlalchemy import func, cast, Date, Interval, desc
+from app.core.cache import CachedLink, link_cache, user_cache
+from app.core.bloom import short_code_filter
+from app.core.short_codes import short_code_allocator
+from app.core import counters  # Registers the flush hook that maintains stat_counters
+from app.core import click_archive
+from typing import List, Optional
+from sqlalchemy import func, cast, Date, Interval, desc, select, update, delete, insert, literal, and_, or_, union_all, case
+from collections import Counter
+from .db.dialect import truncate_datetime
 from sqlalchemy.sql import extract
 
+import base64
+import json
 import secrets
 
 # --- Helper Functions ---
 
-def convert_db_link_to_schema(db_link: models.Link, click_count: int = None) -> dict:
+def convert_db_link_to_schema(db_link: models.Link, click_count: int = None, owner=None) -> dict:
     """
     Safely converts a Link database object into a dictionary
     that matches the schemas.Link Pydantic model.
+    Pass `owner` when it's already at hand, so the relationship isn't loaded.
     """
     if db_link is None:
         return None
@@ -27,12 +37,15 @@ def convert_db_link_to_schema(db_link: models.Link, click_count: int = None) ->
         expires_in_days = max(delta.days, 0)
 
     # Convert owner to UserOut schema if it exists, otherwise None
-    owner_out = schemas.UserOut.from_orm(db_link.owner) if db_link.owner else None
+    if owner is None:
+        owner = db_link.owner
+    owner_out = schemas.UserOut.from_orm(owner) if owner else None
 
     if click_count is not None:
         computed_clicks = click_count
     else:
-        computed_clicks = len(db_link.clicks) if hasattr(db_link, 'clicks') and db_link.clicks else 0
+        # Maintained counter, avoids loading every click row
+        computed_clicks = db_link.click_count or 0
 
     return {
         "id": db_link.id,
@@ -49,12 +62,69 @@ def convert_db_link_to_schema(db_link: models.Link, click_count: int = None) ->
         "owner": owner_out # Include the owner details
     }
 
-def convert_db_links_to_schemas(db_links: List[any]) -> List[dict]:
-    """Applies the conversion to a list of link objects or (link, count) tuples."""
+# --- Keyset pagination ---
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    """Opaque cursor pointing just past the given (created_at, id) row."""
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    """Raises ValueError for anything encode_cursor didn't produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return (datetime.fromisoformat(created_at) if created_at is not None else None), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def paginate_newest_first(query, model, cursor: Optional[str], limit: int):
+    """
+    One page of `query`, newest first by (created_at, id), and the cursor of
+    the next page (None on the last one). Seeks past the cursor instead of
+    using OFFSET, so every page costs the same given an index ending in
+    (created_at, id).
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # MySQL and SQLite sort NULL lowest, so rows without a created_at
+        # come after all the others, newest id first
+        if created_at is None:
+            query = query.filter(model.created_at.is_(None), model.id < row_id)
+        else:
+            query = query.filter(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < row_id),
+                model.created_at.is_(None),
+            ))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+def filter_links(query, tag: Optional[str] = None, status: Optional[str] = None):
+    """Applies the optional tag and "active"/"expired" filters of the link listings."""
+    if tag is not None:
+        query = query.filter(models.Link.tag == tag)
+    if status is not None:
+        # Expired once expires_at is in the past, like is_expired and /links/expired
+        now = datetime.utcnow()
+        if status == "expired":
+            query = query.filter(models.Link.expires_at < now)
+        else:
+            query = query.filter(or_(models.Link.expires_at.is_(None), models.Link.expires_at >= now))
+    return query
+
+def convert_db_links_to_schemas(db_links: List[any], owner=None) -> List[dict]:
+    """
+    Applies the conversion to a list of link objects or (link, count) tuples.
+    Pass `owner` when every link belongs to the same, already loaded user.
+    """
     results = []
     for item in db_links:
         if isinstance(item, models.Link):
-             results.append(convert_db_link_to_schema(item))
+             results.append(convert_db_link_to_schema(item, owner=owner))
         else:
              # Expecting Row/Tuple (models.Link, count)
              try:
@@ -76,8 +146,42 @@ def get_mysql_date_trunc(column, interval):
         return func.date_format(column, '%Y-01-01')
     return func.date(column) # Default to day
 
+def truncate_to_bucket(moment: datetime, granularity: str) -> datetime:
+    """Start of the hour or day containing `moment` (the click_rollups buckets)."""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def build_click_rollups(clicks: List[dict]) -> List[dict]:
+    """
+    Aggregates a batch of click rows into click_rollups rows, one per
+    (link, granularity, bucket, dimension, value), sorted by key so
+    concurrent writers lock rows in the same order.
+    """
+    counts = Counter()
+    for click in clicks:
+        for granularity in models.ClickRollup.GRANULARITIES:
+            bucket = truncate_to_bucket(click["created_at"], granularity)
+            counts[(click["link_id"], granularity, bucket, "total", "")] += 1
+            for dimension in models.ClickRollup.DIMENSIONS[1:]:
+                value = click.get(dimension) or ""
+                counts[(click["link_id"], granularity, bucket, dimension, value)] += 1
+    return [
+        {"link_id": link_id, "granularity": granularity, "bucket": bucket,
+         "dimension": dimension, "value": value, "count": count}
+        for (link_id, granularity, bucket, dimension, value), count in sorted(counts.items())
+    ]
+
 # --- User CRUD (Operations) ---
 
+def is_superuser_email(email: str) -> bool:
+    """Checks whether a new account should be created as a superuser."""
+    superuser_list = []
+    if isinstance(settings.SUPERUSER_EMAILS, str):
+        # Only split if it's actually a string
+        superuser_list = [address.strip() for address in settings.SUPERUSER_EMAILS.split(",")]
+    return email in superuser_list
+
 def get_user_by_email(db: Session, email: str):
     """Fetches a single user by their email address."""
     return db.query(models.User).filter(models.User.email == email).first()
@@ -85,18 +189,10 @@ def get_user_by_email(db: Session, email: str):
 def create_user(db: Session, user: schemas.UserCreate):
     """Creates a new user in the database."""
     hashed_password = get_password_hash(user.password)
-    superuser_list = []
-    if isinstance(settings.SUPERUSER_EMAILS, str):
-        # Only split if it's actually a string
-        superuser_list = [email.strip() for email in settings.SUPERUSER_EMAILS.split(",")]
-
-    is_superuser = user.email in superuser_list
-    
-    
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
-        is_superuser=is_superuser
+        is_superuser=is_superuser_email(user.email)
     )
     db.add(db_user)
     db.commit()
@@ -114,11 +210,23 @@ def get_link_by_short_code(db: Session, short_code: str):
         .first()
     )
 
+def resolve_short_code(db: Session, short_code: str) -> CachedLink | None:
+    """
+    Fetches only the columns a redirect needs, without loading the owner.
+    """
+    row = (
+        db.query(models.Link.id, models.Link.original_url, models.Link.expires_at)
+        .filter(models.Link.short_code == short_code)
+        .first()
+    )
+    if row is None:
+        return None
+    return CachedLink(id=row.id, original_url=row.original_url, expires_at=row.expires_at)
+
 def create_db_link(db: Session, original_url: str, user_id: int, tag: str | None = None):
     """Creates a new short link in the database."""
-    short_code = secrets.token_urlsafe(6)
-    while get_link_by_short_code(db, short_code):
-        short_code = secrets.token_urlsafe(6)
+    # Allocated codes are unique by construction, no lookup needed
+    short_code = short_code_allocator.next_code_sync()
     expires_at = datetime.utcnow() + timedelta(days=30)
     db_link = models.Link(
         original_url=original_url,
@@ -132,17 +240,14 @@ def create_db_link(db: Session, original_url: str, user_id: int, tag: str | None
     db.refresh(db_link)
     return db_link # Return the DB object
 
-def get_links_by_user(db: Session, user_id: int) -> List[models.Link]:
-    """Gets all links for a specific user."""
-    return (
-        db.query(models.Link, func.count(models.Click.id).label('click_count'))
-        .outerjoin(models.Click, models.Link.id == models.Click.link_id)
-        .options(joinedload(models.Link.owner))
-        .filter(models.Link.owner_id == user_id)
-        .group_by(models.Link.id)
-        .order_by(models.Link.created_at.desc())
-        .all()
-    )
+def get_links_by_user(db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 100,
+                      tag: Optional[str] = None, status: Optional[str] = None):
+    """
+    Gets one page of a user's links, newest first, and the next page's
+    cursor. The owner isn't loaded: the caller already has the user.
+    """
+    query = db.query(models.Link).filter(models.Link.owner_id == user_id)
+    return paginate_newest_first(filter_links(query, tag, status), models.Link, cursor, limit)
     
 def get_link_by_id_and_owner(db: Session, link_id: int, user_id: int) -> models.Link | None:
     """
@@ -166,28 +271,283 @@ def delete_link(db: Session, link_id: int, user_id: int) -> models.Link | None:
 
 # --- Click CRUD (Operations) ---
 
-def create_click_log(
-    db: Session,
-    link_id: int,
-    ip_address: str | None = None,
-    country: str | None = None,
-    referrer: str | None = None,
-    browser: str | None = None,
-    device_type: str | None = None
-):
-    """Logs a new click for a specific link with all analytics data."""
-    db_log = models.Click(
-        link_id=link_id,
-        ip_address=ip_address,
-        country=country,
-        referrer=referrer,
-        browser=browser,
-        device_type=device_type
+def reconcile_click_counts(db: Session, first_id: int, last_id: int,
+                           horizon: Optional[datetime] = None) -> int:
+    """
+    Recomputes click_count and last_clicked_at from the clicks table for
+    links with first_id <= id <= last_id, touching only rows that drifted.
+    Runs as one UPDATE so concurrent increments from the click writer
+    aren't lost. Returns the number of links repaired.
+
+    With a `horizon` (get_archive_horizon), the clicks before it have been
+    archived: they're counted from the daily rollups instead, and a link
+    whose last click was archived keeps its last_clicked_at if it falls in
+    that click's hour, or gets the start of the hour otherwise.
+    """
+    live = [models.Click.link_id == models.Link.id]
+    if horizon is not None:
+        live.append(models.Click.created_at >= horizon)
+    click_count = select(func.count(models.Click.id)).where(*live).scalar_subquery()
+    last_clicked_at = select(func.max(models.Click.created_at)).where(*live).scalar_subquery()
+    if horizon is not None:
+        def archived(granularity, aggregate):
+            return (
+                select(aggregate)
+                .where(
+                    models.ClickRollup.link_id == models.Link.id,
+                    models.ClickRollup.granularity == granularity,
+                    models.ClickRollup.dimension == "total",
+                    models.ClickRollup.bucket < horizon,
+                )
+                .scalar_subquery()
+            )
+        click_count = click_count + func.coalesce(archived("day", func.sum(models.ClickRollup.count)), 0)
+        last_archived_hour = archived("hour", func.max(models.ClickRollup.bucket))
+        last_clicked_at = func.coalesce(last_clicked_at, case(
+            (and_(models.Link.last_clicked_at >= last_archived_hour, models.Link.last_clicked_at < horizon),
+             models.Link.last_clicked_at),
+            else_=last_archived_hour,
+        ))
+    result = db.execute(
+        update(models.Link)
+        .where(models.Link.id.between(first_id, last_id))
+        .where(
+            (models.Link.click_count != click_count)
+            | models.Link.last_clicked_at.is_distinct_from(last_clicked_at)
+        )
+        .values(click_count=click_count, last_clicked_at=last_clicked_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+def rebuild_click_rollups(db: Session, first_link_id: int, last_link_id: int,
+                          since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+    """
+    Recomputes click_rollups from the raw clicks of links with
+    first_link_id <= id <= last_link_id, in one transaction. With `since`
+    and/or `until` (whole days) only the buckets in that window are
+    rebuilt, e.g. to leave alone the rollups of archived clicks, which are
+    all that's left of them.
+
+    The old rows are deleted first: on InnoDB that locks the range, so the
+    click writer's upserts for these links wait until the new rows are in
+    and then add their clicks on top, instead of being lost or counted twice.
+    Returns the number of rollup rows written.
+    """
+    dialect_name = db.get_bind().dialect.name
+    clicks = [models.Click.link_id.between(first_link_id, last_link_id)]
+    rollups = [models.ClickRollup.link_id.between(first_link_id, last_link_id)]
+    if since is not None:
+        clicks.append(models.Click.created_at >= since)
+        rollups.append(models.ClickRollup.bucket >= since)
+    if until is not None:
+        clicks.append(models.Click.created_at < until)
+        rollups.append(models.ClickRollup.bucket < until)
+    db.execute(delete(models.ClickRollup).where(*rollups))
+    written = 0
+    for granularity in models.ClickRollup.GRANULARITIES:
+        bucket = truncate_datetime(dialect_name, models.Click.created_at, granularity)
+        for dimension in models.ClickRollup.DIMENSIONS:
+            group_by = [models.Click.link_id, bucket]
+            if dimension == "total":
+                value = literal("")
+            else:
+                value = func.coalesce(getattr(models.Click, dimension), "")
+                group_by.append(value)
+            aggregated = (
+                select(
+                    models.Click.link_id,
+                    literal(granularity),
+                    bucket,
+                    literal(dimension),
+                    value,
+                    func.count(models.Click.id),
+                )
+                .where(*clicks)
+                .group_by(*group_by)
+            )
+            result = db.execute(
+                insert(models.ClickRollup).from_select(
+                    ["link_id", "granularity", "bucket", "dimension", "value", "count"],
+                    aggregated,
+                )
+            )
+            written += max(result.rowcount, 0)
+    db.commit()
+    return written
+
+def rebuild_stat_counters(db: Session, since: datetime) -> dict:
+    """
+    Recomputes stat_counters from the tables, in one transaction: the
+    running totals, and the hourly rows from `since` on (older hourly rows
+    are left alone). Like rebuild_click_rollups, the old rows are deleted
+    first so the writers' upserts queue behind the rebuild and land on top
+    of it. Archived clicks count towards the total, and the hourly rows of
+    archived days are kept. The rebuilt rows all go in shard 0, in place of
+    every shard. Returns the new totals.
+    """
+    dialect_name = db.get_bind().dialect.name
+    counter = models.StatCounter
+    horizon = get_archive_horizon(db)
+    if horizon is not None:
+        since = max(since, horizon)
+    db.execute(
+        delete(counter)
+        .where(or_(counter.bucket == counter.TOTAL_BUCKET, counter.bucket >= since))
+    )
+    totals = {}
+    for name, model in (("users", models.User), ("links", models.Link), ("clicks", models.Click)):
+        query = db.query(func.count()).select_from(model)
+        if model is models.Click and horizon is not None:
+            query = query.filter(model.created_at >= horizon)
+        totals[name] = query.scalar()
+        if model is models.Click and horizon is not None:
+            totals[name] += get_archived_click_count(db)
+        db.add(counter(name=name, bucket=counter.TOTAL_BUCKET, value=totals[name]))
+        bucket = truncate_datetime(dialect_name, model.created_at, "hour")
+        db.execute(
+            insert(counter).from_select(
+                ["name", "bucket", "value"],
+                select(literal(name), bucket, func.count())
+                .where(model.created_at >= since)
+                .group_by(bucket),
+            )
+        )
+    db.commit()
+    return totals
+
+# --- Click archive (see app/core/click_archive.py) ---
+
+def get_archive_horizon(db: Session) -> Optional[datetime]:
+    """Start of the first day whose clicks are still in the clicks table, None if none are archived."""
+    last_day = db.query(func.max(models.ClickArchiveDay.day)).scalar()
+    return click_archive.day_start(last_day + timedelta(days=1)) if last_day is not None else None
+
+def get_archived_click_count(db: Session) -> int:
+    return int(db.query(func.coalesce(func.sum(models.ClickArchiveDay.clicks), 0)).scalar())
+
+def get_archived_days(db: Session, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> List[models.ClickArchiveDay]:
+    """The archived days that overlap start <= created_at < end, oldest first."""
+    first_day, last_day = click_archive.day_bounds(start, end)
+    query = db.query(models.ClickArchiveDay)
+    if first_day is not None:
+        query = query.filter(models.ClickArchiveDay.day >= first_day)
+    if last_day is not None:
+        query = query.filter(models.ClickArchiveDay.day <= last_day)
+    return query.order_by(models.ClickArchiveDay.day).all()
+
+def get_unpurged_archive_days(db: Session) -> List[models.ClickArchiveDay]:
+    """Archived days whose raw clicks aren't all deleted yet, oldest first."""
+    return (
+        db.query(models.ClickArchiveDay)
+        .filter(models.ClickArchiveDay.purged_at.is_(None))
+        .order_by(models.ClickArchiveDay.day)
+        .all()
+    )
+
+def get_first_click_at(db: Session) -> Optional[datetime]:
+    return db.query(func.min(models.Click.created_at)).scalar()
+
+def get_clicks_between_page(db: Session, start: datetime, end: datetime,
+                            after: Optional[tuple[datetime, int]], limit: int) -> List[tuple]:
+    """
+    One keyset page of everyone's clicks with start <= created_at < end, in
+    (created_at, id) order from past `after` = (created_at, id), as tuples
+    in click_archive.COLUMNS order.
+    """
+    query = (
+        select(*(getattr(models.Click, name) for name in click_archive.COLUMNS))
+        .where(models.Click.created_at >= start, models.Click.created_at < end)
+    )
+    if after is not None:
+        after_created_at, after_id = after
+        query = query.where(or_(
+            models.Click.created_at > after_created_at,
+            and_(models.Click.created_at == after_created_at, models.Click.id > after_id),
+        ))
+    return db.execute(query.order_by(models.Click.created_at, models.Click.id).limit(limit)).all()
+
+def get_unrolled_link_ids(db: Session, start: datetime) -> List[int]:
+    """
+    Links whose clicks on the day starting at `start` don't add up to the
+    day's "total" rollup, i.e. whose rollups that day need rebuilding.
+    """
+    per_link = (
+        select(models.Click.link_id, func.count().label("clicks"))
+        .where(models.Click.created_at >= start, models.Click.created_at < start + timedelta(days=1))
+        .group_by(models.Click.link_id)
+        .subquery()
     )
-    db.add(db_log)
+    rollup = models.ClickRollup
+    return db.scalars(
+        select(per_link.c.link_id)
+        .outerjoin(rollup, and_(
+            rollup.link_id == per_link.c.link_id,
+            rollup.granularity == "day",
+            rollup.bucket == start,
+            rollup.dimension == "total",
+            rollup.value == "",
+        ))
+        .where(rollup.count.is_distinct_from(per_link.c.clicks))
+    ).all()
+
+def record_archived_day(db: Session, day: date, clicks: int, last_click_id: int) -> None:
+    db.add(models.ClickArchiveDay(day=day, clicks=clicks, last_click_id=last_click_id))
+    db.commit()
+
+def delete_archived_clicks(db: Session, archived_day: models.ClickArchiveDay, limit: int) -> int:
+    """
+    Deletes up to `limit` raw clicks of an archived day, the oldest first,
+    as one short transaction; clicks that arrived after the day was
+    exported aren't in its file and are left alone. The rows go without
+    the ORM, so the stat_counters total still counts them. Returns the
+    number deleted, 0 once the day is purged.
+    """
+    start = click_archive.day_start(archived_day.day)
+    ids = db.scalars(
+        select(models.Click.id)
+        .where(
+            models.Click.created_at >= start,
+            models.Click.created_at < start + timedelta(days=1),
+            models.Click.id <= archived_day.last_click_id,
+        )
+        .order_by(models.Click.created_at, models.Click.id)
+        .limit(limit)
+    ).all()
+    if ids:
+        db.execute(
+            delete(models.Click)
+            .where(models.Click.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return len(ids)
+
+def mark_archived_day_purged(db: Session, archived_day: models.ClickArchiveDay) -> None:
+    archived_day.purged_at = datetime.utcnow()
+    db.commit()
+
+def get_existing_link_ids(db: Session, link_ids: List[int]) -> List[int]:
+    return db.scalars(select(models.Link.id).where(models.Link.id.in_(link_ids))).all()
+
+def remove_archived_clicks(db: Session, removed: List[datetime]) -> None:
+    """
+    Records that clicks created at the `removed` times were dropped from the
+    archive files, taking them off their days and off the stat_counters in
+    one transaction.
+    """
+    for day, count in sorted(Counter(moment.date() for moment in removed).items()):
+        db.execute(
+            update(models.ClickArchiveDay)
+            .where(models.ClickArchiveDay.day == day)
+            .values(clicks=models.ClickArchiveDay.clicks - count)
+        )
+    rows = counters.counter_rows("clicks", removed=removed, shard=counters.shard_of(db.connection()))
+    if rows:
+        db.execute(counters.increment_statement(db.get_bind().dialect.name), rows)
     db.commit()
-    db.refresh(db_log)
-    return db_log
 
 # --- Admin CRUD ---
 
@@ -200,21 +560,92 @@ def get_link_count(db: Session) -> int:
 def get_click_count(db: Session) -> int:
     return db.query(models.Click).count()
 
-def get_all_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]:
-    return db.query(models.User).offset(skip).limit(limit).all()
+def growth_windows(now: datetime) -> tuple[datetime, datetime]:
+    """Starts of the last-24h and last-7d windows: whole hours, the current one included."""
+    hour = counters.hour_of(now)
+    return hour - timedelta(hours=23), hour - timedelta(hours=7 * 24 - 1)
 
-def get_all_links(db: Session, skip: int = 0, limit: int = 100) -> List[models.Link]:
-    """Gets all links (for admin), eager loading relationships."""
-    return (
-        db.query(models.Link, func.count(models.Click.id).label('click_count'))
-        .outerjoin(models.Click, models.Link.id == models.Click.link_id)
-        .options(joinedload(models.Link.owner))
-        .group_by(models.Link.id)
-        .order_by(models.Link.created_at.desc())
-        .offset(skip)
-        .limit(limit)
+def get_counter_stats(db: Session, now: Optional[datetime] = None) -> dict:
+    """
+    Admin totals and growth read from stat_counters: one running total per
+    table plus at most a week of hourly rows, however big the tables are.
+    """
+    day_start, week_start = growth_windows(now or datetime.utcnow())
+    counter = models.StatCounter
+    is_total = counter.bucket == counter.TOTAL_BUCKET
+    rows = (
+        db.query(
+            counter.name,
+            func.sum(case((is_total, counter.value), else_=0)),
+            func.sum(case((counter.bucket >= day_start, counter.value), else_=0)),
+            func.sum(case((counter.bucket >= week_start, counter.value), else_=0)),
+        )
+        .filter(or_(is_total, counter.bucket >= week_start))
+        .group_by(counter.name)
         .all()
     )
+    stats = {}
+    for name in counter.NAMES:
+        stats.update({f"total_{name}": 0, f"new_{name}_last_24h": 0, f"new_{name}_last_7d": 0})
+    for name, total, last_24h, last_7d in rows:
+        if name in counter.NAMES:
+            stats.update({
+                f"total_{name}": int(total or 0),
+                f"new_{name}_last_24h": int(last_24h or 0),
+                f"new_{name}_last_7d": int(last_7d or 0),
+            })
+    return stats
+
+def get_exact_admin_stats(db: Session, now: Optional[datetime] = None) -> dict:
+    """
+    The same figures as get_counter_stats, counted from the tables
+    themselves (one full scan each). For audits of the counters.
+    """
+    day_start, week_start = growth_windows(now or datetime.utcnow())
+    horizon = get_archive_horizon(db)
+    stats = {}
+    for name, model in (("users", models.User), ("links", models.Link), ("clicks", models.Click)):
+        query = db.query(
+            func.count(),
+            func.sum(case((model.created_at >= day_start, 1), else_=0)),
+            func.sum(case((model.created_at >= week_start, 1), else_=0)),
+        ).select_from(model)
+        if model is models.Click and horizon is not None:
+            # Older clicks are archived: counted from click_archive_days, and
+            # the archived hours of the growth windows from their rollups
+            query = query.filter(model.created_at >= horizon)
+        total, last_24h, last_7d = query.one()
+        if model is models.Click and horizon is not None:
+            total += get_archived_click_count(db)
+            if week_start < horizon:
+                rollup = models.ClickRollup
+                archived_24h, archived_7d = db.query(
+                    func.sum(case((rollup.bucket >= day_start, rollup.count), else_=0)),
+                    func.sum(rollup.count),
+                ).filter(
+                    rollup.granularity == "hour",
+                    rollup.dimension == "total",
+                    rollup.bucket >= week_start,
+                    rollup.bucket < horizon,
+                ).one()
+                last_24h = (last_24h or 0) + (archived_24h or 0)
+                last_7d = (last_7d or 0) + (archived_7d or 0)
+        stats.update({
+            f"total_{name}": total,
+            f"new_{name}_last_24h": int(last_24h or 0),
+            f"new_{name}_last_7d": int(last_7d or 0),
+        })
+    return stats
+
+def get_all_users(db: Session, cursor: Optional[str] = None, limit: int = 100):
+    """Gets one page of users, newest first, and the next page's cursor."""
+    return paginate_newest_first(db.query(models.User), models.User, cursor, limit)
+
+def get_all_links(db: Session, cursor: Optional[str] = None, limit: int = 100,
+                  tag: Optional[str] = None, status: Optional[str] = None):
+    """Gets one page of all links (for admin), eager loading relationships."""
+    query = db.query(models.Link).options(selectinload(models.Link.owner))
+    return paginate_newest_first(filter_links(query, tag, status), models.Link, cursor, limit)
     
 def get_user_registration_stats(db: Session, interval: str = 'day'):
     """
@@ -250,66 +681,196 @@ def get_aggregated_clicks_over_time(db: Session, user_id: int, interval: str = '
     """
     Aggregates total clicks per time interval (day, month, year)
     across all links owned by the specified user.
+    Reads the daily rollups, so the cost grows with days of history, not clicks.
     """
-    date_trunc_map = {
-        'day': func.date(models.Click.created_at),
-        'month': func.date_trunc('month', models.Click.created_at),
-        'year': func.date_trunc('year', models.Click.created_at),
-    }
-
-    if interval not in date_trunc_map:
+    if interval not in ('day', 'month', 'year'):
         interval = 'day' # Default to day if invalid
 
-    date_column = get_mysql_date_trunc(models.Click.created_at, interval).label('date')
-
     results = (
         db.query(
-            date_column,
-            func.count(models.Click.id).label('count')
+            models.ClickRollup.bucket,
+            func.sum(models.ClickRollup.count).label('count')
         )
-        .join(models.Link) # Join Click with Link
+        .join(models.Link, models.Link.id == models.ClickRollup.link_id)
         .filter(models.Link.owner_id == user_id) # Filter by the user owning the link
-        .group_by(date_column)
-        .order_by(date_column) # Order chronologically
+        .filter(models.ClickRollup.granularity == 'day', models.ClickRollup.dimension == 'total')
+        .group_by(models.ClickRollup.bucket)
+        .order_by(models.ClickRollup.bucket) # Order chronologically
         .all()
     )
 
+    return _fold_days(results, interval)
+
+def _fold_days(rows, interval: str) -> List[dict]:
+    """Folds (bucket, count) day rows, in order, into days/months/years."""
+    # YYYY-MM-DD, YYYY-MM-01 or YYYY-01-01
+    date_formats = {'day': '%Y-%m-%d', 'month': '%Y-%m-01', 'year': '%Y-01-01'}
+    totals = {}
+    for row in rows:
+        date = row.bucket.strftime(date_formats[interval])
+        totals[date] = totals.get(date, 0) + int(row.count)
+
     # Format results
-    return [{"date": str(row.date), "count": row.count} for row in results]
+    return [{"date": date, "count": count} for date, count in totals.items()]
+
+def _top_with_other(rows, limit: int) -> dict:
+    """Top N (category, count) rows, sorted by count descending, plus 'Other'."""
+    top_results = rows[:limit]
+    other_count = sum(int(row.count) for row in rows[limit:])
+
+    breakdown = {row.category if row.category else 'Unknown': int(row.count) for row in top_results}
+    if other_count > 0:
+        breakdown['Other'] = other_count
+
+    return breakdown
 
 
 def get_aggregated_breakdown(db: Session, user_id: int, group_by_column: str, limit: int = 10):
     """
     Generic function to aggregate clicks by a specific column (e.g., browser, device_type, country, referrer)
     across all links owned by the specified user, returning top N results + 'Other'.
+    Reads the daily rollups rather than the raw clicks.
     """
     if group_by_column not in ['browser', 'device_type', 'country', 'referrer']:
         raise ValueError("Invalid column for breakdown")
 
-    column_attribute = getattr(models.Click, group_by_column)
-
     # Query to get counts per category
     results = (
         db.query(
-            column_attribute.label('category'),
-            func.count(models.Click.id).label('count')
+            models.ClickRollup.value.label('category'),
+            func.sum(models.ClickRollup.count).label('count')
         )
-        .join(models.Link)
+        .join(models.Link, models.Link.id == models.ClickRollup.link_id)
         .filter(models.Link.owner_id == user_id)
-        .group_by(column_attribute)
+        .filter(models.ClickRollup.granularity == 'day', models.ClickRollup.dimension == group_by_column)
+        .group_by(models.ClickRollup.value)
         .order_by(desc('count')) # Order by count descending
         .all()
     )
 
     # Process results: Top N + Other
-    top_results = results[:limit]
-    other_count = sum(row.count for row in results[limit:])
+    return _top_with_other(results, limit)
 
-    breakdown = {row.category if row.category else 'Unknown': row.count for row in top_results}
-    if other_count > 0:
-        breakdown['Other'] = other_count
+def get_analytics_dashboard(db: Session, user_id: int, interval: str = 'day',
+                            start: date | None = None, end: date | None = None,
+                            link_id: int | None = None, tag: str | None = None, limit: int = 5) -> dict:
+    """
+    Everything the analysis dashboard shows, from a single scan of the
+    user's daily rollups: the clicks-over-time series and the device,
+    browser, referrer and country breakdowns (top N + 'Other'), optionally
+    for days start..end (inclusive) and a single link or tag.
+    """
+    if interval not in ('day', 'month', 'year'):
+        interval = 'day'
+    rollup = models.ClickRollup
+    is_total = rollup.dimension == 'total'
+    # Totals are grouped per day, the other dimensions per value across days
+    bucket = case((is_total, rollup.bucket), else_=None)
+
+    query = (
+        db.query(
+            rollup.dimension,
+            rollup.value.label('category'),
+            bucket.label('bucket'),
+            func.sum(rollup.count).label('count'),
+        )
+        .join(models.Link, models.Link.id == rollup.link_id)
+        .filter(models.Link.owner_id == user_id)
+        .filter(rollup.granularity == 'day')
+    )
+    if start is not None:
+        query = query.filter(rollup.bucket >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.filter(rollup.bucket < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if link_id is not None:
+        query = query.filter(rollup.link_id == link_id)
+    if tag is not None:
+        query = query.filter(models.Link.tag == tag)
+    rows = query.group_by(rollup.dimension, rollup.value, bucket).all()
+
+    days = sorted((row for row in rows if row.dimension == 'total'), key=lambda row: row.bucket)
+    dashboard = {
+        "total_clicks": sum(int(row.count) for row in days),
+        "clicks_over_time": _fold_days(days, interval),
+    }
+    for dimension, key in (('device_type', 'device_breakdown'), ('browser', 'browser_breakdown'),
+                           ('referrer', 'referrer_breakdown'), ('country', 'country_breakdown')):
+        values = sorted((row for row in rows if row.dimension == dimension), key=lambda row: row.count, reverse=True)
+        dashboard[key] = _top_with_other(values, limit)
+    return dashboard
+
+LINK_STATS_DIMENSIONS = {
+    "by_country": models.Click.country,
+    "by_referrer": models.Click.referrer,
+    "by_browser": models.Click.browser,
+    "by_device": models.Click.device_type,
+}
+
+def get_link_click_stats(db: Session, link_id: int, start: datetime | None = None,
+                         end: datetime | None = None, limit: int = 10) -> dict:
+    """
+    Total, last click and per-dimension breakdowns (top N + 'Other') of one
+    link's clicks, optionally limited to start <= created_at < end.
+    All four GROUP BYs run as one UNION ALL query, so only the grouped
+    counts come back, never the clicks themselves. Archived days in the
+    range are grouped the same way from their files and merged in.
+    """
+    archived = get_archived_days(db, start, end)
+    live = click_archive.live_range(archived, start, end)
+
+    def grouped(name, column):
+        live_start, live_end = live
+        query = (
+            select(
+                literal(name).label("dimension"),
+                column.label("value"),
+                func.count().label("count"),
+                func.max(models.Click.created_at).label("last_clicked_at"),
+            )
+            .where(models.Click.link_id == link_id)
+        )
+        if live_start is not None:
+            query = query.where(models.Click.created_at >= live_start)
+        if live_end is not None:
+            query = query.where(models.Click.created_at < live_end)
+        return query.group_by(column)
+
+    rows = []
+    if live is not None:
+        rows += db.execute(
+            union_all(*(grouped(name, column) for name, column in LINK_STATS_DIMENSIONS.items()))
+        ).all()
+    rows += click_archive.link_stats(
+        link_id, [day.day for day in archived if day.clicks], start, end,
+        {name: column.key for name, column in LINK_STATS_DIMENSIONS.items()},
+    )
 
-    return breakdown
+    # (count, last click) per value, the archive's and the table's added up
+    per_dimension = {name: {} for name in LINK_STATS_DIMENSIONS}
+    for dimension, value, count, last_clicked_at in rows:
+        values = per_dimension[dimension]
+        total, last = values.get(value, (0, None))
+        values[value] = (total + count, last_clicked_at if last is None else max(last, last_clicked_at))
+
+    stats = {"total_clicks": 0, "last_clicked_at": None}
+    # Every dimension partitions the same clicks, any of them gives the totals
+    for count, last_clicked_at in per_dimension["by_country"].values():
+        stats["total_clicks"] += count
+        if stats["last_clicked_at"] is None or last_clicked_at > stats["last_clicked_at"]:
+            stats["last_clicked_at"] = last_clicked_at
+
+    for name, values in per_dimension.items():
+        ranked = sorted(values.items(), key=lambda item: item[1][0], reverse=True)
+        breakdown = {}
+        for value, (count, _) in ranked[:limit]:
+            key = value or "unknown"
+            breakdown[key] = breakdown.get(key, 0) + count
+        other_count = sum(count for _, (count, _) in ranked[limit:])
+        if other_count > 0:
+            # The UA parser has an "Other" browser family of its own
+            breakdown["Other"] = breakdown.get("Other", 0) + other_count
+        stats[name] = breakdown
+    return stats
 
 # --- Convenience functions using the generic breakdown ---
 
@@ -331,20 +892,42 @@ def get_user_by_id(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 def update_user_active_status(db: Session, user_id: int, is_active: bool) -> models.User | None:
-    """Updates the is_active status of a user by ID."""
+    """
+    Updates the is_active status of a user by ID. Deactivating also bumps
+    the user's token_version, so tokens issued so far stay revoked even
+    if the account is reactivated later.
+    """
     db_user = get_user_by_id(db, user_id)
     if db_user:
+        if db_user.is_active and not is_active:
+            db_user.token_version = models.User.token_version + 1
         db_user.is_active = is_active
         db.commit()
         db.refresh(db_user)
+        user_cache.invalidate(db_user.email)
     return db_user
 
+def delete_rollups(link_ids):
+    """
+    The DELETE of the rollups of `link_ids`, a list or a SELECT of link ids,
+    run before deleting the links themselves so the ORM doesn't load and
+    delete the rollups one row at a time.
+    """
+    return delete(models.ClickRollup).where(models.ClickRollup.link_id.in_(link_ids))
+
+
 def delete_user_by_id(db: Session, user_id: int) -> bool:
     """Deletes a user by ID. Returns True if deleted, False otherwise."""
     db_user = get_user_by_id(db, user_id)
     if db_user:
+        # The user's links are deleted by cascade, so drop them from the redirect cache too
+        short_codes = [link.short_code for link in db_user.links]
+        db.execute(delete_rollups(select(models.Link.id).where(models.Link.owner_id == user_id)))
         db.delete(db_user)
         db.commit()
+        link_cache.invalidate(*short_codes)
+        short_code_filter.discard(*short_codes)
+        user_cache.invalidate(db_user.email)
         return True
     return False
   
@@ -359,8 +942,11 @@ def admin_delete_link(db: Session, link_id: int) -> bool:
     
     if db_link:
         # If found, delete it
+        db.execute(delete_rollups([db_link.id]))
         db.delete(db_link)
         db.commit()
+        link_cache.invalidate(db_link.short_code)
+        short_code_filter.discard(db_link.short_code)
         return True
     
     # If not found, return False
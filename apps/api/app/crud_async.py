@@ -0,0 +1,224 @@
+"""
+Async versions of the crud functions on the hot paths (redirects, auth,
+link creation). They mirror the ones in crud.py but take an AsyncSession,
+so async endpoints never block the event loop on the database.
+"""
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import select, insert, update, bindparam, case, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import models, schemas
+from .core.password_hashing import password_hasher
+from .core import click_archive
+from .core.cache import CachedLink
+from .core.short_codes import short_code_allocator
+from .core.counters import counter_rows, increment_statement, shard_of
+from .crud import is_superuser_email, build_click_rollups, delete_rollups
+from .db.dialect import upsert_increment
+
+# --- User CRUD (Operations) ---
+
+async def get_user_by_email(db: AsyncSession, email: str) -> models.User | None:
+    """Fetches a single user by their email address."""
+    result = await db.execute(select(models.User).filter(models.User.email == email))
+    return result.scalars().first()
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate) -> models.User:
+    """Creates a new user in the database."""
+    # bcrypt is CPU-bound, keep it off the event loop
+    hashed_password = await password_hasher.hash(user.password)
+    db_user = models.User(
+        email=user.email,
+        hashed_password=hashed_password,
+        is_superuser=is_superuser_email(user.email)
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+# --- Link CRUD (Operations) ---
+
+async def resolve_short_code(db: AsyncSession, short_code: str) -> CachedLink | None:
+    """Fetches only the columns a redirect needs, without loading the owner."""
+    result = await db.execute(
+        select(models.Link.id, models.Link.original_url, models.Link.expires_at)
+        .filter(models.Link.short_code == short_code)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return CachedLink(id=row.id, original_url=row.original_url, expires_at=row.expires_at)
+
+async def create_db_link(db: AsyncSession, original_url: str, user_id: int, tag: str | None = None) -> models.Link:
+    """
+    Creates a new short link in the database with a single INSERT. The owner
+    isn't loaded; callers that need it already have the current user.
+    """
+    # Allocated codes are unique by construction, no lookup needed
+    short_code = await short_code_allocator.next_code()
+    expires_at = datetime.utcnow() + timedelta(days=30)
+    db_link = models.Link(
+        original_url=original_url,
+        short_code=short_code,
+        owner_id=user_id,
+        tag=tag,
+        expires_at=expires_at
+    )
+    db.add(db_link)
+    await db.commit()
+    return db_link
+
+async def create_db_links(db: AsyncSession, links: List[dict], user_id: int) -> List[str]:
+    """
+    Creates many links (dicts with original_url and tag) as one multi-row
+    INSERT and returns their short codes, in order.
+    """
+    if not links:
+        return []
+    short_codes = await short_code_allocator.next_codes(len(links))
+    now = datetime.utcnow()
+    expires_at = now + timedelta(days=30)
+    await db.execute(
+        insert(models.Link),
+        [
+            {
+                "original_url": link["original_url"],
+                "short_code": short_code,
+                "owner_id": user_id,
+                "tag": link.get("tag"),
+                "created_at": now,
+                "expires_at": expires_at,
+                "click_count": 0,
+            }
+            for link, short_code in zip(links, short_codes)
+        ],
+    )
+    # Core inserts skip the ORM flush hook, count them here
+    shard = shard_of(await db.connection())
+    await db.execute(increment_statement(db.bind.dialect.name), counter_rows("links", [now] * len(links), shard=shard))
+    await db.commit()
+    return short_codes
+
+async def get_link_by_id_and_owner(db: AsyncSession, link_id: int, user_id: int) -> models.Link | None:
+    """Fetches a single link by its ID, ensuring it belongs to the specified user."""
+    result = await db.execute(
+        select(models.Link).filter(models.Link.id == link_id, models.Link.owner_id == user_id)
+    )
+    return result.scalars().first()
+
+async def delete_link(db: AsyncSession, link: models.Link) -> None:
+    """Deletes a link with its clicks and rollups."""
+    await db.execute(delete_rollups([link.id]))
+    await db.delete(link)
+    await db.commit()
+
+async def get_link_ids_page(db: AsyncSession, user_id: int, after_id: int, limit: int) -> List[tuple]:
+    """(id, short_code) of a user's links with id > after_id, in id order."""
+    result = await db.execute(
+        select(models.Link.id, models.Link.short_code)
+        .filter(models.Link.owner_id == user_id, models.Link.id > after_id)
+        .order_by(models.Link.id)
+        .limit(limit)
+    )
+    return result.all()
+
+# --- Click CRUD (Operations) ---
+
+async def get_clicks_page(db: AsyncSession, link_ids: List[int], after: tuple[int, int], limit: int,
+                          start: datetime | None = None, end: datetime | None = None) -> List[tuple]:
+    """
+    One keyset page of the raw clicks of `link_ids`, ordered by (link_id, id)
+    and starting past `after` = (link_id, click id), optionally limited to
+    start <= created_at < end.
+    """
+    after_link_id, after_click_id = after
+    query = (
+        select(
+            models.Click.id, models.Click.link_id, models.Click.created_at, models.Click.ip_address,
+            models.Click.country, models.Click.referrer, models.Click.browser, models.Click.device_type,
+        )
+        .filter(models.Click.link_id.in_(link_ids))
+        .filter(or_(
+            models.Click.link_id > after_link_id,
+            and_(models.Click.link_id == after_link_id, models.Click.id > after_click_id),
+        ))
+    )
+    if start is not None:
+        query = query.filter(models.Click.created_at >= start)
+    if end is not None:
+        query = query.filter(models.Click.created_at < end)
+    result = await db.execute(query.order_by(models.Click.link_id, models.Click.id).limit(limit))
+    return result.all()
+
+async def get_archived_days(db: AsyncSession, start: datetime | None = None,
+                            end: datetime | None = None) -> List[models.ClickArchiveDay]:
+    """The archived days that overlap start <= created_at < end, oldest first."""
+    first_day, last_day = click_archive.day_bounds(start, end)
+    query = select(models.ClickArchiveDay)
+    if first_day is not None:
+        query = query.filter(models.ClickArchiveDay.day >= first_day)
+    if last_day is not None:
+        query = query.filter(models.ClickArchiveDay.day <= last_day)
+    result = await db.execute(query.order_by(models.ClickArchiveDay.day))
+    return result.scalars().all()
+
+async def create_click_logs(db: AsyncSession, clicks: List[dict]) -> int:
+    """
+    Inserts a batch of clicks as a multi-row INSERT, and in the same
+    transaction bumps the denormalized click_count / last_clicked_at of each
+    clicked link, adds the batch to the hourly/daily click rollups and to
+    the site-wide click counters. Clicks of links deleted since they were
+    recorded are skipped. Returns the number of rows written.
+    """
+    if not clicks:
+        return 0
+    link_ids = {click["link_id"] for click in clicks}
+    existing = set((await db.execute(select(models.Link.id).where(models.Link.id.in_(link_ids)))).scalars())
+    if len(existing) < len(link_ids):
+        clicks = [click for click in clicks if click["link_id"] in existing]
+        if not clicks:
+            return 0
+    await db.execute(insert(models.Click), clicks)
+
+    per_link = {}
+    for click in clicks:
+        count, last_clicked_at = per_link.get(click["link_id"], (0, click["created_at"]))
+        per_link[click["link_id"]] = (count + 1, max(last_clicked_at, click["created_at"]))
+
+    links = models.Link.__table__
+    await db.execute(
+        update(links)
+        .where(links.c.id == bindparam("link"))
+        .values(
+            click_count=links.c.click_count + bindparam("count"),
+            last_clicked_at=case(
+                (links.c.last_clicked_at.is_(None), bindparam("clicked_at")),
+                (links.c.last_clicked_at < bindparam("clicked_at"), bindparam("clicked_at")),
+                else_=links.c.last_clicked_at,
+            ),
+        ),
+        # Sorted so concurrent writers lock hot rows in the same order
+        [
+            {"link": link_id, "count": count, "clicked_at": clicked_at}
+            for link_id, (count, clicked_at) in sorted(per_link.items())
+        ],
+    )
+
+    rollups = models.ClickRollup.__table__
+    await db.execute(
+        upsert_increment(
+            db.bind.dialect.name, rollups,
+            key_columns=[column.name for column in rollups.primary_key],
+            counter_columns=["count"],
+        ),
+        build_click_rollups(clicks),
+    )
+    await db.execute(
+        increment_statement(db.bind.dialect.name),
+        counter_rows("clicks", [click["created_at"] for click in clicks], shard=shard_of(await db.connection())),
+    )
+    await db.commit()
+    return len(clicks)
@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -18,10 +19,37 @@ if SQLALCHEMY_DATABASE_URL.startswith("mysql://"):
         "mysql://", "mysql+pymysql://", 1
     )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Async driver for the same database: aiomysql in prod, aiosqlite for tests
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+if not ASYNC_SQLALCHEMY_DATABASE_URL:
+    ASYNC_SQLALCHEMY_DATABASE_URL = (
+        SQLALCHEMY_DATABASE_URL
+        .replace("mysql+pymysql://", "mysql+aiomysql://", 1)
+        .replace("sqlite://", "sqlite+aiosqlite://", 1)
+    )
+
+# Imported here, after load_dotenv(), so Settings sees the .env values
+from app.db.pool import PoolMonitor, engine_options
+
+sync_pool_monitor = PoolMonitor("sync")
+async_pool_monitor = PoolMonitor("async")
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL, sync_pool_monitor))
+sync_pool_monitor.attach(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL, async_pool_monitor, is_async=True),
+)
+async_pool_monitor.attach(async_engine.sync_engine)
+
+# expire_on_commit=False so objects stay readable after commit without a
+# (forbidden) implicit lazy load on the event loop
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -30,4 +58,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Small helpers for the few statements that differ between MySQL (prod) and
+SQLite (tests, benchmarks).
+"""
+from sqlalchemy import DateTime, Table, cast, func
+from sqlalchemy.dialects import mysql, sqlite
+
+SUPPORTED_DIALECTS = ("mysql", "sqlite")
+
+_BUCKET_FORMATS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+
+def check_supported(engine) -> None:
+    """
+    Fails at startup on a database the statements below have no version
+    for, instead of on the first write that needs one.
+    """
+    if engine.dialect.name not in SUPPORTED_DIALECTS:
+        raise RuntimeError(
+            f"DATABASE_URL points to a {engine.dialect.name} database; "
+            f"only {' and '.join(SUPPORTED_DIALECTS)} are supported"
+        )
+
+
+def upsert_increment(dialect_name: str, table: Table, key_columns: list[str], counter_columns: list[str]):
+    """
+    INSERT that adds to the counter columns when the key already exists.
+    Meant to be executed with a list of rows (executemany).
+    """
+    if dialect_name == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            {name: table.c[name] + stmt.inserted[name] for name in counter_columns}
+        )
+    if dialect_name == "sqlite":
+        stmt = sqlite.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={name: table.c[name] + stmt.excluded[name] for name in counter_columns},
+        )
+    raise NotImplementedError(f"No upsert for dialect {dialect_name!r}")
+
+
+def truncate_datetime(dialect_name: str, column, granularity: str):
+    """SQL expression for the start of the hour/day containing `column`."""
+    fmt = _BUCKET_FORMATS[granularity]
+    if dialect_name == "mysql":
+        return cast(func.date_format(column, fmt), DateTime)
+    if dialect_name == "sqlite":
+        # Same text layout SQLAlchemy uses for DateTime on SQLite, so
+        # buckets computed here and in Python compare equal
+        return func.strftime(fmt + ".000000", column)
+    raise NotImplementedError(f"No datetime truncation for dialect {dialect_name!r}")
@@ -0,0 +1,142 @@
+"""
+Brings the schema up to date with the migrations in app/db/migrations.
+
+Deploys run `alembic upgrade head` from apps/api; with
+DB_MIGRATE_ON_STARTUP the app also does it when it starts. Databases set
+up before there were migrations (create_all) have no alembic_version
+table, so they're stamped at the baseline revision, whose schema they
+already have, before upgrading. The revisions after it check for what
+they add, as some of it may have been added by hand before there were
+migrations.
+
+Every worker of a deploy starts at once; they take turns through a lock,
+and the ones after the first find nothing left to do.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: SQLite databases there are migrated without the lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+BASELINE_REVISION = "0001"
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def _timed_out() -> RuntimeError:
+    return RuntimeError(
+        f"Timed out after {settings.DB_MIGRATE_LOCK_TIMEOUT_SECONDS}s waiting for another "
+        "process to finish migrating the database"
+    )
+
+
+@contextmanager
+def _mysql_lock(connection):
+    # Named locks are server-wide, not per database
+    name = f"{connection.engine.url.database}.migrate"
+    acquired = connection.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"),
+        {"name": name, "timeout": settings.DB_MIGRATE_LOCK_TIMEOUT_SECONDS},
+    ).scalar()
+    connection.commit()
+    if acquired != 1:
+        raise _timed_out()
+    try:
+        yield
+    finally:
+        connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+        connection.commit()
+
+
+@contextmanager
+def _file_lock(path: str):
+    # Closing the file releases the lock, also when the process dies
+    with open(path, "w") as lock_file:
+        deadline = time.monotonic() + settings.DB_MIGRATE_LOCK_TIMEOUT_SECONDS
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    raise _timed_out()
+                time.sleep(0.1)
+        yield
+
+
+def _migration_lock(connection):
+    """
+    Lets one process at a time migrate: MySQL through a named lock, a
+    SQLite file through a lock file next to it (its workers share a host).
+    """
+    if connection.dialect.name == "mysql":
+        return _mysql_lock(connection)
+    database = connection.engine.url.database
+    if connection.dialect.name == "sqlite" and database and database != ":memory:" and fcntl is not None:
+        return _file_lock(database + ".migrate-lock")
+    return nullcontext()
+
+
+def upgrade(engine) -> None:
+    with engine.connect() as connection, _migration_lock(connection):
+        with connection.begin():
+            config = alembic_config(connection)
+            tables = inspect(connection).get_table_names()
+            if "alembic_version" not in tables and "users" in tables:
+                logger.warning("Database predates migrations, stamping it at revision %s", BASELINE_REVISION)
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, "head")
+
+
+# --- Helpers for the migration scripts ---
+#
+# `alembic upgrade --sql` can't look at the database, so there they always
+# take it that the table, column or index isn't there yet.
+
+def has_table(name: str) -> bool:
+    from alembic import context, op
+
+    return not context.is_offline_mode() and inspect(op.get_bind()).has_table(name)
+
+
+def has_column(table: str, column: str) -> bool:
+    from alembic import context, op
+
+    return not context.is_offline_mode() and column in {c["name"] for c in inspect(op.get_bind()).get_columns(table)}
+
+
+def create_index_online(name: str, table: str, columns: list[str]) -> None:
+    """
+    op.create_index() that keeps `table` writable while the index builds,
+    and does nothing if it's already there (created by hand before there
+    were migrations). MySQL builds it in place without a lock; SQLite has no
+    online DDL and holds its write lock meanwhile.
+    """
+    from alembic import context, op
+
+    bind = op.get_bind()
+    if not context.is_offline_mode() and name in {index["name"] for index in inspect(bind).get_indexes(table)}:
+        return
+    if bind.dialect.name == "mysql":
+        op.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)}) ALGORITHM=INPLACE LOCK=NONE")
+    else:
+        op.create_index(name, table, columns)
@@ -0,0 +1,43 @@
+"""
+Alembic environment: migrates the database behind DATABASE_URL, or the
+connection app.db.migrate.upgrade() hands over in config.attributes.
+"""
+from alembic import context
+
+from app.db import database, models  # noqa: F401  (registers every table on Base.metadata)
+
+config = context.config
+target_metadata = database.Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """`alembic upgrade head --sql`: prints the DDL instead of running it."""
+    context.configure(
+        url=database.SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations(connection)
+        return
+    with database.engine.connect() as connection:
+        run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
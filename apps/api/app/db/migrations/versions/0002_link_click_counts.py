@@ -0,0 +1,38 @@
+"""link click counts
+
+Adds links.click_count and links.last_clicked_at, kept up to date by the
+click writes so listings don't count clicks per link. Existing links start
+at 0: backfill them with python -m app.jobs.reconcile_click_counts.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 03:38:02.412907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migrate import has_column
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_column('links', 'click_count'):
+        op.add_column('links', sa.Column('click_count', sa.Integer(), server_default='0', nullable=False))
+    if not has_column('links', 'last_clicked_at'):
+        op.add_column('links', sa.Column('last_clicked_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('links', 'last_clicked_at')
+    op.drop_column('links', 'click_count')
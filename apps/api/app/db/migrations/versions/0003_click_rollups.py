@@ -0,0 +1,45 @@
+"""click rollups
+
+Adds click_rollups, the per-link click counts by hour and day and by
+dimension the analytics read instead of the raw clicks. Clicks from
+before it are only counted once backfilled with
+python -m app.jobs.backfill_rollups.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 03:38:41.067215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migrate import has_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_table('click_rollups'):
+        op.create_table('click_rollups',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('dimension', sa.String(length=20), nullable=False),
+        sa.Column('value', sa.String(length=255), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ),
+        sa.PrimaryKeyConstraint('link_id', 'granularity', 'bucket', 'dimension', 'value')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('click_rollups')
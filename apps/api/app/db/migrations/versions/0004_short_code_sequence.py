@@ -0,0 +1,39 @@
+"""short code sequence
+
+Adds short_code_sequence, the single-row counter the short-code allocator
+reserves blocks of sequence numbers from (see app/core/short_codes.py).
+The allocator inserts the row the first time it's needed.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 03:39:15.530418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migrate import has_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_table('short_code_sequence'):
+        op.create_table('short_code_sequence',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('next_value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('short_code_sequence')
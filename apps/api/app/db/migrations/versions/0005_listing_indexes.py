@@ -0,0 +1,39 @@
+"""listing indexes
+
+Adds the (created_at, id) indexes the keyset-paginated link and user
+listings page through, per owner and tag where they filter on them.
+Built online (see app.db.migrate.create_index_online).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 03:39:58.284761
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.db.migrate import create_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_online('ix_links_owner_created_at_id', 'links', ['owner_id', 'created_at', 'id'])
+    create_index_online('ix_links_owner_tag_created_at_id', 'links', ['owner_id', 'tag', 'created_at', 'id'])
+    create_index_online('ix_links_created_at_id', 'links', ['created_at', 'id'])
+    create_index_online('ix_users_created_at_id', 'users', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_created_at_id', table_name='users')
+    op.drop_index('ix_links_created_at_id', table_name='links')
+    op.drop_index('ix_links_owner_tag_created_at_id', table_name='links')
+    op.drop_index('ix_links_owner_created_at_id', table_name='links')
@@ -0,0 +1,35 @@
+"""link click indexes
+
+Adds the indexes reads of one link's clicks go through: (link_id, id) for
+the keyset-paginated click exports, (link_id, created_at) for link stats
+over a date range. Built online (see app.db.migrate.create_index_online).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 03:40:33.901552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.db.migrate import create_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_online('ix_clicks_link_id_id', 'clicks', ['link_id', 'id'])
+    create_index_online('ix_clicks_link_id_created_at', 'clicks', ['link_id', 'created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clicks_link_id_created_at', table_name='clicks')
+    op.drop_index('ix_clicks_link_id_id', table_name='clicks')
@@ -0,0 +1,40 @@
+"""stat counters
+
+Adds stat_counters, the maintained totals and hourly growth of users,
+links and clicks behind GET /admin/stats (see app/core/counters.py).
+Seed it from the existing rows with python -m app.jobs.reconcile_counters.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 03:41:07.158893
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migrate import has_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_table('stat_counters'):
+        op.create_table('stat_counters',
+        sa.Column('name', sa.String(length=20), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name', 'bucket')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stat_counters')
@@ -0,0 +1,35 @@
+"""user token version
+
+Adds users.token_version, which access tokens carry as "ver": bumping it
+revokes every token issued to the user before. Existing users start at 0,
+which their tokens without a "ver" count as.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 03:41:44.620374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migrate import has_column
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_column('users', 'token_version'):
+        op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
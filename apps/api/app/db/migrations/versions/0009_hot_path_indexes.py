@@ -0,0 +1,33 @@
+"""hot path indexes
+
+Adds the index behind the expired-link queries (GET /links/expired and
+?status=expired listings), which read the whole links table without it.
+Found with bench/check_query_plans.py. Built online (see
+app.db.migrate.create_index_online).
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 03:52:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.db.migrate import create_index_online
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_online('ix_links_expires_at', 'links', ['expires_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_links_expires_at', table_name='links')
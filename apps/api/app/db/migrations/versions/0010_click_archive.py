@@ -0,0 +1,45 @@
+"""click archive
+
+Adds click_archive_days, the record of which days of clicks
+app/jobs/archive_clicks.py has moved to Parquet files, and the
+(created_at, id) index the job reads and deletes a day of clicks through.
+The index is built online (see app.db.migrate.create_index_online).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 03:44:09.039395
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migrate import create_index_online, has_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_table('click_archive_days'):
+        op.create_table('click_archive_days',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('clicks', sa.BigInteger(), nullable=False),
+        sa.Column('last_click_id', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.Column('purged_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('day')
+        )
+    create_index_online('ix_clicks_created_at_id', 'clicks', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clicks_created_at_id', table_name='clicks')
+    op.drop_table('click_archive_days')
@@ -0,0 +1,62 @@
+"""stat counter shards
+
+Splits each stat_counters row over shards (STAT_COUNTER_SHARDS, see
+app/core/counters.py): adds the shard column to the primary key, with
+the existing rows in shard 0. On MySQL that's one ALTER TABLE, which
+increments wait out; SQLite copies the table, which is small.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 05:02:18.447310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migrate import has_column
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rebuild(shard: bool, select: str) -> None:
+    """Replaces stat_counters with a copy holding the rows of `select`."""
+    columns = [
+        sa.Column('name', sa.String(length=20), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+    ]
+    key = ['name', 'bucket']
+    if shard:
+        columns.insert(2, sa.Column('shard', sa.SmallInteger(), server_default='0', nullable=False))
+        key.append('shard')
+    op.create_table('stat_counters_new', *columns, sa.PrimaryKeyConstraint(*key))
+    op.execute(f"INSERT INTO stat_counters_new ({', '.join(column.name for column in columns)}) {select}")
+    op.drop_table('stat_counters')
+    op.rename_table('stat_counters_new', 'stat_counters')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if has_column('stat_counters', 'shard'):
+        return
+    if op.get_bind().dialect.name == "mysql":
+        op.execute(
+            "ALTER TABLE stat_counters ADD COLUMN shard SMALLINT NOT NULL DEFAULT 0 AFTER bucket, "
+            "DROP PRIMARY KEY, ADD PRIMARY KEY (name, bucket, shard)"
+        )
+    else:
+        # SQLite can't change a primary key in place
+        _rebuild(True, "SELECT name, bucket, 0, value FROM stat_counters")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Folds the shards back into one row each
+    _rebuild(False, "SELECT name, bucket, SUM(value) FROM stat_counters GROUP BY name, bucket")
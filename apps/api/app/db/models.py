@@ -1,5 +1,5 @@
 from xmlrpc.client import Boolean
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Boolean, Text, BigInteger, SmallInteger, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -10,17 +10,26 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # UTC, set here rather than by the server's clock (local time on MySQL), like
+    # the stat_counters hour it's counted in
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     # One-to-many relationship: one user can have many links
     links = relationship("Link", back_populates="owner", cascade="all, delete-orphan")
     is_active = Column(Boolean, default=False)  # 1 for active, 0 for inactive
     is_superuser = Column(Boolean, default=False)  # 1 for admin, 0 for regular user
+    # Stamped into access tokens as "ver"; bumping it revokes every token issued before
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Keyset pagination of the admin user list, newest first
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
 class Click(Base):
     __tablename__ = "clicks"
     id = Column(Integer, primary_key=True, index=True)
     link_id = Column(Integer, ForeignKey("links.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())  # UTC
     ip_address = Column(String(100), nullable=True)  # IPv6 compatible
     link = relationship("Link", back_populates="clicks")
     country = Column(String(100), nullable=True)
@@ -28,6 +37,15 @@ class Click(Base):
     browser = Column(String(100), nullable=True)
     device_type = Column(String(100), nullable=True)
 
+    # Keyset reads of a link's clicks in id order (exports), date-range
+    # reads of a link's clicks (link stats), and a day of everyone's clicks
+    # at a time (the archive job)
+    __table_args__ = (
+        Index("ix_clicks_link_id_id", "link_id", "id"),
+        Index("ix_clicks_link_id_created_at", "link_id", "created_at"),
+        Index("ix_clicks_created_at_id", "created_at", "id"),
+    )
+
 class Link(Base):
     __tablename__ = "links"
     id = Column(Integer, primary_key=True, index=True)
@@ -39,12 +57,75 @@ class Link(Base):
     owner = relationship("User", back_populates="links")
     # One-to-many relationship: one link can have many clicks
     clicks = relationship("Click", back_populates="link", cascade="all, delete-orphan")
+    # Never loaded: deleting a link deletes its rollups in bulk first (crud.delete_rollups)
+    rollups = relationship("ClickRollup", cascade="all, delete-orphan", passive_deletes=True)
     # Back relationship
     owner = relationship("User", back_populates="links")
     expires_at = Column(DateTime, nullable=True)  
     tag = Column(String(100), nullable=True)  
+    # Denormalized click stats, bumped by the click writer in the same
+    # transaction as the inserts (see app/jobs/reconcile_click_counts.py)
+    click_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_clicked_at = Column(DateTime, nullable=True)
+
+    # Keyset pagination of the link listings, newest first (see crud.paginate_newest_first)
+    __table_args__ = (
+        Index("ix_links_owner_created_at_id", "owner_id", "created_at", "id"),
+        Index("ix_links_owner_tag_created_at_id", "owner_id", "tag", "created_at", "id"),
+        Index("ix_links_created_at_id", "created_at", "id"),
+        # Expired-link listings
+        Index("ix_links_expires_at", "expires_at"),
+    )
     
     
+class ClickRollup(Base):
+    """
+    Pre-aggregated click counts per link, time bucket and dimension value.
+    Written by the click writer as clicks come in, so analytics read a few
+    rows per day instead of scanning every click.
+    """
+    __tablename__ = "click_rollups"
+    GRANULARITIES = ("hour", "day")
+    # "total" has a single empty value and counts every click
+    DIMENSIONS = ("total", "country", "referrer", "browser", "device_type")
+
+    link_id = Column(Integer, ForeignKey("links.id"), primary_key=True)
+    granularity = Column(String(8), primary_key=True)  # "hour" or "day"
+    bucket = Column(DateTime, primary_key=True)  # Start of the hour/day, UTC
+    dimension = Column(String(20), primary_key=True)
+    value = Column(String(255), primary_key=True)  # "" when unknown
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class ClickArchiveDay(Base):
+    """
+    One row per UTC day of clicks moved out of the clicks table into a
+    Parquet file by app/jobs/archive_clicks.py (see app/core/click_archive.py).
+    Days are archived oldest first without gaps, so every click before the
+    day after the last row is read from the archive, never from the table.
+    """
+    __tablename__ = "click_archive_days"
+
+    day = Column(Date, primary_key=True)
+    clicks = Column(BigInteger, nullable=False)  # Rows in the day's file, 0 when there's no file
+    # Highest clicks.id exported: the deletes never go past it
+    last_click_id = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Set once the day's raw clicks are all deleted
+    purged_at = Column(DateTime, nullable=True)
+
+
+class ShortCodeSequence(Base):
+    """
+    Single-row counter the short-code allocator reserves blocks of sequence
+    numbers from (see app/core/short_codes.py).
+    """
+    __tablename__ = "short_code_sequence"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    next_value = Column(BigInteger, nullable=False)
+
+
 class ContactSubmission(Base):
     __tablename__ = "contact_submissions"
     
@@ -54,3 +135,22 @@ class ContactSubmission(Base):
     email = Column(String(255), nullable=False, index=True)
     message = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class StatCounter(Base):
+    """
+    Site-wide row counts kept in step with the writes (see app/core/counters.py),
+    so the admin totals don't have to COUNT(*) the big tables. The row at
+    StatCounter.TOTAL_BUCKET holds the running total of `name`; the others
+    hold how many rows were created in the hour starting at `bucket`. Each
+    is split over shards that are summed on read, so the writers spread
+    their increments over several rows instead of queueing on one.
+    """
+    __tablename__ = "stat_counters"
+    NAMES = ("users", "links", "clicks")
+    TOTAL_BUCKET = datetime(1970, 1, 1)
+
+    name = Column(String(20), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, autoincrement=False, default=0, server_default="0")
+    value = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,181 @@
+"""
+Connection pool options and instrumentation for the sync and async engines.
+
+Each engine gets a PoolMonitor that records how long requests wait for a
+connection (and how often they give up), and how long each route keeps one
+checked out. Routes are known through RequestScopeMiddleware, which makes
+the ASGI scope of the current request visible to the pool events.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import settings
+
+# Upper bounds in milliseconds, the last bucket catches everything above
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+
+class RequestScopeMiddleware:
+    """Publishes the ASGI scope of the request being served in `request_scope`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
+
+
+def current_route() -> str:
+    """"METHOD /path/{template}" of the current request, "background" outside one."""
+    scope = request_scope.get()
+    if scope is None:
+        return "background"
+    # The router adds the matched route to the scope before the endpoint runs
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else '(unmatched)'}"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds), not thread-safe on its own."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "max_ms": round(self.max_ms, 2),
+            "buckets_ms": {
+                **{f"le_{bound}": count for bound, count in zip(BUCKETS_MS, self.counts)},
+                "inf": self.counts[-1],
+            },
+        }
+
+
+class PoolMonitor:
+    """Wait and checkout timings of one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.wait = Histogram()
+        self.timeouts = 0
+        self.checkouts: dict[str, Histogram] = {}
+        # Also told of every wait (seconds, timed out), by the metrics
+        self.on_wait: Optional[Callable[[float, bool], None]] = None
+
+    def observe_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait.observe(seconds)
+            if timed_out:
+                self.timeouts += 1
+        if self.on_wait is not None:
+            self.on_wait(seconds, timed_out)
+
+    def wait_histogram(self) -> tuple[list[int], float]:
+        """Per-bucket wait counts (BUCKETS_MS, then +Inf) and the total wait in ms."""
+        with self._lock:
+            return list(self.wait.counts), self.wait.total_ms
+
+    def attach(self, engine) -> None:
+        """Starts timing checkouts on `engine` (the sync_engine of an async one)."""
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checked_out"] = (time.perf_counter(), current_route())
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        checked_out = connection_record.info.pop("checked_out", None)
+        if checked_out is None:
+            return
+        started, route = checked_out
+        with self._lock:
+            histogram = self.checkouts.get(route)
+            if histogram is None:
+                histogram = self.checkouts[route] = Histogram()
+            histogram.observe(time.perf_counter() - started)
+
+    def stats(self, engine) -> dict:
+        pool = engine.pool
+        gauges = {"class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            gauges.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # Negative while fewer than `size` connections are open
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout_seconds": pool.timeout(),
+            })
+        with self._lock:
+            return {
+                **gauges,
+                "wait": self.wait.snapshot(),
+                "wait_timeouts": self.timeouts,
+                "checkout_by_route": {route: histogram.snapshot() for route, histogram in sorted(self.checkouts.items())},
+            }
+
+
+class _TimedQueuePoolMixin:
+    """Times every wait for a connection of a QueuePool subclass."""
+    monitor: PoolMonitor
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.monitor.observe_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.monitor.observe_wait(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(url: str, monitor: PoolMonitor, is_async: bool = False) -> dict:
+    """
+    create_engine() keyword arguments applying the DB_POOL_* settings.
+
+    Sizing and timeouts only apply to queue pools; SQLite in-memory databases
+    use single-connection pools that never wait.
+    """
+    parsed = make_url(url)
+    pool_class = parsed.get_dialect(_is_async=is_async).get_pool_class(parsed)
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if issubclass(pool_class, QueuePool):
+        options.update(
+            poolclass=type(pool_class.__name__, (_TimedQueuePoolMixin, pool_class), {"monitor": monitor}),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        )
+    return options
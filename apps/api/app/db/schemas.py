@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, computed_field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -108,6 +108,13 @@ class AdminStats(BaseModel):
     total_users: int
     total_links: int
     total_clicks: int
+    # Rows created in the last 24 hours / 7 days (whole hours, UTC)
+    new_users_last_24h: int = 0
+    new_users_last_7d: int = 0
+    new_links_last_24h: int = 0
+    new_links_last_7d: int = 0
+    new_clicks_last_24h: int = 0
+    new_clicks_last_7d: int = 0
 
     class Config:
         from_attributes = True
@@ -125,6 +132,15 @@ class BreakdownStat(BaseModel):
     """
    
     pass 
+
+class AnalyticsDashboard(BaseModel):
+    """Schema for the combined analysis dashboard: time series plus every breakdown."""
+    total_clicks: int
+    clicks_over_time: List[ClickOverTimeStat]
+    device_breakdown: Dict[str, int]
+    browser_breakdown: Dict[str, int]
+    referrer_breakdown: Dict[str, int]
+    country_breakdown: Dict[str, int]
   
 class ContactSubmissionCreate(BaseModel):
     firstName: str
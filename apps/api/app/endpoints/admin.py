@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app import crud
-from app.db import schemas, models, database
+from app.db import schemas, database
 from app.endpoints.links import get_current_user
 from app.db.database import get_db
+from app.core.cache import link_cache, user_cache, cache_bus, Principal
+from app.core.bloom import short_code_filter
+from app.core.click_ingest import click_ingestor
+from app.core.user_agent import user_agent_cache_stats
+from app.core.geoip import geoip
+from app.core.short_codes import short_code_allocator
+from app.core.password_hashing import password_hasher
+from app.core.sql_profiler import query_budget
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -13,7 +21,7 @@ router = APIRouter()
 class UserStatusUpdate(BaseModel):
     is_active: bool
 # --- Admin Dependency ---
-def get_current_superuser(current_user: models.User = Depends(get_current_user)):
+def get_current_superuser(current_user: Principal = Depends(get_current_user)):
     """
     Dependency to check if the current user is a superuser.
     """
@@ -26,22 +34,58 @@ def get_current_superuser(current_user: models.User = Depends(get_current_user))
 
 # --- Admin Endpoints ---
 @router.get("/stats", response_model=schemas.AdminStats, dependencies=[Depends(get_current_superuser)])
-def get_admin_stats(db: Session = Depends(get_db)):
+@query_budget(2)
+def get_admin_stats(exact: bool = False, db: Session = Depends(get_db)):
     """
-    Get high-level statistics for the entire site. (Admin Only)
+    Get high-level statistics for the entire site, with growth over the last
+    24 hours and 7 days. (Admin Only)
+    Served from the maintained counters; `exact=true` counts the tables
+    instead, which is slow on a big database but useful to audit them.
+    """
+    if exact:
+        return crud.get_exact_admin_stats(db)
+    return crud.get_counter_stats(db)
+
+@router.get("/runtime-stats", dependencies=[Depends(get_current_superuser)])
+def get_runtime_stats():
+    """
+    Get this worker's in-process cache, filter and ingestion counters. (Admin Only)
     """
     return {
-        "total_users": crud.get_user_count(db),
-        "total_links": crud.get_link_count(db),
-        "total_clicks": crud.get_click_count(db)
+        "link_cache": link_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "cache_bus": cache_bus.stats(),
+        "short_code_filter": short_code_filter.stats(),
+        "click_ingest": click_ingestor.stats(),
+        "user_agent_cache": user_agent_cache_stats(),
+        "geoip": geoip.stats(),
+        "short_code_allocator": short_code_allocator.stats(),
+        "password_hashing": password_hasher.stats(),
+        "db_pool": {
+            "sync": database.sync_pool_monitor.stats(database.engine),
+            "async": database.async_pool_monitor.stats(database.async_engine.sync_engine),
+        },
     }
 
 @router.get("/users", response_model=List[schemas.UserOut], dependencies=[Depends(get_current_superuser)])
-def get_all_users(db: Session = Depends(get_db)):
+@query_budget(2)
+def get_all_users(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
     """
-    Get a list of all users. (Admin Only)
+    Get a page of all users, newest first. (Admin Only)
+    The X-Next-Cursor response header holds the `cursor` of the next page.
     """
-    return crud.get_all_users(db)
+    try:
+        users, next_cursor = crud.get_all_users(db, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return users
   
 @router.get("/user-registration-stats", dependencies=[Depends(get_current_superuser)])
 def get_user_registration_data(
@@ -55,11 +99,25 @@ def get_user_registration_data(
     return stats
 
 @router.get("/links", response_model=List[schemas.Link], dependencies=[Depends(get_current_superuser)])
-def get_all_links(db: Session = Depends(get_db)):
+@query_budget(3)
+def get_all_links(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    tag: Optional[str] = None,
+    status: Optional[str] = Query(None, enum=["active", "expired"]),
+    db: Session = Depends(get_db)
+):
     """
-    Get a list of all links from all users. (Admin Only)
+    Get a page of the links of all users, newest first. (Admin Only)
+    The X-Next-Cursor response header holds the `cursor` of the next page.
     """
-    links = crud.get_all_links(db)
+    try:
+        links, next_cursor = crud.get_all_links(db, cursor=cursor, limit=limit, tag=tag, status=status)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     # convert each link to schema
     return crud.convert_db_links_to_schemas(links)
   
@@ -70,7 +128,7 @@ def update_user_status(
     user_id: int,
     status_update: UserStatusUpdate,
     db: Session = Depends(get_db),
-    current_admin: models.User = Depends(get_current_superuser) 
+    current_admin: Principal = Depends(get_current_superuser) 
 ):
     """
     Activate or deactivate a user. (Admin Only)
@@ -92,7 +150,7 @@ def update_user_status(
 def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: models.User = Depends(get_current_superuser) 
+    current_admin: Principal = Depends(get_current_superuser) 
 ):
     """
     Permanently delete a user and their associated data (links, clicks). (Admin Only)
@@ -1,19 +1,43 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import List, Dict, Optional
+from datetime import date
 
 from app import crud
-from app.db import schemas, models
+from app.db import schemas
 from app.db.database import get_db
 from app.endpoints.links import get_current_user
+from app.core.cache import Principal
+from app.core.sql_profiler import query_budget
 
 router = APIRouter()
 
+@router.get("/dashboard", response_model=schemas.AnalyticsDashboard)
+@query_budget(2)
+def get_user_dashboard(
+    interval: str = Query("day", enum=["day", "month", "year"]),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    link_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Get the clicks over time and the device, browser, referrer and country
+    breakdowns in one response, from one scan of the click rollups.
+    Optionally for days start..end (inclusive) and one link or tag.
+    """
+    return crud.get_analytics_dashboard(
+        db, user_id=current_user.id, interval=interval,
+        start=start, end=end, link_id=link_id, tag=tag
+    )
+
 @router.get("/clicks-over-time", response_model=List[schemas.ClickOverTimeStat])
 def get_user_clicks_over_time(
     interval: str = Query("day", enum=["day", "month", "year"]),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Get aggregated click counts over time for the current user's links.
@@ -25,7 +49,7 @@ def get_user_clicks_over_time(
 @router.get("/device-breakdown", response_model=Dict[str, int])
 def get_user_device_breakdown(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get aggregated click breakdown by device type for the current user."""
     return crud.get_aggregated_device_breakdown(db, user_id=current_user.id)
@@ -33,7 +57,7 @@ def get_user_device_breakdown(
 @router.get("/browser-breakdown", response_model=Dict[str, int])
 def get_user_browser_breakdown(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get aggregated click breakdown by browser for the current user."""
     return crud.get_aggregated_browser_breakdown(db, user_id=current_user.id)
@@ -42,7 +66,7 @@ def get_user_browser_breakdown(
 @router.get("/referrer-breakdown", response_model=Dict[str, int])
 def get_user_referrer_breakdown(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get aggregated click breakdown by referrer for the current user."""
     return crud.get_aggregated_referrer_breakdown(db, user_id=current_user.id)
@@ -50,7 +74,7 @@ def get_user_referrer_breakdown(
 @router.get("/country-breakdown", response_model=Dict[str, int])
 def get_user_country_breakdown(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get aggregated click breakdown by country for the current user."""
     return crud.get_aggregated_country_breakdown(db, user_id=current_user.id)
\ No newline at end of file
@@ -4,21 +4,25 @@ import os
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
 from pydantic import BaseModel
 import firebase_admin
 from firebase_admin import auth, credentials
 
 # Import all helpers
-from app import crud
-from app.db import schemas, models
-from app.db.database import get_db
+from app import crud, crud_async
+from app.db import schemas
+from app.db.database import get_db, get_async_db
 from app.core import security
 from app.core.email import send_welcome_email, send_verification_email
 from app.core.security import create_access_token, verify_verification_token
 from app.core.config import settings
+from app.core.cache import user_cache, Principal
+from app.core.password_hashing import password_hasher, HashingPoolSaturated
 from app.endpoints.links import get_current_user
-from app.crud import get_user_by_email, create_user
+from app.crud_async import get_user_by_email, create_user
 from app.db.schemas import UserCreate
 from app.core.security import create_verification_token
 from jose import JWTError, jwt
@@ -27,11 +31,11 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=schemas.User)
-async def register_user(user: schemas.UserCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     """
     Handles user registration.
     """
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await crud_async.get_user_by_email(db, email=user.email)
     if db_user and db_user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -41,7 +45,7 @@ async def register_user(user: schemas.UserCreate, background_tasks: BackgroundTa
     if db_user and not db_user.is_active:
       pass
     else:
-       db_user = crud.create_user(db=db, user=user)
+       db_user = await crud_async.create_user(db=db, user=user)
 
     token = create_verification_token(email=db_user.email)
     background_tasks.add_task(
@@ -80,6 +84,7 @@ def verify_email(token: str, db: Session = Depends(get_db)):
     db.add(user)
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.email)
     
     return {"message": "Email verified successfully. You can now log in."}
 
@@ -88,15 +93,19 @@ def verify_email(token: str, db: Session = Depends(get_db)):
 @router.post("/token")
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Handles user login and issues a JWT access token.
     'form_data' will contain a 'username' (which is our email) and 'password'.
     """
-    user = crud.get_user_by_email(db, email=form_data.username)
-    
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    user = await crud_async.get_user_by_email(db, email=form_data.username)
+    # End the read so the pool connection isn't held while bcrypt runs
+    # (expire_on_commit is off, the user stays loaded)
+    await db.commit()
+
+    # bcrypt is CPU-bound, keep it off the event loop
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -110,7 +119,7 @@ async def login_for_access_token(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.email}, 
+        data={"sub": user.email, "ver": user.token_version},
         expires_delta=access_token_expires
     )
     
@@ -119,7 +128,7 @@ async def login_for_access_token(
 
  
 @router.get("/me", response_model=schemas.UserOut)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     """
     Get the profile for the current logged-in user.
     """
@@ -158,14 +167,15 @@ class Token(BaseModel):
 async def login_or_register_with_google(
     token: FirebaseToken,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Receives a Firebase ID token from the frontend, verifies it,
     finds or creates a user, and returns your app's access token.
     """
     try:
-        decoded_token = auth.verify_id_token(token.token)
+        # Fetches Google's signing keys over the network, keep it off the event loop
+        decoded_token = await run_in_threadpool(auth.verify_id_token, token.token)
         email = decoded_token.get("email")
         name = decoded_token.get("name", "New User")
 
@@ -174,7 +184,7 @@ async def login_or_register_with_google(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email not found in Firebase token.",
             )
-        user = get_user_by_email(db, email=email)
+        user = await get_user_by_email(db, email=email)
 
         if not user:
             print(f"User not found. Creating new user for: {email}")
@@ -183,7 +193,7 @@ async def login_or_register_with_google(
             user_to_create = UserCreate(
                 email=email,
                 password=random_password)
-            user = create_user(db, user=user_to_create) 
+            user = await create_user(db, user=user_to_create) 
             background_tasks.add_task(
                 send_welcome_email, 
                 to_email=email, 
@@ -193,7 +203,7 @@ async def login_or_register_with_google(
             print(f"User found: {email}")
 
         app_access_token = create_access_token(
-            data={"sub": user.email, "id": user.id} 
+            data={"sub": user.email, "id": user.id, "ver": user.token_version}
         )
 
         return {"access_token": app_access_token, "token_type": "bearer"}
@@ -208,6 +218,9 @@ async def login_or_register_with_google(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Firebase token."
         )
+    except HashingPoolSaturated:
+        # Creating the user hashes a password, let the 503 handler answer
+        raise
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         raise HTTPException(
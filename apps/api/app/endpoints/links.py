@@ -1,19 +1,30 @@
+import json
+import logging
 import secrets
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from jose import JWTError, jwt
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 
 # Import your helpers
-from app import crud
+from app import crud, crud_async
 from app.db import schemas, models, database
 from app.core.security import oauth2_scheme
 from app.core.config import settings
+from app.core.cache import link_cache, user_cache, Principal
+from app.core.bloom import short_code_filter
+from app.core import click_export
+from app.core.bulk_import import BulkRow, DuplexStreamingResponse, parse_rows, upload_format
+from app.core.sql_profiler import query_budget
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 # --- Dependency to get DB ---
 def get_db():
     db = database.SessionLocal()
@@ -24,11 +35,13 @@ def get_db():
 
 # --- Dependency to get the Current User (from Token) ---
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-) -> models.User:
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
     """
     Decodes the JWT token, validates it, and returns the user.
+    Users are looked up through the user cache, so most requests don't
+    touch the database at all. Tokens whose "ver" claim doesn't match the
+    user's token_version (bumped on deactivation) are rejected.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,11 +59,20 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = crud.get_user_by_email(db, email=email)
-    if user is None:
+    principal = await user_cache.get(email)
+    if principal is None:
+        async with database.AsyncSessionLocal() as db:
+            user = await crud_async.get_user_by_email(db, email=email)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        await user_cache.set(email, principal)
+
+    # Tokens from before the claim existed count as version 0
+    if payload.get("ver", 0) != principal.token_version:
         raise credentials_exception
-        
-    return user
+
+    return principal
 
 # --- Schema for creating a link ---
 class LinkCreate(BaseModel):
@@ -60,44 +82,172 @@ class LinkCreate(BaseModel):
 # --- Endpoints ---
 
 @router.get("/", response_model=List[schemas.Link])
-async def get_user_links(
+@query_budget(2)
+def get_user_links(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    tag: Optional[str] = None,
+    status: Optional[str] = Query(None, enum=["active", "expired"]),
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
-    Gets all links for the currently logged-in user.
+    Gets the links of the currently logged-in user, newest first, one page
+    at a time. When there are more, the X-Next-Cursor response header holds
+    the `cursor` to pass for the next page.
     """
-    links = crud.get_links_by_user(db=db, user_id=current_user.id)
-    
-    return crud.convert_db_links_to_schemas(links)
+    try:
+        links, next_cursor = crud.get_links_by_user(
+            db=db, user_id=current_user.id, cursor=cursor, limit=limit, tag=tag, status=status
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    # They're all the current user's, no need to load the owner
+    return crud.convert_db_links_to_schemas(links, owner=current_user)
 
 @router.post("/", response_model=schemas.Link)
 async def create_link(
     link: LinkCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Creates a new short link for the currently logged-in user.
     """
-    new_link = crud.create_db_link(
+    new_link = await crud_async.create_db_link(
         db=db,
         original_url=link.original_url,
         user_id=current_user.id,
         tag=link.tag, 
     )
-    return crud.convert_db_link_to_schema(new_link)
+    short_code_filter.add(new_link.short_code)
+    # A brand-new link has no clicks, and its owner is the current user
+    return crud.convert_db_link_to_schema(new_link, click_count=0, owner=current_user)
+
+async def _create_links_in_chunks(rows, user_id: int):
+    """
+    Inserts parsed upload rows chunk by chunk and yields one NDJSON result
+    line per input row, then a summary. Only one chunk is held at a time.
+    """
+    created = failed = 0
+    chunk: List[BulkRow] = []
+
+    async def flush():
+        nonlocal created, failed
+        try:
+            async with database.AsyncSessionLocal() as db:
+                short_codes = await crud_async.create_db_links(db, [row._asdict() for row in chunk], user_id)
+        except Exception:
+            logger.exception("Error creating %d bulk links", len(chunk))
+            failed += len(chunk)
+            return [{"line": row.line, "error": "could not save link"} for row in chunk]
+        for short_code in short_codes:
+            short_code_filter.add(short_code)
+        created += len(chunk)
+        return [
+            {"line": row.line, "short_code": short_code, "original_url": row.original_url, "tag": row.tag}
+            for row, short_code in zip(chunk, short_codes)
+        ]
+
+    async for row in rows:
+        if row.error:
+            failed += 1
+            yield json.dumps({"line": row.line, "error": row.error}) + "\n"
+            continue
+        chunk.append(row)
+        if len(chunk) >= settings.LINK_BULK_CHUNK_SIZE:
+            for result in await flush():
+                yield json.dumps(result) + "\n"
+            chunk = []
+    if chunk:
+        for result in await flush():
+            yield json.dumps(result) + "\n"
+    yield json.dumps({"created": created, "failed": failed}) + "\n"
+
+@router.post("/bulk")
+async def create_links_bulk(
+    request: Request,
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Creates many links from a streamed upload, one (original_url, tag) record
+    per line: CSV (Content-Type: text/csv, optional header row) or NDJSON
+    (application/x-ndjson). Results stream back as NDJSON while the upload is
+    still being read, one line per record (`short_code` or `error`, with its
+    `line`; rejected lines can come before earlier rows still in a chunk),
+    then a `{"created": n, "failed": m}` summary.
+    """
+    fmt = upload_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload CSV (text/csv) or NDJSON (application/x-ndjson)"
+        )
+    rows = parse_rows(request.stream(), fmt)
+    return DuplexStreamingResponse(
+        _create_links_in_chunks(rows, current_user.id),
+        media_type="application/x-ndjson"
+    )
+
+def _export_response(chunks, name: str, fmt: str, gzip: bool) -> StreamingResponse:
+    filename = f"{name}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        click_export.encode_export(chunks, fmt, compress=gzip),
+        media_type="application/gzip" if gzip else click_export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Declared before the /{link_id} routes so "clicks" isn't taken for an id
+@router.get("/clicks/export")
+async def export_account_clicks(
+    format: str = Query("csv", enum=["csv", "ndjson"]),
+    gzip: bool = False,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Streams the raw clicks of all the current user's links as CSV or NDJSON,
+    optionally gzipped and limited to start <= created_at < end.
+    """
+    await click_export.check_archive(start, end)
+    chunks = click_export.account_clicks(current_user.id, settings.CLICK_EXPORT_CHUNK_SIZE, start, end)
+    return _export_response(chunks, "clicks", format, gzip)
+
+@router.get("/{link_id}/clicks/export")
+async def export_link_clicks(
+    link_id: int,
+    format: str = Query("csv", enum=["csv", "ndjson"]),
+    gzip: bool = False,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Streams the raw clicks of one of the current user's links as CSV or
+    NDJSON, optionally gzipped and limited to start <= created_at < end.
+    """
+    async with database.AsyncSessionLocal() as db:
+        link = await crud_async.get_link_by_id_and_owner(db, link_id, current_user.id)
+    if not link:
+        raise HTTPException(status_code=403, detail="Not authorized or link not found")
+    await click_export.check_archive(start, end)
+    chunks = click_export.link_clicks(link.id, link.short_code, settings.CLICK_EXPORT_CHUNK_SIZE, start, end)
+    return _export_response(chunks, f"clicks-{link.short_code}", format, gzip)
 
 @router.delete("/{link_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_link(
     link_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Deletes a link owned by the current user.
     """
-    link_to_delete = crud.get_link_by_id_and_owner(db, link_id, current_user.id)
+    link_to_delete = await crud_async.get_link_by_id_and_owner(db, link_id, current_user.id)
     
     if not link_to_delete:
         raise HTTPException(
@@ -105,8 +255,9 @@ async def delete_link(
             detail="Link not found or you do not have permission to delete it"
         )
     
-    db.delete(link_to_delete)
-    db.commit()
+    await crud_async.delete_link(db, link_to_delete)
+    await link_cache.ainvalidate(link_to_delete.short_code)
+    short_code_filter.discard(link_to_delete.short_code)
     return 
 
 @router.put("/{link_id}/extend", response_model=schemas.Link)
@@ -114,7 +265,7 @@ def extend_link_expiration(
     link_id: int,
     days: int = 30,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Extends a link's expiration date (Superuser only).
@@ -129,13 +280,15 @@ def extend_link_expiration(
     link.expires_at = datetime.utcnow() + timedelta(days=days)
     db.commit()
     db.refresh(link)
+    link_cache.invalidate(link.short_code)
     
     return crud.convert_db_link_to_schema(link)
   
 @router.get("/expired", response_model=List[schemas.Link])
+@query_budget(3)
 def get_expired_links(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Gets all expired links (Superuser only).
@@ -144,14 +297,21 @@ def get_expired_links(
         raise HTTPException(status_code=403, detail="Permission denied")
 
     now = datetime.utcnow()
-    expired_links = db.query(models.Link).filter(models.Link.expires_at < now).all()
-    
+    # Owners in one extra query rather than one per owner
+    expired_links = (
+        db.query(models.Link)
+        .options(selectinload(models.Link.owner))
+        .filter(models.Link.expires_at < now)
+        .all()
+    )
+
     return crud.convert_db_links_to_schemas(expired_links)
 
 @router.get("/active", response_model=List[schemas.Link])
+@query_budget(2)
 def get_active_links(
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Gets all active (non-expired) links for the current user.
@@ -160,53 +320,52 @@ def get_active_links(
     links = (
         db.query(models.Link)
         .filter(models.Link.owner_id == current_user.id)
-        .filter((models.Link.expires_at == None) | (models.Link.expires_at > current_time))
+        .filter((models.Link.expires_at == None) | (models.Link.expires_at >= current_time))
         .all()
     )
-    return crud.convert_db_links_to_schemas(links)
+    # They're all the current user's, no need to load the owner
+    return crud.convert_db_links_to_schemas(links, owner=current_user)
 
 @router.get("/{link_id}/stats")
+@query_budget(4)
 def get_link_stats(
     link_id: int, 
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db), 
     current_user=Depends(get_current_user)
 ):
     """
-    Gets detailed click statistics for a single link.
+    Gets detailed click statistics for a single link, optionally only for
+    clicks with start <= created_at < end. Each breakdown holds the top
+    `limit` values plus 'Other'.
     """
     link = crud.get_link_by_id_and_owner(db, link_id, current_user.id)
     if not link:
         raise HTTPException(status_code=403, detail="Not authorized or link not found")
 
-    clicks = link.clicks
-    total_clicks = len(clicks)
-
-    def group_by(clicks_list, attr):
-        result = {}
-        for c in clicks_list:
-            key = getattr(c, attr) or "unknown"
-            result[key] = result.get(key, 0) + 1
-        return result
+    stats = crud.get_link_click_stats(db, link.id, start=start, end=end, limit=limit)
 
     return {
         "short_code": link.short_code,
-        "total_clicks": total_clicks,
+        "total_clicks": stats["total_clicks"],
         "tag": link.tag,
         "created_at": link.created_at,
-        "last_clicked_at": max([c.created_at for c in clicks]) if clicks else None,
-        "by_country": group_by(clicks, "country"),
-        "by_referrer": group_by(clicks, "referrer"),
-        "by_browser": group_by(clicks, "browser"),
-        "by_device": group_by(clicks, "device_type"),
+        "last_clicked_at": stats["last_clicked_at"],
+        "by_country": stats["by_country"],
+        "by_referrer": stats["by_referrer"],
+        "by_browser": stats["by_browser"],
+        "by_device": stats["by_device"],
     }
 
 @router.delete("/users/me", status_code=status.HTTP_204_NO_CONTENT)
 def delete_current_user(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Deletes the current user and all their associated data."""
-    db.delete(current_user)
-    db.commit()
+    # current_user comes from the auth session, delete through this one
+    crud.delete_user_by_id(db, user_id=current_user.id)
     return
 
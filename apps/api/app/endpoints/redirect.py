@@ -1,48 +1,38 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import RedirectResponse, HTMLResponse
-from sqlalchemy.orm import Session
 from app.db import models, database
-from user_agents import parse
+from app.core.cache import link_cache
+from app.core.bloom import short_code_filter
+from app.core.click_ingest import click_ingestor
+from app.core.user_agent import classify_user_agent
 from datetime import datetime
-from app import crud
+from app import crud_async
 
 router = APIRouter()
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# --- Helper functions ---
-def parse_browser(user_agent_str: str) -> str:
-    try:
-        ua = parse(user_agent_str or "")
-        return ua.browser.family
-    except Exception:
-        return "unknown"
-
-def parse_device_type(user_agent_str: str) -> str:
-    ua = parse(user_agent_str or "")
-    return "mobile" if ua.is_mobile else "tablet" if ua.is_tablet else "desktop"
-
 # --- Endpoints ---
 
 @router.get("/{short_code}")
 async def handle_redirect(
     short_code: str, 
-    request: Request, 
-    db: Session = Depends(get_db)
+    request: Request
 ):
     """
     Handles the primary redirect. This is the one you should share.
     It logs the click and redirects to the original URL.
+    Hot links are served from the link cache without opening a DB session.
     """
-    link = crud.get_link_by_short_code(db, short_code=short_code)
-    
-    if not link:
-        raise HTTPException(status_code=404, detail="Short link not found")
+    link = await link_cache.get(short_code)
+    if link is None:
+        # Definite misses (scanners, typos) share the filter's next scan
+        # instead of a query each
+        if not await short_code_filter.might_exist(short_code):
+            raise HTTPException(status_code=404, detail="Short link not found")
+        async with database.AsyncSessionLocal() as db:
+            link = await crud_async.resolve_short_code(db, short_code=short_code)
+        if not link:
+            raise HTTPException(status_code=404, detail="Short link not found")
+        await link_cache.set(short_code, link)
   
     # Link expiration check
     if link.expires_at and datetime.utcnow() > link.expires_at:
@@ -60,17 +50,17 @@ async def handle_redirect(
         )
     
     # --- Log Click Analytics ---
-    user_agent = request.headers.get("user-agent")
+    user_agent = classify_user_agent(request.headers.get("user-agent"))
     referrer = request.headers.get("referer")
     ip = request.client.host 
-    crud.create_click_log(
-        db=db,
+    # Queued for the batch writer, which also resolves the country from the
+    # IP; the redirect doesn't wait for either
+    await click_ingestor.record(
         link_id=link.id,
         ip_address=ip,
-        country=ip, 
         referrer=referrer,
-        browser=parse_browser(user_agent),
-        device_type=parse_device_type(user_agent),
+        browser=user_agent.browser,
+        device_type=user_agent.device_type,
     )
     
     return RedirectResponse(url=link.original_url, status_code=307)
@@ -0,0 +1,209 @@
+"""
+Moves raw clicks older than the retention period out of the clicks table.
+
+    python -m app.jobs.archive_clicks [--days 180] [--batch-size 1000] [--pause 0.1]
+                                      [--max-days 30] [--drop-deleted-links]
+
+Needs CLICK_ARCHIVE_DIR, and CLICK_RETENTION_DAYS unless --days is given.
+Works through whole UTC days, oldest first, up to the start of the day
+--days ago. For each day it:
+
+1. checks the day's rollups against its clicks and rebuilds those of the
+   links that don't add up, so the analytics keep counting the day;
+2. exports the day's clicks to a Parquet file (app/core/click_archive.py)
+   and records it in click_archive_days, after which link stats and
+   exports read the day from the file;
+3. deletes the day's clicks in --batch-size transactions.
+
+Then it compacts the day files of every fully archived month into one
+file per month: reads open one file per month instead of one per day.
+Exports and compactions stream a row group at a time, so neither holds a
+whole day or month in memory.
+
+Reads and deletes go in short batches with --pause seconds between them,
+so the job can run while the API serves traffic. It's resumable: stopped
+anywhere, the next run finishes the deletes of an exported day first, and
+a day whose export didn't finish is exported again. --max-days bounds a
+run, to work through a long history a slice at a time.
+
+Archived clicks are kept when their link or its owner is deleted;
+--drop-deleted-links rewrites the archive files without them.
+
+Needs the schema up to date (alembic upgrade head, or DB_MIGRATE_ON_STARTUP).
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from app import crud
+from app.core import click_archive
+from app.core.config import settings
+from app.db import database, models
+
+
+def _rollup_day(start: datetime) -> int:
+    """Rebuilds the day's rollups of the links they're off for. Returns how many."""
+    with database.SessionLocal() as db:
+        link_ids = crud.get_unrolled_link_ids(db, start)
+    for link_id in link_ids:
+        with database.SessionLocal() as db:
+            crud.rebuild_click_rollups(db, link_id, link_id, since=start, until=start + timedelta(days=1))
+    return len(link_ids)
+
+
+def _export_day(day: date, batch_size: int, pause: float) -> int:
+    """Writes the day's file and records the day. Returns the number of clicks."""
+    start = click_archive.day_start(day)
+    end = start + timedelta(days=1)
+    last_click_id = 0
+
+    def pages():
+        nonlocal last_click_id
+        after = None
+        while True:
+            with database.SessionLocal() as db:
+                rows = crud.get_clicks_between_page(db, start, end, after, batch_size)
+            if not rows:
+                return
+            last_click_id = max(last_click_id, max(row.id for row in rows))
+            yield rows
+            after = (rows[-1].created_at, rows[-1].id)
+            if len(rows) < batch_size:
+                return
+            if pause:
+                time.sleep(pause)
+
+    clicks = click_archive.write_day(day, pages())
+    with database.SessionLocal() as db:
+        crud.record_archived_day(db, day, clicks, last_click_id)
+    return clicks
+
+
+def _purge_day(day: date, batch_size: int, pause: float) -> int:
+    """Deletes the raw clicks of an exported day. Returns how many."""
+    deleted = 0
+    while True:
+        with database.SessionLocal() as db:
+            archived_day = db.get(models.ClickArchiveDay, day)
+            count = crud.delete_archived_clicks(db, archived_day, batch_size)
+            if not count:
+                crud.mark_archived_day_purged(db, archived_day)
+                return deleted
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+def archive(days: int, batch_size: int = 1000, pause: float = 0.0, max_days: int | None = None) -> dict:
+    """
+    Archives every whole day of clicks older than `days` days, at most
+    `max_days` of them. Returns the number of days, clicks and deletes.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=days)).date()
+    totals = {"days": 0, "clicks": 0, "deleted": 0}
+
+    # A run that stopped between the export and the end of the deletes
+    with database.SessionLocal() as db:
+        unpurged = [archived_day.day for archived_day in crud.get_unpurged_archive_days(db)]
+        horizon = crud.get_archive_horizon(db)
+        first_click_at = crud.get_first_click_at(db) if horizon is None else None
+    for day in unpurged:
+        deleted = _purge_day(day, batch_size, pause)
+        totals["deleted"] += deleted
+        print(f"{day}: finished deleting, {deleted} click(s)")
+
+    if horizon is not None:
+        day = horizon.date()
+    elif first_click_at is not None:
+        day = click_archive.utc_naive(first_click_at).date()
+    else:
+        return totals
+    while day < cutoff and (max_days is None or totals["days"] < max_days):
+        repaired = _rollup_day(click_archive.day_start(day))
+        clicks = _export_day(day, batch_size, pause)
+        deleted = _purge_day(day, batch_size, pause)
+        totals["days"] += 1
+        totals["clicks"] += clicks
+        totals["deleted"] += deleted
+        print(f"{day}: {clicks} click(s) archived, {deleted} deleted"
+              + (f", rollups of {repaired} link(s) rebuilt" if repaired else ""))
+        day += timedelta(days=1)
+    return totals
+
+
+def compact(horizon: datetime) -> int:
+    """Compacts the day files of every month archived in full. Returns how many months."""
+    months = defaultdict(list)
+    with database.SessionLocal() as db:
+        for archived_day in crud.get_archived_days(db, end=horizon):
+            months[archived_day.day.replace(day=1)].append(archived_day)
+    compacted = 0
+    for month, archived_days in sorted(months.items()):
+        next_month = (month + timedelta(days=31)).replace(day=1)
+        clicks = sum(archived_day.clicks for archived_day in archived_days)
+        if click_archive.day_start(next_month) > horizon:
+            continue
+        path = click_archive.compact_month([archived_day.day for archived_day in archived_days])
+        if path:
+            compacted += 1
+            print(f"{month:%Y-%m}: {clicks} click(s) compacted into {path}")
+    return compacted
+
+
+def drop_deleted_links(batch_size: int = 1000, pause: float = 0.0) -> int:
+    """Rewrites the archive files without the clicks of deleted links. Returns how many clicks."""
+    with database.SessionLocal() as db:
+        days = [archived_day.day for archived_day in crud.get_archived_days(db) if archived_day.clicks]
+    dropped = 0
+    for path in click_archive.paths(days):
+        link_ids = click_archive.link_ids(path)
+        existing = set()
+        for i in range(0, len(link_ids), batch_size):
+            with database.SessionLocal() as db:
+                existing.update(crud.get_existing_link_ids(db, link_ids[i:i + batch_size]))
+        deleted_links = set(link_ids) - existing
+        if deleted_links:
+            removed = click_archive.drop_links(path, deleted_links)
+            with database.SessionLocal() as db:
+                crud.remove_archived_clicks(db, removed)
+            dropped += len(removed)
+            print(f"{path}: dropped {len(removed)} click(s) of {len(deleted_links)} deleted link(s)")
+        if pause:
+            time.sleep(pause)
+    return dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive raw clicks older than the retention period")
+    parser.add_argument("--days", type=int, default=settings.CLICK_RETENTION_DAYS,
+                        help="retention period in days (default CLICK_RETENTION_DAYS)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="clicks per read and per DELETE")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--max-days", type=int, help="stop after archiving this many days")
+    parser.add_argument("--drop-deleted-links", action="store_true",
+                        help="drop clicks of deleted links from the archive")
+    args = parser.parse_args()
+
+    if not click_archive.available():
+        parser.error("set CLICK_ARCHIVE_DIR, and install pyarrow")
+    if args.days <= 0:
+        parser.error("no retention period: set CLICK_RETENTION_DAYS or pass --days")
+
+    totals = archive(args.days, batch_size=args.batch_size, pause=args.pause, max_days=args.max_days)
+    print(f"Archived clicks: {totals['clicks']} click(s) of {totals['days']} day(s), {totals['deleted']} deleted")
+    with database.SessionLocal() as db:
+        horizon = crud.get_archive_horizon(db)
+    if horizon is not None:
+        months = compact(horizon)
+        print(f"Compacted the archive: {months} month(s)")
+    if args.drop_deleted_links:
+        try:
+            dropped = drop_deleted_links(batch_size=args.batch_size, pause=args.pause)
+        except click_archive.ArchiveUnavailable as e:
+            parser.exit(1, f"Can't drop the clicks of deleted links: {e}\n")
+        print(f"Dropped {dropped} archived click(s) of deleted links")
+
+
+if __name__ == "__main__":
+    main()
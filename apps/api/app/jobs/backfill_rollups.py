@@ -0,0 +1,49 @@
+"""
+Rebuilds the click_rollups table from the raw clicks.
+
+    python -m app.jobs.backfill_rollups [--chunk-size 500] [--pause 0.1]
+
+Run it once after deploying the rollups to cover the click history; the
+click writer keeps them current from then on. It's also safe to re-run to
+repair a range: each chunk of links is recomputed from scratch in its own
+transaction while the API keeps serving traffic. The rollups of archived
+days (app/jobs/archive_clicks.py) are kept, their clicks are gone.
+"""
+import argparse
+import time
+
+from sqlalchemy import func
+
+from app import crud
+from app.db import database, models
+
+
+def backfill(chunk_size: int = 500, pause: float = 0.0) -> int:
+    """Rebuilds the rollups of every link, one id range at a time. Returns rows written."""
+    with database.SessionLocal() as db:
+        max_id = db.query(func.max(models.Link.id)).scalar() or 0
+        horizon = crud.get_archive_horizon(db)
+
+    written = 0
+    for first_id in range(1, max_id + 1, chunk_size):
+        last_id = first_id + chunk_size - 1
+        with database.SessionLocal() as db:
+            written += crud.rebuild_click_rollups(db, first_id, last_id, since=horizon)
+        print(f"Links {first_id}-{min(last_id, max_id)} of {max_id}: {written} rollup rows so far")
+        if pause:
+            time.sleep(pause)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild click_rollups from the clicks table")
+    parser.add_argument("--chunk-size", type=int, default=500, help="links per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    args = parser.parse_args()
+
+    written = backfill(chunk_size=args.chunk_size, pause=args.pause)
+    print(f"Backfilled click rollups: {written} row(s) written")
+
+
+if __name__ == "__main__":
+    main()
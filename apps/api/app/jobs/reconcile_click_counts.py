@@ -0,0 +1,51 @@
+"""
+Repairs drift in the denormalized links.click_count / last_clicked_at columns.
+
+    python -m app.jobs.reconcile_click_counts [--chunk-size 5000] [--pause 0.1]
+
+Walks the links table in id ranges so each UPDATE only locks a small slice,
+and is safe to run while the API is serving traffic. Archived clicks
+(app/jobs/archive_clicks.py) are counted from their rollups. The columns
+were added after launch; on an existing database create them first, then
+run this job once to backfill them:
+
+    ALTER TABLE links
+      ADD COLUMN click_count INT NOT NULL DEFAULT 0,
+      ADD COLUMN last_clicked_at DATETIME NULL;
+"""
+import argparse
+import time
+
+from sqlalchemy import func
+
+from app import crud
+from app.db import database, models
+
+
+def reconcile(chunk_size: int = 5000, pause: float = 0.0) -> int:
+    """Reconciles every link, one id range at a time. Returns the number repaired."""
+    with database.SessionLocal() as db:
+        max_id = db.query(func.max(models.Link.id)).scalar() or 0
+        horizon = crud.get_archive_horizon(db)
+
+    repaired = 0
+    for first_id in range(1, max_id + 1, chunk_size):
+        with database.SessionLocal() as db:
+            repaired += crud.reconcile_click_counts(db, first_id, first_id + chunk_size - 1, horizon)
+        if pause:
+            time.sleep(pause)
+    return repaired
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repair links.click_count drift")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="links per UPDATE")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    args = parser.parse_args()
+
+    repaired = reconcile(chunk_size=args.chunk_size, pause=args.pause)
+    print(f"Reconciled click counts: {repaired} link(s) repaired")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Recounts the stat_counters table behind the admin totals.
+
+    python -m app.jobs.reconcile_counters [--days 7]
+
+The writes keep the counters current, so this is only needed once after
+deploying them on an existing database (after migration 0007, which adds
+the table), or to repair drift an audit with GET /admin/stats?exact=true
+turned up. Sets the totals to COUNT(*) of each table and rebuilds the hourly
+growth rows of the last `--days` days from the created_at columns.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from app import crud
+from app.core.counters import hour_of
+from app.db import database
+
+
+def reconcile(days: int = 7) -> dict:
+    since = hour_of(datetime.utcnow()) - timedelta(days=days)
+    with database.SessionLocal() as db:
+        return crud.rebuild_stat_counters(db, since)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recount the stat_counters table")
+    parser.add_argument("--days", type=int, default=7, help="days of hourly growth rows to rebuild")
+    args = parser.parse_args()
+
+    totals = reconcile(days=args.days)
+    print("Reconciled counters: " + ", ".join(f"{count} {name}" for name, count in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
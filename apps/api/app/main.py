@@ -1,4 +1,6 @@
-from fastapi.responses import JSONResponse
+import logging
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse, Response
 from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -11,18 +13,61 @@ from jose import jwt
 from typing import List, Optional
 
 
-from app.db.database import get_db, engine, Base
+from app.db.database import get_db, engine, async_engine
+from app.db import dialect, migrate
 from app.db.models import User
 from app.core.config import settings
+from app.core.click_ingest import click_ingestor
+from app.core.bloom import short_code_filter
+from app.core.geoip import geoip
+from app.core.password_hashing import password_hasher, HashingPoolSaturated
+from app.core.cache import connect_shared_cache_from_url, disconnect_shared_cache
+from app.core.click_archive import ArchiveUnavailable
+from app.db.pool import RequestScopeMiddleware
+from app.core import metrics, sql_profiler
 from app.endpoints import auth, links, admin, analysis, redirect, contact
 
-#create all tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+dialect.check_supported(engine)
+
+# Create or upgrade the schema (see app/db/migrations)
+if settings.DB_MIGRATE_ON_STARTUP:
+    migrate.upgrade(engine)
+
+if settings.SQL_PROFILING_ENABLED:
+    sql_profiler.install(engine, async_engine.sync_engine)
+
+metrics_server = None
+if settings.METRICS_ENABLED:
+    metrics.install_collectors()
+    if settings.METRICS_PORT:
+        metrics_server = metrics.MetricsServer(settings.METRICS_HOST, settings.METRICS_PORT)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.REDIS_URL:
+        connect_shared_cache_from_url(settings.REDIS_URL)
+    await click_ingestor.start()
+    await short_code_filter.start()
+    if metrics_server:
+        metrics_server.start()
+    yield
+    if metrics_server:
+        metrics_server.stop()
+    await short_code_filter.stop()
+    # Flush any buffered clicks before the worker exits
+    await click_ingestor.stop()
+    geoip.close()
+    password_hasher.close()
+    await async_engine.dispose()
+    disconnect_shared_cache()
 
 app = FastAPI(
     title="Link Shortener API",
     description="API for managing link shortener",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.state.limiter = limiter
@@ -34,6 +79,23 @@ async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
         content={"detail": f"Rate limit exceeded: {exc.detail}"}
     )
 
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated_handler(request: Request, exc: HashingPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many logins in progress, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(ArchiveUnavailable)
+async def archive_unavailable_handler(request: Request, exc: ArchiveUnavailable):
+    # Rather than answer with only the clicks still in the database
+    logger.error("Can't serve %s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Archived clicks can't be read right now, please retry later"},
+    )
+
 origins = [
     "http://localhost",
     "http://localhost:3000",
@@ -47,7 +109,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the dashboard read the pagination cursor of list endpoints
+    expose_headers=["X-Next-Cursor"],
 )
+# Lets the pool metrics attribute connection checkouts to routes
+app.add_middleware(RequestScopeMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+if settings.SQL_PROFILING_ENABLED:
+    app.add_middleware(sql_profiler.SQLProfilerMiddleware)
 
 security = HTTPBearer()
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -83,6 +153,11 @@ async def health_check():
 async def read_root():
     return {"message": "Welcome to the LinkShorty API!"}
  
+if settings.METRICS_ENABLED and settings.METRICS_ON_API_PORT:
+    @app.get("/metrics", include_in_schema=False)
+    def get_metrics():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 app.include_router(contact.router, prefix="/api", tags=["Contact"]) 
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])  
 app.include_router(links.router, prefix="/links", tags=["Links"])
@@ -0,0 +1,61 @@
+"""
+Authenticated request throughput for a single worker.
+
+Seeds a throwaway SQLite database with one user, then keeps `--concurrency`
+GET /auth/me requests in flight for `--duration` seconds, in process through
+httpx's ASGI transport, and reports the SQL statements each request took.
+`--no-cache` bypasses the principal cache, which is what every request cost
+before it: a user lookup per call.
+
+    cd apps/api
+    python -m bench.bench_auth --concurrency 16 --duration 10
+"""
+import argparse
+import asyncio
+import os
+
+from bench import harness
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", default="/auth/me", help="authenticated endpoint to call")
+    parser.add_argument("--no-cache", action="store_true", help="look the user up on every request")
+    return parser.parse_args()
+
+
+async def run(app, token, path, concurrency, duration):
+    async with harness.client(app, headers={"Authorization": f"Bearer {token}"}) as client:
+        async def send(_):
+            response = await client.get(path)
+            assert response.status_code == 200, response.text
+            return True
+
+        latencies, _ = await harness.drive(send, concurrency, duration)
+    return latencies
+
+
+def main():
+    args = parse_args()
+    harness.setup(os.environ.get("DATABASE_URL"))
+    token = harness.token_for(harness.seed_user())
+    from app.core.cache import user_cache
+    from app.db import database
+    from app.main import app
+
+    if args.no_cache:
+        async def miss(key):
+            return None
+        user_cache.get = miss
+
+    statements = harness.StatementCounter(database.async_engine.sync_engine)
+    latencies = asyncio.run(run(app, token, args.path, args.concurrency, args.duration))
+    result = harness.summarize(latencies, 0, args.duration)
+    print(harness.format_row(args.path, result))
+    print(f"SQL/request:   {statements.count / len(latencies):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Analysis dashboard load: the five separate endpoints vs GET /analysis/dashboard.
+
+Seeds a throwaway SQLite database with one user's links and clicks spread over
+`--days` days, builds the rollups, then loads the dashboard `--loads` times
+each way, in process through httpx's ASGI transport. Reports latency per full
+dashboard load and the SQL statements it took. The five calls are fired in
+parallel like the browser does; `--sequential` sends them one after another,
+which shows the server-side cost of a load.
+
+    cd apps/api
+    python -m bench.bench_dashboard --links 200 --clicks 200000 --days 365
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bench import harness
+
+SEPARATE = [
+    "/analysis/clicks-over-time?interval=day",
+    "/analysis/device-breakdown",
+    "/analysis/browser-breakdown",
+    "/analysis/referrer-breakdown",
+    "/analysis/country-breakdown",
+]
+COMBINED = ["/analysis/dashboard?interval=day"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--links", type=int, default=200)
+    parser.add_argument("--clicks", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--loads", type=int, default=50)
+    parser.add_argument("--sequential", action="store_true", help="don't overlap the five calls")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def seed(n_links: int, n_clicks: int, days: int, rng: random.Random) -> str:
+    from sqlalchemy import select
+
+    from app.db import database, models
+    from app.jobs.backfill_rollups import backfill
+
+    user = harness.seed_user()
+    harness.seed_links(user.id, [f"d{i:07d}" for i in range(n_links)])
+    with database.SessionLocal() as db:
+        link_ids = list(db.scalars(select(models.Link.id)))
+
+    since = datetime.utcnow() - timedelta(days=days)
+    countries = ["US", "DE", "GB", "FR", "IN", "BR", "JP", None]
+    referrers = [f"https://ref{i}.example" for i in range(50)] + [None]
+    browsers = ["Chrome", "Safari", "Firefox", "Edge", "Mobile Safari", "Other"]
+    devices = ["desktop", "mobile", "tablet"]
+    with database.engine.begin() as conn:
+        for offset in range(0, n_clicks, 10_000):
+            conn.execute(models.Click.__table__.insert(), [
+                {
+                    "link_id": rng.choice(link_ids),
+                    "created_at": since + timedelta(seconds=rng.randrange(days * 86400)),
+                    "ip_address": "203.0.113.7",
+                    "country": rng.choice(countries),
+                    "referrer": rng.choice(referrers),
+                    "browser": rng.choice(browsers),
+                    "device_type": rng.choice(devices),
+                }
+                for _ in range(min(10_000, n_clicks - offset))
+            ])
+    backfill(chunk_size=n_links)
+    return harness.token_for(user)
+
+
+async def run(app, token, paths, loads, sequential):
+    latencies = []
+    async with harness.client(app, headers={"Authorization": f"Bearer {token}"}) as client:
+        for path in paths:  # Warm up the user cache
+            await client.get(path)
+        for _ in range(loads):
+            started = time.perf_counter()
+            if sequential:
+                responses = [await client.get(path) for path in paths]
+            else:
+                # The browser fires the separate calls in parallel
+                responses = await asyncio.gather(*(client.get(path) for path in paths))
+            latencies.append(time.perf_counter() - started)
+            assert all(response.status_code == 200 for response in responses)
+    return latencies
+
+
+def main():
+    args = parse_args()
+    harness.setup(os.environ.get("DATABASE_URL"))
+    token = seed(args.links, args.clicks, args.days, random.Random(args.seed))
+    from app.db import database
+    from app.main import app
+
+    statements = harness.StatementCounter(database.engine)
+    for name, paths in (("5 endpoints", SEPARATE), ("dashboard", COMBINED)):
+        statements.count = 0
+        latencies = asyncio.run(run(app, token, paths, args.loads, args.sequential))
+        per_load = statements.count / (args.loads + 1)
+        print(f"{name:12} p50 {statistics.median(latencies) * 1000:7.2f} ms   "
+              f"mean {statistics.fmean(latencies) * 1000:7.2f} ms   {per_load:.0f} SQL statements/load")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Sustained link-creation throughput for a single worker.
+
+Seeds a throwaway SQLite database with `--prefill` links, then keeps
+`--concurrency` POST /links/ requests in flight for `--duration` seconds, in
+process through httpx's ASGI transport. Also reports how fast the short-code
+allocator alone hands out codes.
+
+    cd apps/api
+    python -m bench.bench_link_create --prefill 100000 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from bench import harness
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prefill", type=int, default=100_000, help="links in the table before the run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    return parser.parse_args()
+
+
+def bench_allocator(n: int = 100_000) -> float:
+    from app.core.short_codes import short_code_allocator
+
+    permutation = short_code_allocator.permutation
+    started = time.perf_counter()
+    for value in range(n):
+        permutation.encode(value)
+    return n / (time.perf_counter() - started)
+
+
+async def run(app, token, concurrency, duration):
+    async with harness.client(app, headers={"Authorization": f"Bearer {token}"}) as client:
+        async def send(n):
+            response = await client.post("/links/", json={"original_url": f"https://example.org/{n}"})
+            assert response.status_code == 200, response.text
+            return True
+
+        latencies, _ = await harness.drive(send, concurrency, duration)
+    return latencies
+
+
+def main():
+    args = parse_args()
+    harness.setup(os.environ.get("DATABASE_URL"))
+    user = harness.seed_user()
+    harness.seed_links(user.id, [f"p{i:07d}" for i in range(args.prefill)])
+    from app.main import app
+
+    latencies = asyncio.run(run(app, harness.token_for(user), args.concurrency, args.duration))
+    print(harness.format_row("links created", harness.summarize(latencies, 0, args.duration)))
+    print(f"allocator:     {bench_allocator():,.0f} codes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Redirect latency while logins are hashing passwords on the same worker.
+
+Seeds a throwaway SQLite database with one user (real bcrypt hash) and one
+link, then for `--duration` seconds keeps `--logins` POST /auth/token
+requests and `--redirects` GET /{short_code} requests in flight, in process
+through httpx's ASGI transport. Reports redirect p50/p99 and how many logins
+finished within the run or were turned away with a 503. Run it with
+`--logins 0` for the redirect baseline.
+
+    cd apps/api
+    python -m bench.bench_login_redirect --logins 64 --redirects 8
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+
+from bench import harness
+
+PASSWORD = "bench-password"
+SHORT_CODE = "benchlnk"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64, help="concurrent login requests")
+    parser.add_argument("--redirects", type=int, default=8, help="concurrent redirect requests")
+    parser.add_argument("--duration", type=float, default=10.0)
+    return parser.parse_args()
+
+
+async def run(app, logins, redirects, duration):
+    login_status = Counter()
+    deadline = time.perf_counter() + duration
+    async with harness.client(app) as client:
+        async def login(_):
+            response = await client.post("/auth/token", data={"username": harness.BENCH_EMAIL, "password": PASSWORD})
+            if time.perf_counter() <= deadline:  # Not the ones drained afterwards
+                login_status[response.status_code] += 1
+            if response.status_code == 503:
+                await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+            return True
+
+        async def redirect(_):
+            response = await client.get(f"/{SHORT_CODE}", follow_redirects=False)
+            assert response.status_code == 307, response.text
+            await asyncio.sleep(0.001)
+            return True
+
+        (_, _), (latencies, _) = await asyncio.gather(
+            harness.drive(login, logins, duration), harness.drive(redirect, redirects, duration),
+        )
+    return latencies, login_status
+
+
+def main():
+    args = parse_args()
+    harness.setup(os.environ.get("DATABASE_URL"))
+    from app.core.security import get_password_hash
+
+    user = harness.seed_user(hashed_password=get_password_hash(PASSWORD))
+    harness.seed_links(user.id, [SHORT_CODE])
+    from app.main import app
+
+    latencies, login_status = asyncio.run(run(app, args.logins, args.redirects, args.duration))
+    print(harness.format_row("redirects", harness.summarize(latencies, 0, args.duration)))
+    print(f"logins:        {login_status[200]} ok, {login_status[503]} turned away (503), "
+          f"{sum(login_status.values()) - login_status[200] - login_status[503]} other")
+
+
+if __name__ == "__main__":
+    main()
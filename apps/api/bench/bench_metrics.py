@@ -0,0 +1,109 @@
+"""
+Cost of the metrics on the request path.
+
+Times what MetricsMiddleware adds to every request (one histogram
+observation) and what every SQL statement adds (one counter increment),
+from `--threads` threads at once, then the redirect throughput of the app
+with and without metrics, in process through httpx's ASGI transport.
+
+    cd apps/api
+    python -m bench.bench_metrics --threads 4 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench import harness
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=200_000, help="observations per thread")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per redirect run")
+    parser.add_argument("--redirect-run", choices=["on", "off"], help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def bench_primitives(threads: int, calls: int) -> None:
+    from prometheus_client import Counter, Histogram
+
+    from app.core.metrics import LATENCY_BUCKETS
+
+    histogram = Histogram("bench_seconds", "bench", ("method", "route", "status"),
+                          buckets=LATENCY_BUCKETS, registry=None)
+    counter = Counter("bench", "bench", ("engine",), registry=None)
+    queries = counter.labels("async")
+    for name, call in (
+        # Labelled per call like MetricsMiddleware; the query counter binds its child once
+        ("histogram.observe", lambda: histogram.labels("GET", "/{short_code}", "307").observe(0.0007)),
+        ("counter.inc", lambda: queries.inc()),
+    ):
+        def work():
+            for _ in range(calls):
+                call()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        per_call = elapsed / (threads * calls)
+        print(f"{name:18} {per_call * 1e9:6.0f} ns/call over {threads} threads "
+              f"({per_call * 10_000 * 100:.2f}% of a core at 10k calls/s)")
+    total = sum(sample.value for family in histogram.collect() for sample in family.samples
+                if sample.name == "bench_seconds_count")
+    assert total == threads * calls, "lost observations"
+
+
+SHORT_CODE = "benchlnk"
+
+
+async def redirects(app, duration) -> int:
+    async with harness.client(app) as client:
+        async def send(_):
+            response = await client.get(f"/{SHORT_CODE}", follow_redirects=False)
+            assert response.status_code == 307, response.text
+            return True
+
+        latencies, _ = await harness.drive(send, 1, duration)
+    return len(latencies)
+
+
+def redirect_run(duration: float) -> None:
+    harness.seed_links(harness.seed_user().id, [SHORT_CODE])
+    from app.main import app
+
+    served = asyncio.run(redirects(app, duration))
+    print(f"{served / duration:.0f}")
+
+
+def main():
+    args = parse_args()
+    harness.setup(os.environ.get("DATABASE_URL"), CLICK_INGEST_MODE="buffered")
+
+    if args.redirect_run:
+        redirect_run(args.duration)
+        return
+
+    bench_primitives(args.threads, args.calls)
+    # METRICS_ENABLED is read at import time, so each run gets its own process
+    for enabled in ("on", "off"):
+        env = {**os.environ, "METRICS_ENABLED": "true" if enabled == "on" else "false",
+               "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"}
+        output = subprocess.run(
+            [sys.executable, "-m", "bench.bench_metrics", "--redirect-run", enabled, "--duration", str(args.duration)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        print(f"redirects, metrics {enabled:3}  {int(output):,} req/s")
+
+
+if __name__ == "__main__":
+    main()
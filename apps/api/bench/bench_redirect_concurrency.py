@@ -0,0 +1,53 @@
+"""
+Concurrent redirect throughput for a single worker.
+
+Seeds a throwaway SQLite database, then fires redirects at random short codes
+from `--concurrency` in-flight requests for `--duration` seconds, in process
+through httpx's ASGI transport. The link cache is disabled by default so every
+request goes to the database; pass `--cache` to measure the cached path.
+
+    cd apps/api
+    python -m bench.bench_redirect_concurrency --links 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import random
+
+from bench import harness
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--links", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--cache", action="store_true", help="keep the redirect link cache enabled")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+async def run(app, codes, concurrency, duration, rng):
+    async with harness.client(app) as client:
+        async def send(_):
+            response = await client.get("/" + rng.choice(codes), follow_redirects=False)
+            assert response.status_code == 307, response.text
+            return True
+
+        latencies, _ = await harness.drive(send, concurrency, duration)
+    return latencies
+
+
+def main():
+    args = parse_args()
+    harness.setup(os.environ.get("DATABASE_URL"), **({} if args.cache else {"LINK_CACHE_TTL_SECONDS": "0"}))
+    codes = [f"b{i:07d}" for i in range(args.links)]
+    harness.seed_links(harness.seed_user().id, codes)
+    from app.main import app
+
+    latencies = asyncio.run(run(app, codes, args.concurrency, args.duration, random.Random(args.seed)))
+    print(harness.format_row("redirects", harness.summarize(latencies, 0, args.duration)))
+
+
+if __name__ == "__main__":
+    main()
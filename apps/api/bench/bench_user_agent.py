@@ -0,0 +1,55 @@
+"""
+Per-click CPU cost of user-agent classification, before and after memoization.
+
+"before" parses every header twice (browser, then device type), the way the
+redirect used to; "after" is one memoized `classify_user_agent` call.
+
+    cd apps/api
+    DATABASE_URL=sqlite:///./bench.db python -m bench.bench_user_agent --clicks 100000
+"""
+import argparse
+import random
+import time
+
+from user_agents import parse
+
+from app.core.user_agent import _classify, classify_user_agent, user_agent_cache_stats
+from bench.ua_corpus import weighted_sample
+
+
+def classify_twice(user_agent_str):
+    ua = parse(user_agent_str or "")
+    browser = ua.browser.family
+    ua = parse(user_agent_str or "")
+    device_type = "mobile" if ua.is_mobile else "tablet" if ua.is_tablet else "desktop"
+    return browser, device_type
+
+
+def timed(fn, corpus) -> float:
+    started = time.process_time()
+    for user_agent_str in corpus:
+        fn(user_agent_str)
+    return time.process_time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clicks", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = weighted_sample(random.Random(args.seed), args.clicks)
+
+    _classify.cache_clear()
+    before = timed(classify_twice, corpus)
+    after = timed(classify_user_agent, corpus)
+
+    print(f"clicks:  {args.clicks}")
+    print(f"before:  {before / args.clicks * 1e6:8.2f} us/click  (two parses)")
+    print(f"after:   {after / args.clicks * 1e6:8.2f} us/click  (memoized, cold cache)")
+    print(f"speedup: {before / after:8.1f}x")
+    print(f"cache:   {user_agent_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
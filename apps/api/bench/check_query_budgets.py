@@ -0,0 +1,120 @@
+"""
+Fails when an endpoint runs more SQL statements than its @query_budget.
+
+Seeds a throwaway SQLite database with `--users` users owning `--links`
+links each (some expired, all clicked), then calls every GET route that
+declares a budget as a superuser, with SQL_QUERY_BUDGET_ENFORCE on and the
+user cache off, so each call pays for its own authentication too. Budgets
+are per request, so a route that only fits them with a handful of rows
+but not with many has an N+1. Exits with status 1 if any route went over.
+
+    cd apps/api
+    python -m bench.check_query_budgets --users 20 --links 25
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--links", type=int, default=25, help="links per user")
+    return parser.parse_args()
+
+
+def seed(n_users: int, n_links: int) -> tuple[str, int]:
+    from app.core.security import create_access_token
+    from app.db import database, migrate, models
+    from app.jobs.backfill_rollups import backfill
+
+    migrate.upgrade(database.engine)
+    now = datetime.utcnow()
+    with database.SessionLocal() as db:
+        users = [
+            models.User(email=f"user{i}@example.com", hashed_password="x", is_active=True, is_superuser=i == 0)
+            for i in range(n_users)
+        ]
+        db.add_all(users)
+        db.flush()
+        links = [
+            models.Link(original_url=f"https://example.com/{user.id}/{i}", short_code=f"q{user.id:03d}{i:04d}",
+                        owner_id=user.id, tag=f"tag{i % 3}",
+                        expires_at=now - timedelta(days=1) if i % 4 == 0 else now + timedelta(days=30))
+            for user in users
+            for i in range(n_links)
+        ]
+        db.add_all(links)
+        db.flush()
+        db.add_all([
+            models.Click(link_id=link.id, created_at=now - timedelta(hours=i), country="US", browser="Chrome",
+                         device_type="desktop")
+            for link in links
+            for i in range(3)
+        ])
+        link_id = links[1].id
+        token = create_access_token({"sub": users[0].email, "ver": users[0].token_version})
+        db.commit()
+    backfill(chunk_size=1000)
+    return token, link_id
+
+
+async def check(app, token: str, link_id: int) -> list[str]:
+    import httpx
+    from app.core.sql_profiler import QueryBudgetExceeded
+
+    failures = []
+    routes = [
+        route for route in app.routes
+        if "GET" in getattr(route, "methods", ()) and hasattr(getattr(route, "endpoint", None), "__query_budget__")
+    ]
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=True)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://check", headers=headers) as client:
+            for route in sorted(routes, key=lambda route: route.path):
+                path = route.path.replace("{link_id}", str(link_id))
+                budget = route.endpoint.__query_budget__
+                try:
+                    response = await client.get(path)
+                except QueryBudgetExceeded as e:
+                    failures.append(str(e))
+                    print(f"FAIL {path:40} {e}")
+                    continue
+                queries = response.headers.get("x-db-query-count")
+                status = "ok  " if response.status_code == 200 else f"{response.status_code} "
+                print(f"{status} {path:40} {queries}/{budget} queries")
+                if response.status_code != 200:
+                    failures.append(f"{path} returned {response.status_code}")
+    return failures
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ["SHORT_CODE_FILTER_ENABLED"] = "false"
+    os.environ["SQL_PROFILING_ENABLED"] = "true"
+    os.environ["SQL_QUERY_BUDGET_ENFORCE"] = "true"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    token, link_id = seed(args.users, args.links)
+    from app.core.cache import user_cache
+    from app.main import app
+
+    async def miss(key):
+        return None
+    user_cache.get = miss  # Every request authenticates against the database
+
+    failures = asyncio.run(check(app, token, link_id))
+    if failures:
+        print(f"{len(failures)} route(s) over budget or failing")
+        sys.exit(1)
+    print("All routes within their query budgets")
+
+
+if __name__ == "__main__":
+    main()
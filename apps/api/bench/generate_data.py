@@ -0,0 +1,450 @@
+"""
+Synthetic users, links and clicks for scale testing.
+
+    cd apps/api
+    python -m bench.generate_data --users 100000 --links 2000000 --clicks 100000000 --workers 8
+    python -m bench.generate_data --users 100000 --links 2000000 --clicks 100000000 --csv /tmp/linkdata
+
+Writes to DATABASE_URL (creating the tables if needed), after any rows
+already there, or with --csv to users.csv, links.csv and clicks.csv plus the
+LOAD DATA statements that import them into an empty MySQL database.
+
+The data is shaped like a public shortener's:
+  - a few owners have most of the links, and link popularity follows a Zipf
+    distribution (--zipf), so a handful of links get most of the clicks;
+  - sign-ups grow over the --days window, links are created after their
+    owner signed up, and a link's clicks bunch up soon after it was created;
+  - browser and device come from running bench/ua_corpus.py's weighted
+    User-Agent mix through the app's own parser, next to weighted referrer
+    and country mixes (some unknown).
+
+The same --seed, counts, --until and --chunk-size give the same rows: every chunk
+is drawn from its own RNG, seeded from --seed and the chunk's number, so
+the number of --workers doesn't change the output. The first user
+generated is a superuser; every user's password is --password.
+
+Rows go in as one executemany per chunk on the raw driver (pymysql turns
+that into multi-row INSERTs), in its own transaction. The API keeps
+click_rollups, links.click_count and stat_counters up to date on every
+write; afterwards the backfill/reconcile jobs rebuild them from the new
+rows (--skip-derived to leave that for later; with --csv, run them after
+the import). SQLite takes one writer at a time, so --workers only speeds
+up MySQL and CSV output. The fastest way to 100M clicks is --csv with a
+worker per core, then LOAD DATA.
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from multiprocessing import Pool
+from typing import Optional
+
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+CLICK_COLUMNS = ("link_id", "created_at", "ip_address", "country", "referrer", "browser", "device_type")
+USER_COLUMNS = ("id", "email", "hashed_password", "created_at", "is_active", "is_superuser", "token_version")
+LINK_COLUMNS = ("id", "original_url", "short_code", "created_at", "owner_id", "tag", "expires_at", "click_count")
+
+# (value, weight); None is an unknown referrer/country
+REFERRERS = [
+    (None, 40), ("https://www.google.com/", 15), ("https://t.co/", 8), ("https://www.facebook.com/", 8),
+    ("https://l.instagram.com/", 6), ("https://www.linkedin.com/", 5), ("https://www.reddit.com/", 4),
+    ("android-app://com.slack/", 2), ("https://news.ycombinator.com/", 2), ("https://duckduckgo.com/", 2),
+    ("https://www.bing.com/", 2),
+] + [(f"https://blog{i}.example.net/posts/{i * 7}", 0.06) for i in range(100)]
+COUNTRIES = [
+    ("US", 28), ("IN", 9), ("GB", 6), ("DE", 5), ("BR", 5), ("CA", 4), ("FR", 4), ("ID", 3), ("JP", 3),
+    ("MX", 3), ("NG", 2), ("PH", 2), ("ES", 2), ("IT", 2), ("AU", 2), ("NL", 2), ("TR", 2), ("PL", 1),
+    ("KR", 1), ("VN", 1), ("SE", 1), ("AR", 1), ("ZA", 1), ("EG", 1), ("PK", 1), (None, 5),
+]
+TAGS = [(None, 50), ("marketing", 15), ("social", 12), ("newsletter", 8), ("docs", 6), ("events", 5), ("ads", 4)]
+# Owners' share of the links; links' share of the clicks is --zipf
+OWNER_ZIPF = 1.0
+# Exponent of the decay of a link's clicks after creation, bigger bunches them up more
+CLICK_DECAY = 3.0
+IP_POOL_SIZE = 4096
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--links", type=int, default=200_000)
+    parser.add_argument("--clicks", type=int, default=5_000_000)
+    parser.add_argument("--days", type=int, default=365, help="how far back the data goes")
+    parser.add_argument("--until", type=datetime.fromisoformat,
+                        help="UTC date the data ends at (default: today's midnight), fix it to reproduce a run")
+    parser.add_argument("--zipf", type=float, default=1.0, help="exponent of the link popularity distribution")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows per INSERT batch / RNG stream")
+    parser.add_argument("--workers", type=int, default=1, help="processes generating (and inserting) clicks")
+    parser.add_argument("--csv", metavar="DIR", help="write CSV files for LOAD DATA instead of inserting")
+    parser.add_argument("--password", default="password", help="password of every generated user")
+    parser.add_argument("--skip-derived", action="store_true", help="don't rebuild rollups and counters")
+    return parser.parse_args()
+
+
+def zipf_cum_weights(n: int, exponent: float) -> array:
+    """Cumulative weights of ranks 1..n, for random.choices."""
+    return array("d", accumulate(1.0 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def base62(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 62)
+        chars.append(BASE62[digit])
+    return "".join(reversed(chars))
+
+
+def weighted(pairs) -> tuple[list, list]:
+    values = [value for value, _ in pairs]
+    return values, list(accumulate(weight for _, weight in pairs))
+
+
+def browser_mix() -> tuple[list, list]:
+    """(browser, device_type) pairs weighted by the User-Agent corpus, as the redirect would record them."""
+    from app.core.user_agent import classify_user_agent
+    from bench.ua_corpus import USER_AGENTS
+
+    weights: dict[tuple[str, str], float] = {}
+    for user_agent, weight in USER_AGENTS:
+        info = classify_user_agent(user_agent)
+        key = (info.browser, info.device_type)
+        weights[key] = weights.get(key, 0) + weight
+    return weighted(sorted(weights.items()))
+
+
+class TimestampFormatter:
+    """
+    Epoch seconds to DATETIME literals from a table of dates and one of the
+    86400 times of day, without building a datetime per row.
+    """
+
+    def __init__(self, since: int, until: int, fraction: str = ""):
+        self.day0 = since - since % 86400
+        days = (until - self.day0) // 86400 + 1
+        self.dates = [
+            (datetime(1970, 1, 1) + timedelta(seconds=self.day0 + day * 86400)).strftime("%Y-%m-%d ")
+            for day in range(days)
+        ]
+        # SQLite compares DATETIMEs as text, in SQLAlchemy's format with microseconds
+        self.times = [
+            f"{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}{fraction}" for second in range(86400)
+        ]
+
+    def __call__(self, epoch: int) -> str:
+        day, second = divmod(epoch - self.day0, 86400)
+        return self.dates[day] + self.times[second]
+
+
+# --- Generation ---
+
+class Plan:
+    """Everything a worker needs to draw any chunk of clicks; sent to each worker once."""
+
+    def __init__(self, users: int, links: int, clicks: int, days: int, until: datetime, zipf: float, seed: int,
+                 chunk_size: int, first_user_id: int, first_link_id: int, fraction: str, null: Optional[str]):
+        self.seed = seed
+        self.zipf = zipf
+        self.chunk_size = chunk_size
+        self.n_users = users
+        self.n_links = links
+        self.n_clicks = clicks
+        self.first_user_id = first_user_id
+        self.first_link_id = first_link_id
+        self.until = int((until - datetime(1970, 1, 1)).total_seconds())
+        self.since = self.until - days * 86400
+        self.fraction = fraction
+        # "\\N" in CSV files, which LOAD DATA reads as NULL
+        self.null = null
+        # Filled in by the link pass: when each link was created, and link
+        # indexes in popularity order (a shuffle, so ids don't predict rank)
+        self.link_created = array("q")
+        self.links_by_rank = array("q")
+        self._formatter: Optional[TimestampFormatter] = None
+        self._visitors: Optional[tuple[list, list]] = None
+        self._link_cum: Optional[array] = None
+
+    def formatter(self) -> TimestampFormatter:
+        if self._formatter is None:
+            # Up to the latest expiry handed out, 30 days after `until`
+            self._formatter = TimestampFormatter(self.since, self.until + 30 * 86400, self.fraction)
+        return self._formatter
+
+    def rng(self, table: str, chunk: int) -> random.Random:
+        return random.Random(f"{self.seed}:{table}:{chunk}")
+
+    def chunks(self, total: int) -> range:
+        return range(math.ceil(total / self.chunk_size))
+
+    def users(self, chunk: int, password_hash: str, user_created: array) -> list[tuple]:
+        rng = self.rng("users", chunk)
+        fmt = self.formatter()
+        start = chunk * self.chunk_size
+        rows = []
+        for i in range(start, min(start + self.chunk_size, self.n_users)):
+            # Sign-ups grow over the window: density rises linearly towards now
+            created = self.since + int((self.until - self.since) * math.sqrt(rng.random()))
+            user_created.append(created)
+            user_id = self.first_user_id + i
+            rows.append((user_id, f"user{user_id}@example.com", password_hash, fmt(created),
+                         int(rng.random() < 0.95), int(i == 0), 0))
+        return rows
+
+    def links(self, chunk: int, user_created: array, owners_by_rank: array, owner_cum: array) -> list[tuple]:
+        rng = self.rng("links", chunk)
+        fmt = self.formatter()
+        tags, tag_cum = weighted(TAGS)
+        start = chunk * self.chunk_size
+        count = min(start + self.chunk_size, self.n_links) - start
+        owners = rng.choices(owners_by_rank, cum_weights=owner_cum, k=count)
+        link_tags = rng.choices(tags, cum_weights=tag_cum, k=count)
+        rows = []
+        for i, owner, tag in zip(range(start, start + count), owners, link_tags):
+            owner_created = user_created[owner]
+            created = owner_created + int((self.until - owner_created) * rng.random())
+            self.link_created.append(created)
+            expiry = rng.random()
+            if expiry < 0.05:
+                expires_at = fmt(created + int((self.until - created) * rng.random()))  # Already expired
+            elif expiry < 0.10:
+                expires_at = fmt(self.until + rng.randrange(1, 30 * 86400))
+            else:
+                expires_at = self.null
+            link_id = self.first_link_id + i
+            # 8 characters: never one the allocator hands out (7), and unique by id
+            rows.append((link_id, f"https://example.com/{base62(link_id * 7919, 6)}/{i}", base62(link_id, 8),
+                         fmt(created), self.first_user_id + owner, tag if tag is not None else self.null,
+                         expires_at, 0))
+        return rows
+
+    def clicks(self, chunk: int) -> list[tuple]:
+        rng = self.rng("clicks", chunk)
+        if self._visitors is None:
+            # Built once per process, for the worker's first chunk
+            self._link_cum = zipf_cum_weights(self.n_links, self.zipf)
+            self._visitors = self.visitor_mix()
+        fmt = self.formatter()
+        dates, times, day0 = fmt.dates, fmt.times, fmt.day0
+        visitors, visitor_cum = self._visitors
+        start = chunk * self.chunk_size
+        count = min(start + self.chunk_size, self.n_clicks) - start
+        ips = [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+               for _ in range(IP_POOL_SIZE)]
+        link_created = self.link_created
+        first_link_id = self.first_link_id
+        until = self.until
+        random_ = rng.random
+        rows = []
+        for link, (country, referrer, browser, device), ip in zip(
+            rng.choices(self.links_by_rank, cum_weights=self._link_cum, k=count),
+            rng.choices(visitors, cum_weights=visitor_cum, k=count),
+            rng.choices(ips, k=count),
+        ):
+            created = link_created[link]
+            day, second = divmod(created + int((until - created) * random_() ** CLICK_DECAY) - day0, 86400)
+            rows.append((first_link_id + link, dates[day] + times[second], ip, country, referrer, browser, device))
+        return rows
+
+    def visitor_mix(self) -> tuple[list, list]:
+        """
+        Every (country, referrer, browser, device_type) with the product of
+        their weights, so a click takes one weighted draw instead of three.
+        """
+        null = self.null
+        (agents, agent_cum), referrers, countries = browser_mix(), REFERRERS, COUNTRIES
+        agent_weights = [cum - previous for cum, previous in zip(agent_cum, [0] + agent_cum)]
+        combined = [
+            ((country if country is not None else null, referrer if referrer is not None else null) + agent,
+             country_weight * referrer_weight * agent_weight)
+            for country, country_weight in countries
+            for referrer, referrer_weight in referrers
+            for agent, agent_weight in zip(agents, agent_weights)
+        ]
+        return weighted(combined)
+
+
+def password_hash_for(password: str, seed: int) -> str:
+    """A bcrypt hash of `password` salted from `seed`, so the users table comes out the same every run."""
+    import bcrypt
+
+    rng = random.Random(f"{seed}:password")
+    alphabet = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    # The 22nd character only carries 2 bits of the 128-bit salt
+    salt = "".join(rng.choice(alphabet) for _ in range(21)) + rng.choice(".Oeu")
+    return bcrypt.hashpw(password.encode(), f"$2b$12${salt}".encode()).decode()
+
+
+def insert_statement(table: str, columns: tuple[str, ...], paramstyle: str) -> str:
+    placeholder = "?" if paramstyle == "qmark" else "%s"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})"
+
+
+def to_csv(rows: list[tuple]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+# --- Workers (one Plan per process) ---
+
+_plan: Optional[Plan] = None
+
+
+def _init_worker(plan: Plan, to_database: bool) -> None:
+    global _plan
+    _plan = plan
+    if to_database:
+        from app.db import database
+        # Connections don't survive fork(); each worker opens its own
+        database.engine.dispose(close=False)
+
+
+def _insert_clicks(chunk: int) -> int:
+    from app.db import database
+
+    rows = _plan.clicks(chunk)
+    with database.engine.begin() as conn:
+        conn.exec_driver_sql(insert_statement("clicks", CLICK_COLUMNS, database.engine.dialect.paramstyle), rows)
+    return len(rows)
+
+
+def _clicks_csv(chunk: int) -> str:
+    return to_csv(_plan.clicks(chunk))
+
+
+def map_chunks(plan: Plan, function, chunks: range, workers: int, to_database: bool):
+    """`function` over `chunks` in order, in `workers` processes."""
+    if workers <= 1:
+        _init_worker(plan, to_database=False)
+        yield from map(function, chunks)
+        return
+    with Pool(workers, initializer=_init_worker, initargs=(plan, to_database)) as pool:
+        yield from pool.imap(function, chunks)
+
+
+# --- Entry points ---
+
+def generate(users: int, links: int, clicks: int, days: int = 365, until: Optional[datetime] = None,
+             zipf: float = 1.0, seed: int = 42, chunk_size: int = 50_000, workers: int = 1, csv_dir: Optional[str] = None,
+             password: str = "password", skip_derived: bool = False) -> None:
+    """Fills DATABASE_URL, or writes CSV files to `csv_dir`; see the module docstring."""
+    from app.db import database
+
+    to_database = not csv_dir
+    if to_database:
+        from sqlalchemy import text
+
+        database.Base.metadata.create_all(bind=database.engine)
+        with database.engine.connect() as conn:
+            first_user_id = (conn.execute(text("SELECT MAX(id) FROM users")).scalar() or 0) + 1
+            first_link_id = (conn.execute(text("SELECT MAX(id) FROM links")).scalar() or 0) + 1
+        paramstyle = database.engine.dialect.paramstyle
+        fraction = ".000000" if database.engine.dialect.name == "sqlite" else ""
+        if database.engine.dialect.name == "sqlite":
+            workers = 1
+    else:
+        os.makedirs(csv_dir, exist_ok=True)
+        first_user_id = first_link_id = 1
+        fraction = ""
+
+    if until is None:
+        until = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    plan = Plan(users, links, clicks, days, until, zipf, seed, chunk_size, first_user_id, first_link_id,
+                fraction, null=None if to_database else "\\N")
+    password_hash = password_hash_for(password, seed)
+
+    def write(table: str, columns: tuple[str, ...], rows: list[tuple], out) -> None:
+        if to_database:
+            with database.engine.begin() as conn:
+                conn.exec_driver_sql(insert_statement(table, columns, paramstyle), rows)
+        else:
+            out.write(to_csv(rows))
+
+    def open_csv(table: str):
+        return open(os.path.join(csv_dir, f"{table}.csv"), "w", newline="") if csv_dir else None
+
+    started = time.perf_counter()
+    user_created = array("q")
+    out = open_csv("users")
+    for chunk in plan.chunks(users):
+        write("users", USER_COLUMNS, plan.users(chunk, password_hash, user_created), out)
+    if out:
+        out.close()
+
+    owners_by_rank = array("q", range(users))
+    random.Random(f"{seed}:owners").shuffle(owners_by_rank)
+    owner_cum = zipf_cum_weights(users, OWNER_ZIPF)
+    out = open_csv("links")
+    for chunk in plan.chunks(links):
+        write("links", LINK_COLUMNS, plan.links(chunk, user_created, owners_by_rank, owner_cum), out)
+    if out:
+        out.close()
+    plan.links_by_rank = array("q", range(links))
+    random.Random(f"{seed}:popularity").shuffle(plan.links_by_rank)
+    print(f"{users:,} users and {links:,} links in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    written = 0
+    out = open_csv("clicks")
+    function = _insert_clicks if to_database else _clicks_csv
+    for result in map_chunks(plan, function, plan.chunks(clicks), workers, to_database):
+        if to_database:
+            written += result
+        else:
+            out.write(result)
+            written = min(written + chunk_size, clicks)
+        if written % 1_000_000 < chunk_size or written == clicks:
+            elapsed = time.perf_counter() - started
+            print(f"{written:,} clicks in {elapsed:.1f}s ({written / elapsed:,.0f}/s)")
+    if out:
+        out.close()
+
+    if csv_dir:
+        print_load_data(csv_dir)
+    elif not skip_derived:
+        rebuild_derived(days)
+
+
+def rebuild_derived(days: int) -> None:
+    """What the API would have maintained while the rows came in."""
+    from app.jobs import backfill_rollups, reconcile_click_counts, reconcile_counters
+
+    started = time.perf_counter()
+    backfill_rollups.backfill(chunk_size=5000)
+    reconcile_click_counts.reconcile()
+    reconcile_counters.reconcile(days=min(days, 7))
+    print(f"Rebuilt rollups and counters in {time.perf_counter() - started:.1f}s")
+
+
+def print_load_data(directory: str) -> None:
+    print("\nImport into an empty database (mysql --local-infile=1), in this order:")
+    for table, columns in (("users", USER_COLUMNS), ("links", LINK_COLUMNS), ("clicks", CLICK_COLUMNS)):
+        path = os.path.abspath(os.path.join(directory, f"{table}.csv"))
+        print(f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} FIELDS TERMINATED BY ',' "
+              f"OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' ({', '.join(columns)});")
+    print("\nThen rebuild what the API maintains on writes:")
+    print("python -m app.jobs.backfill_rollups && python -m app.jobs.reconcile_click_counts "
+          "&& python -m app.jobs.reconcile_counters")
+
+
+def main():
+    args = parse_args()
+    if args.csv:
+        # Nothing is written to the database, but the app modules still want a URL
+        os.environ.setdefault("DATABASE_URL", "sqlite://")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    generate(args.users, args.links, args.clicks, days=args.days, until=args.until, zipf=args.zipf, seed=args.seed,
+             chunk_size=args.chunk_size, workers=args.workers, csv_dir=args.csv, password=args.password,
+             skip_derived=args.skip_derived)
+
+
+if __name__ == "__main__":
+    main()
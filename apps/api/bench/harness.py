@@ -0,0 +1,156 @@
+"""
+What the benchmarks share: a throwaway database, seed data, the app behind
+httpx's ASGI transport, and a driver that keeps requests in flight for a
+fixed time.
+
+Call `setup()` before importing anything from app: the settings are read
+on first import, so that's when DATABASE_URL and the other environment
+overrides have to be in place.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+# Documentation range, so the click writer stores a plausible address
+CLIENT = ("203.0.113.7", 1234)
+
+BENCH_EMAIL = "bench@example.com"
+
+
+def setup(database_url: Optional[str] = None, **environ: str) -> str:
+    """
+    Points the app at `database_url`, or at a new SQLite file, and sets
+    `environ` on top. The redirect filter's background build is off unless
+    overridden, since it would compete with the first requests for the
+    database. Returns the database URL.
+    """
+    database_url = database_url or f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SHORT_CODE_FILTER_ENABLED"] = "false"
+    os.environ.update(environ)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return database_url
+
+
+# --- Data ---
+
+def create_schema() -> None:
+    """Migrates the database to head, as a deploy would."""
+    from app.db import database, migrate
+
+    migrate.upgrade(database.engine)
+
+
+def seed_user(email: str = BENCH_EMAIL, hashed_password: str = "x"):
+    """Adds an active user and returns it, with the schema created first."""
+    from app.db import database, models
+
+    create_schema()
+    with database.SessionLocal() as db:
+        user = models.User(email=email, hashed_password=hashed_password, is_active=True)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+    return user
+
+
+def seed_links(owner_id: int, short_codes: list[str], chunk_size: int = 10_000) -> None:
+    """Adds a link per short code, in multi-row INSERTs."""
+    from app.db import database, models
+
+    with database.engine.begin() as connection:
+        for offset in range(0, len(short_codes), chunk_size):
+            connection.execute(models.Link.__table__.insert(), [
+                {"original_url": f"https://example.com/{code}", "short_code": code, "owner_id": owner_id,
+                 "click_count": 0}
+                for code in short_codes[offset:offset + chunk_size]
+            ])
+
+
+def token_for(user) -> str:
+    from app.core.security import create_access_token
+
+    return create_access_token({"sub": user.email, "ver": user.token_version or 0})
+
+
+class StatementCounter:
+    """Counts the SQL statements run on an engine (a sync one, or async_engine.sync_engine)."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *_):
+        self.count += 1
+
+
+# --- Driving the app ---
+
+@asynccontextmanager
+async def client(app, **options):
+    """An httpx client on `app`, in process, with the app's lifespan running."""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app, client=CLIENT)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", **options) as http:
+            yield http
+
+
+async def drive(send: Callable[[int], Awaitable[bool]], concurrency: int, seconds: float) -> tuple[list[float], int]:
+    """
+    Keeps `concurrency` calls of `send(n)` in flight for `seconds`, n
+    counting up across them; `send` returns whether the request got the
+    expected answer. Returns the latencies and the number of failures of
+    the calls that finished in time.
+    """
+    latencies = []
+    failures = 0
+    counter = iter(range(sys.maxsize))
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal failures
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            ok = await send(next(counter))
+            finished = time.perf_counter()
+            # Requests still in flight at the deadline don't count towards the run
+            if finished > deadline:
+                return
+            latencies.append(finished - started)
+            if not ok:
+                failures += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures
+
+
+def summarize(latencies: list[float], errors: int, seconds: float) -> dict:
+    """Request count, errors, throughput and p50/p95/p99 in milliseconds."""
+    latencies = sorted(latencies)
+    result = {"requests": len(latencies), "errors": errors, "throughput_rps": round(len(latencies) / seconds, 1)}
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100)
+        result.update({f"p{p}_ms": round(quantiles[p - 1] * 1000, 2) for p in (50, 95, 99)})
+    else:
+        result.update({f"p{p}_ms": None for p in (50, 95, 99)})
+    return result
+
+
+def format_ms(value) -> str:
+    return f"{value:8.2f}" if value is not None else "       -"
+
+
+def format_row(name: str, result: dict) -> str:
+    return (f"{name:20} {result['throughput_rps']:9,.1f} req/s  p50 {format_ms(result['p50_ms'])} ms  "
+            f"p95 {format_ms(result['p95_ms'])} ms  p99 {format_ms(result['p99_ms'])} ms"
+            + (f"  ({result['errors']} errors)" if result["errors"] else ""))
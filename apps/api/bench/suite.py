@@ -0,0 +1,270 @@
+"""
+Benchmark suite for the API hot paths, with a JSON baseline to compare against.
+
+Seeds a database with synthetic users, links and clicks at the requested
+scale (see bench/generate_data.py), then drives each scenario below for `--duration` seconds at a fixed
+`--concurrency`, in process through httpx's ASGI transport, and reports
+throughput and p50/p95/p99 latency per scenario.
+
+    cd apps/api
+    python -m bench.suite --users 200 --links 20000 --clicks 500000 --save bench/baseline.json
+    python -m bench.suite --users 200 --links 20000 --clicks 500000 --compare bench/baseline.json
+
+--compare exits with status 1 when a scenario's throughput dropped, or its
+p95 rose, by more than `--tolerance`. Only compare runs made at the same
+scale, concurrency and database on the same machine; the meta block of the
+baseline records them and a mismatch is reported.
+
+The database is a throwaway SQLite file unless `--database-url` points at a
+MySQL stand-in (an empty database you can afford to fill, e.g. the
+docker-compose `db` service). `--no-seed` runs against the data already
+there instead, which needs at least one superuser for the admin scenarios.
+
+Scenarios run one after another against the same data, read-only ones
+first; redirects enqueue clicks and link_create adds links, so later runs
+see a slightly bigger database than earlier ones.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from bench import harness
+
+# Run order; see each scenario's request() for what it sends
+SCENARIOS = (
+    "redirect",
+    "link_list",
+    "link_stats",
+    "analysis_dashboard",
+    "admin_stats",
+    "admin_links",
+    "link_create",
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--links", type=int, default=20_000, help="links in total, spread over the users")
+    parser.add_argument("--clicks", type=int, default=200_000, help="clicks in total, over the last --days days")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight per scenario")
+    parser.add_argument("--duration", type=float, default=5.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset to run")
+    parser.add_argument("--database-url", help="run against this database instead of a throwaway SQLite file")
+    parser.add_argument("--no-seed", action="store_true", help="use the data already in --database-url")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="relative change in throughput or p95 that counts as a regression")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    if args.no_seed and not args.database_url:
+        parser.error("--no-seed needs --database-url")
+    return args
+
+
+# --- Data ---
+
+def seed(n_users: int, n_links: int, n_clicks: int, days: int, seed: int) -> None:
+    from app.db import database, models
+    from bench import generate_data
+
+    harness.create_schema()
+    with database.SessionLocal() as db:
+        if db.query(models.User.id).first() is not None:
+            raise SystemExit("The database already has users; pass --no-seed to benchmark the data in it")
+    generate_data.generate(n_users, n_links, n_clicks, days=days, seed=seed)
+
+
+@dataclass
+class Dataset:
+    """What the scenarios pick their requests from, read back from the database."""
+    short_codes: list[str]
+    # (user id, bearer token, ids of some of the user's links)
+    users: list[tuple[int, str, list[int]]]
+    superuser_token: Optional[str]
+
+
+def load_dataset(sample: int = 5000) -> Dataset:
+    from sqlalchemy import func, or_
+
+    from app.core.security import create_access_token
+    from app.db import database, models
+
+    with database.SessionLocal() as db:
+        # Every nth link rather than ORDER BY RAND(), so reruns pick the same ones on any database
+        step = max(1, (db.query(func.max(models.Link.id)).scalar() or 0) // sample)
+        short_codes = [
+            code for code, in db.query(models.Link.short_code)
+            .filter(models.Link.id % step == 0)
+            # Expired links answer 410 and would count as errors
+            .filter(or_(models.Link.expires_at.is_(None), models.Link.expires_at > datetime.utcnow()))
+            .limit(sample)
+        ]
+        owners = db.query(models.User).filter(models.User.links.any()).order_by(models.User.id).limit(100).all()
+        users = []
+        for user in owners:
+            link_ids = [id for id, in db.query(models.Link.id).filter(models.Link.owner_id == user.id).limit(50)]
+            token = create_access_token({"sub": user.email, "ver": user.token_version})
+            users.append((user.id, token, link_ids))
+        superuser = db.query(models.User).filter(models.User.is_superuser.is_(True)).first()
+        superuser_token = (
+            create_access_token({"sub": superuser.email, "ver": superuser.token_version}) if superuser else None
+        )
+    if not short_codes or not users:
+        raise SystemExit("The database has no links to benchmark")
+    return Dataset(short_codes, users, superuser_token)
+
+
+# --- Scenarios ---
+
+def request(scenario: str, data: Dataset, rng: random.Random, n: int) -> tuple[str, str, dict, Optional[dict], int]:
+    """(method, path, headers, JSON body, expected status) of the `n`th request of `scenario`."""
+    _, token, link_ids = rng.choice(data.users)
+    auth = {"Authorization": f"Bearer {token}"}
+    admin = {"Authorization": f"Bearer {data.superuser_token}"}
+    if scenario == "redirect":
+        return "GET", "/" + rng.choice(data.short_codes), {}, None, 307
+    if scenario == "link_list":
+        return "GET", "/links/", auth, None, 200
+    if scenario == "link_stats":
+        return "GET", f"/links/{rng.choice(link_ids)}/stats", auth, None, 200
+    if scenario == "analysis_dashboard":
+        return "GET", "/analysis/dashboard?interval=day", auth, None, 200
+    if scenario == "admin_stats":
+        return "GET", "/admin/stats", admin, None, 200
+    if scenario == "admin_links":
+        return "GET", "/admin/links", admin, None, 200
+    if scenario == "link_create":
+        return "POST", "/links/", auth, {"original_url": f"https://example.org/{n}"}, 200
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+async def run(app, scenarios, data, args) -> dict:
+    rng = random.Random(args.seed)
+    results = {}
+    async with harness.client(app) as client:
+        for scenario in scenarios:
+            if scenario.startswith("admin_") and data.superuser_token is None:
+                print(f"{scenario:20} skipped, no superuser in the database")
+                continue
+            reported = False
+
+            async def send(n, scenario=scenario):
+                nonlocal reported
+                method, path, headers, body, expected = request(scenario, data, rng, n)
+                response = await client.request(method, path, headers=headers, json=body)
+                if response.status_code == expected:
+                    return True
+                if not reported:
+                    reported = True
+                    print(f"  {scenario}: {method} {path} returned {response.status_code}: {response.text[:200]}")
+                return False
+
+            await harness.drive(send, args.concurrency, args.warmup)
+            latencies, errors = await harness.drive(send, args.concurrency, args.duration)
+            results[scenario] = harness.summarize(latencies, errors, args.duration)
+            print(harness.format_row(scenario, results[scenario]))
+    return results
+
+
+# --- Reporting ---
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_meta(args, database_url: str) -> dict:
+    from sqlalchemy.engine import make_url
+
+    return {
+        "created": datetime.utcnow().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "database": make_url(database_url).get_backend_name(),
+        "scale": None if args.no_seed else {"users": args.users, "links": args.links, "clicks": args.clicks,
+                                             "days": args.days},
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "python": platform.python_version(),
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPU(s)",
+    }
+
+
+def compare(results: dict, meta: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints the change of every scenario against `baseline`. Returns the regressions."""
+    for key in ("database", "scale", "concurrency", "machine"):
+        if baseline["meta"].get(key) != meta[key]:
+            print(f"Warning: baseline {key} was {baseline['meta'].get(key)}, this run's is {meta[key]}")
+
+    regressions = []
+    print(f"\nAgainst the baseline from {baseline['meta']['created']} ({baseline['meta'].get('revision') or '?'}):")
+    for scenario, result in results.items():
+        before = baseline["scenarios"].get(scenario)
+        if before is None:
+            print(f"{scenario:20} not in the baseline")
+            continue
+        throughput = result["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        line = f"{scenario:20} throughput {throughput:+7.1%}"
+        if result["p95_ms"] is not None and before["p95_ms"]:
+            p95 = result["p95_ms"] / before["p95_ms"] - 1
+            line += f"  p95 {p95:+7.1%}"
+        else:
+            p95 = 0.0
+        if throughput < -tolerance or p95 > tolerance:
+            regressions.append(scenario)
+            line += "  REGRESSION"
+        print(line)
+    return regressions
+
+
+def main():
+    args = parse_args()
+    database_url = harness.setup(args.database_url)
+
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed(args.users, args.links, args.clicks, args.days, args.seed)
+        print(f"Seeded {args.users:,} users, {args.links:,} links and {args.clicks:,} clicks "
+              f"in {time.perf_counter() - started:.1f}s")
+    data = load_dataset()
+    from app.main import app
+
+    scenarios = [scenario for scenario in SCENARIOS if scenario in args.scenarios.split(",")]
+    print(f"{len(scenarios)} scenario(s), {args.concurrency} in flight, {args.duration:g}s each\n")
+    results = asyncio.run(run(app, scenarios, data, args))
+
+    meta = run_meta(args, database_url)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"meta": meta, "scenarios": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved the baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, meta, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} scenario(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
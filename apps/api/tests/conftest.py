@@ -0,0 +1,45 @@
+"""
+Run from apps/api with `python -m pytest` (pip install -r requirements-dev.txt).
+
+The settings are read when app modules are first imported, so the test
+environment is set here, before any test module imports them.
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+_data_dir = tempfile.mkdtemp(prefix="linkshorty-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_data_dir}/test.db")
+# No listener on a fixed port from the test process
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+
+@pytest.fixture(scope="session")
+def migrated():
+    """The app.db.database module, its database migrated to head."""
+    from app.db import database, migrate
+
+    migrate.upgrade(database.engine)
+    return database
+
+
+@pytest.fixture
+def link(migrated):
+    """A link of a new user, deleted after the test with its clicks."""
+    from app import crud
+    from app.db import models
+
+    with migrated.SessionLocal() as db:
+        user = models.User(email=f"{uuid.uuid4().hex}@example.com", hashed_password="x", is_active=True)
+        db.add(user)
+        db.flush()
+        link = models.Link(original_url="https://example.com", short_code=uuid.uuid4().hex[:10], owner_id=user.id)
+        db.add(link)
+        db.commit()
+        db.refresh(link)
+        db.expunge(link)
+    yield link
+    with migrated.SessionLocal() as db:
+        crud.delete_user_by_id(db, link.owner_id)
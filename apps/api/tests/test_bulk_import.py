@@ -0,0 +1,44 @@
+"""Line splitting of streamed bulk uploads."""
+import asyncio
+
+from app.core.bulk_import import MAX_LINE_BYTES, iter_lines
+
+
+def lines(*chunks: bytes) -> list:
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_lines(stream())]
+
+    return asyncio.run(collect())
+
+
+def test_splits_lines_across_chunks():
+    assert lines(b"a,x\r\nb", b",y\n", b"c") == [(1, "a,x"), (2, "b,y"), (3, "c")]
+
+
+def test_decodes_characters_split_across_chunks():
+    encoded = "https://example.com/über\n".encode()
+    middle = encoded.index(b"\xc3") + 1
+    assert lines(encoded[:middle], encoded[middle:]) == [(1, "https://example.com/über")]
+
+
+def test_line_limit_counts_encoded_bytes():
+    # Fits in characters, not in bytes: two per character
+    line = "ü" * (MAX_LINE_BYTES // 2 + 1)
+    assert lines(f"{line}\nok\n".encode()) == [(1, None), (2, "ok")]
+    fits = "ü" * (MAX_LINE_BYTES // 2)
+    assert lines(f"{fits}\n".encode()) == [(1, fits)]
+
+
+def test_every_over_long_line_is_reported():
+    # Each line is complete within its chunk, so none of it is carried over
+    long_line = b"x" * (MAX_LINE_BYTES + 1)
+    assert lines(b"a\n" + long_line + b"\nb\n" + long_line) == [(1, "a"), (2, None), (3, "b"), (4, None)]
+
+
+def test_an_over_long_line_spanning_chunks_is_reported_once():
+    chunk = b"x" * MAX_LINE_BYTES
+    assert lines(b"a\n" + chunk, chunk, chunk + b"\nb") == [(1, "a"), (2, None), (3, "b")]
@@ -0,0 +1,163 @@
+"""The Redis far tier, the two-tier cache and the invalidation bus, on fakeredis."""
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from app.core import cache
+from app.core.cache import CacheBus, CachedLink, RedisBackend, TieredCache
+
+LINK = CachedLink(1, "https://example.com", None)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def clients(server):
+    return (
+        fakeredis.FakeRedis(server=server, decode_responses=True),
+        fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+    )
+
+
+def backend(server, tombstone_ttl=10) -> RedisBackend:
+    client, async_client = clients(server)
+    return RedisBackend(client, async_client, namespace="test:links", ttl=300, tombstone_ttl=tombstone_ttl)
+
+
+def tiered(far=None) -> TieredCache:
+    links = TieredCache("links", maxsize=100, ttl=300, tombstone_ttl=10,
+                        encode=CachedLink.to_json, decode=CachedLink.from_json)
+    links.far = far
+    return links
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+# --- RedisBackend ---
+
+def test_set_only_writes_absent_keys(server):
+    far = backend(server)
+    far.set("abc", [1])
+    far.set("abc", [2])
+    assert far.get("abc") == [1]
+
+
+def test_delete_tombstones_the_key_against_a_stale_refill(server):
+    far = backend(server, tombstone_ttl=7)
+    far.set("abc", [1])
+    far.delete("abc")
+    # Loaded from the database before the delete, set after it
+    far.set("abc", [1])
+    assert far.get("abc") is None
+    raw_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    assert raw_client.get("test:links:abc") == RedisBackend.TOMBSTONE
+    assert 0 < raw_client.ttl("test:links:abc") <= 7
+
+
+def test_async_methods_share_the_tombstones(server):
+    async def scenario():
+        far = backend(server)
+        await far.aset("abc", [1])
+        assert await far.aget("abc") == [1]
+        await far.adelete("abc")
+        await far.aset("abc", [1])
+        return await far.aget("abc")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_counts_hits_and_misses(server):
+    far = backend(server)
+    far.set("abc", [1])
+    far.get("abc")
+    far.get("missing")
+    far.delete("abc")
+    far.get("abc")
+    assert (far.stats()["hits"], far.stats()["misses"]) == (1, 2)
+
+
+# --- TieredCache ---
+
+def test_get_fills_near_from_far(server):
+    async def scenario():
+        writer, reader = tiered(backend(server)), tiered(backend(server))
+        await writer.set("abc", LINK)
+        assert await reader.get("abc") == LINK
+        return reader.near.get("abc")
+
+    assert asyncio.run(scenario()) == LINK
+
+
+def test_invalidate_ignores_a_set_of_a_value_read_before_it(server):
+    async def scenario():
+        links = tiered(backend(server))
+        await links.set("abc", LINK)
+        stale = await links.get("abc")
+        await links.ainvalidate("abc")
+        await links.set("abc", stale)
+        return await links.get("abc"), links.near.get("abc")
+
+    assert asyncio.run(scenario()) == (None, None)
+
+
+# --- CacheBus ---
+
+@pytest.fixture
+def two_workers(server):
+    """
+    This process's link_cache on the shared tier as one worker, and a cache
+    and bus of its own as another, both on the same fake Redis.
+    """
+    cache.connect_shared_cache(*clients(server))
+    other_bus = CacheBus(channel=cache.cache_bus.channel)
+    other = other_bus.register(tiered())
+    other.far = RedisBackend(*clients(server), namespace=cache.link_cache.far.namespace,
+                             ttl=300, tombstone_ttl=10)
+    other_bus.connect(fakeredis.FakeRedis(server=server, decode_responses=True))
+    # Both listeners subscribed before anything is published
+    subscribers = fakeredis.FakeRedis(server=server)
+    wait_for(lambda: subscribers.pubsub_numsub(cache.cache_bus.channel)[0][1] >= 2)
+    yield cache.link_cache, other, other_bus
+    other_bus.close()
+    cache.disconnect_shared_cache()
+    cache.link_cache.near.clear()
+
+
+def test_invalidation_reaches_the_other_workers_near_tier(two_workers):
+    this, other, other_bus = two_workers
+
+    async def fill():
+        await this.set("abc", LINK)
+        return await other.get("abc")
+
+    assert asyncio.run(fill()) == LINK
+    assert other.near.get("abc") == LINK
+
+    this.invalidate("abc")
+    wait_for(lambda: other_bus.received == 1)
+    assert other.near.get("abc") is None
+
+    async def read_later():
+        # Nor can the other worker cache a copy it read before
+        await other.set("abc", LINK)
+        return await other.get("abc")
+
+    assert asyncio.run(read_later()) is None
+
+
+def test_a_worker_ignores_its_own_events(two_workers):
+    this, other, other_bus = two_workers
+    received = cache.cache_bus.received
+    this.invalidate("abc")
+    wait_for(lambda: other_bus.received == 1)
+    time.sleep(0.1)
+    assert cache.cache_bus.received == received
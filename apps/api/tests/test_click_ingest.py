@@ -0,0 +1,89 @@
+"""ClickIngestor writes against the test database."""
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app import crud_async
+from app.core.click_ingest import ClickIngestor
+from app.db import database, models
+
+
+def ingestor(mode: str, **options) -> ClickIngestor:
+    options = {"max_queue": 100, "batch_size": 10, "flush_interval": 60.0, "retry_backoff": 0.0, **options}
+    return ClickIngestor(mode=mode, **options)
+
+
+def run(coroutine):
+    async def run_and_close():
+        try:
+            return await coroutine
+        finally:
+            # Its pooled connections belong to this event loop
+            await database.async_engine.dispose()
+
+    return asyncio.run(run_and_close())
+
+
+def stored_referrers(database, link_id: int) -> list:
+    with database.SessionLocal() as db:
+        return sorted(db.scalars(select(models.Click.referrer).where(models.Click.link_id == link_id)))
+
+
+def test_sync_mode_writes_before_returning(migrated, link):
+    writer = ingestor("sync")
+
+    async def scenario():
+        await writer.start()  # A no-op in sync mode
+        await writer.record(link.id, referrer="a")
+        return stored_referrers(migrated, link.id)
+
+    assert run(scenario()) == ["a"]
+    assert not writer.running
+    assert writer.stats()["flushed"] == 1
+
+
+def test_a_bad_click_is_dropped_and_the_rest_of_its_batch_written(migrated, link):
+    writer = ingestor("buffered")
+
+    async def scenario():
+        await writer.start()
+        for referrer in ("a", "b", {"not": "bindable"}, "c", "d"):
+            await writer.record(link.id, referrer=referrer)
+        await writer.stop()  # One batch of the five
+
+    run(scenario())
+    assert stored_referrers(migrated, link.id) == ["a", "b", "c", "d"]
+    stats = writer.stats()
+    assert (stats["batches"], stats["flushed"], stats["dropped"]) == (1, 4, 1)
+    with migrated.SessionLocal() as db:
+        assert db.get(models.Link, link.id).click_count == 4
+
+
+def test_transient_errors_are_retried(migrated, link, monkeypatch):
+    create_click_logs = crud_async.create_click_logs
+    failures = []
+
+    async def failing_twice(db, clicks):
+        if len(failures) < 2:
+            failures.append(len(clicks))
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return await create_click_logs(db, clicks)
+
+    monkeypatch.setattr(crud_async, "create_click_logs", failing_twice)
+    writer = ingestor("sync")
+    run(writer.record(link.id, referrer="a"))
+    assert failures == [1, 1]
+    assert stored_referrers(migrated, link.id) == ["a"]
+    assert writer.stats()["dropped"] == 0
+
+
+def test_clicks_are_dropped_once_the_retries_run_out(migrated, link, monkeypatch):
+    async def always_failing(db, clicks):
+        raise OperationalError("INSERT", {}, Exception("server has gone away"))
+
+    monkeypatch.setattr(crud_async, "create_click_logs", always_failing)
+    writer = ingestor("sync", retries=2)
+    run(writer.record(link.id, referrer="a"))
+    assert writer.stats()["dropped"] == 1
+    assert stored_referrers(migrated, link.id) == []
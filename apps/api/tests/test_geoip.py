@@ -0,0 +1,122 @@
+"""GeoIPResolver against a small IP2Location country (DB1) BIN written by the tests."""
+import ipaddress
+import struct
+
+import IP2Location
+import pytest
+
+from app.core.geoip import GeoIPResolver
+
+# (first address of the range, country); a range runs up to the next one
+IPV4_RANGES = [("0.0.0.0", "-"), ("8.8.8.0", "US"), ("8.8.9.0", "-"), ("81.2.69.0", "GB"), ("81.2.70.0", "-")]
+IPV6_RANGES = [("::", "-"), ("2001:db8::", "NL"), ("2001:db9::", "-")]
+
+
+def write_country_bin(path, ipv4_ranges, ipv6_ranges) -> None:
+    """
+    An IP2Location DB1 file: a 64-byte header, then the IPv4 rows (address,
+    pointer to the country), the IPv6 rows (16-byte address, pointer) and
+    the country strings. Each table ends with a row for the last address.
+    """
+    header_size = 64
+    ipv4_base = header_size + 1  # 1-based offsets
+    ipv4_size = (len(ipv4_ranges) + 1) * 8
+    ipv6_base = ipv4_base + ipv4_size
+    ipv6_size = (len(ipv6_ranges) + 1) * 20
+    strings_offset = header_size + ipv4_size + ipv6_size
+    strings, pointers = b"", {}
+    for _, country in ipv4_ranges + ipv6_ranges + [(None, "-")]:
+        if country not in pointers:
+            pointers[country] = strings_offset + len(strings)
+            # Short code, then long name
+            strings += bytes([len(country)]) + country.encode() + bytes([len(country)]) + country.encode()
+    header = struct.pack(
+        "<BBBBBIIIIIIBBB",
+        1, 2, 24, 1, 1,  # DB1 with 2 columns, dated 2024-01-01
+        len(ipv4_ranges), ipv4_base, len(ipv6_ranges), ipv6_base,
+        0, 0,  # No index
+        1, 0, 0,
+    )
+    rows = b"".join(struct.pack("<II", int(ipaddress.IPv4Address(ip)), pointers[country])
+                    for ip, country in ipv4_ranges)
+    rows += struct.pack("<II", 2 ** 32 - 1, pointers["-"])
+    for ip, country in ipv6_ranges + [(None, "-")]:
+        number = int(ipaddress.IPv6Address(ip)) if ip else 2 ** 128 - 1
+        rows += number.to_bytes(16, "little") + struct.pack("<I", pointers[country])
+    with open(path, "wb") as f:
+        f.write(header.ljust(header_size, b"\0") + rows + strings)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "countries.bin"
+    write_country_bin(path, IPV4_RANGES, IPV6_RANGES)
+    return str(path)
+
+
+@pytest.fixture
+def resolver(db_path):
+    resolver = GeoIPResolver(db_path, cache_size=100, ipv4_prefix=24, ipv6_prefix=48)
+    yield resolver
+    resolver.close()
+
+
+def test_resolves_countries(resolver):
+    assert resolver.country("8.8.8.8") == "US"
+    assert resolver.country("81.2.69.160") == "GB"
+    assert resolver.country("2001:db8::1") == "NL"
+    assert resolver.country("::ffff:8.8.8.8") == "US"
+
+
+def test_unallocated_and_invalid_addresses_have_no_country(resolver):
+    assert resolver.country("10.0.0.1") is None
+    assert resolver.country("2001:db9::1") is None
+    assert resolver.country("not-an-ip") is None
+    assert resolver.country(None) is None
+
+
+def test_lookups_are_cached_per_ipv4_24(resolver):
+    assert resolver.country("8.8.8.8") == "US"
+    assert resolver.country("8.8.8.200") == "US"
+    assert resolver.country("::ffff:8.8.8.9") == "US"  # IPv4-mapped, same /24
+    assert (resolver.stats()["misses"], resolver.stats()["hits"]) == (1, 2)
+    resolver.country("8.8.9.1")
+    assert resolver.stats()["misses"] == 2
+
+
+def test_lookups_are_cached_per_ipv6_48(resolver):
+    assert resolver.country("2001:db8::1") == "NL"
+    assert resolver.country("2001:db8:0:ffff::1") == "NL"
+    assert (resolver.stats()["misses"], resolver.stats()["hits"]) == (1, 1)
+    resolver.country("2001:db8:1::1")
+    assert resolver.stats()["misses"] == 2
+
+
+def test_resolve_countries_keeps_countries_already_set(resolver):
+    clicks = [{"ip_address": "8.8.8.8"}, {"ip_address": "81.2.69.1", "country": "FR"}, {"ip_address": None}]
+    resolver.resolve_countries(clicks)
+    assert [click["country"] for click in clicks] == ["US", "FR", None]
+
+
+def test_falls_back_to_file_io_when_the_file_cant_be_mapped(db_path, monkeypatch):
+    modes = []
+    open_real = IP2Location.IP2Location
+
+    def open_database(path, mode):
+        modes.append(mode)
+        if mode == "SHARED_MEMORY":
+            raise PermissionError(13, "Permission denied", path)  # What a read-only file gets
+        return open_real(path, mode)
+
+    monkeypatch.setattr(IP2Location, "IP2Location", open_database)
+    resolver = GeoIPResolver(db_path, cache_size=100, ipv4_prefix=24, ipv6_prefix=48)
+    assert resolver.country("8.8.8.8") == "US"
+    assert modes == ["SHARED_MEMORY", "FILE_IO"]
+    resolver.close()
+
+
+def test_a_missing_file_disables_lookups(tmp_path):
+    resolver = GeoIPResolver(str(tmp_path / "missing.bin"), cache_size=100, ipv4_prefix=24, ipv6_prefix=48)
+    assert resolver.country("8.8.8.8") is None
+    assert resolver.country("8.8.9.8") is None
+    assert resolver.stats()["loaded"] is False
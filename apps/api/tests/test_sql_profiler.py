@@ -0,0 +1,83 @@
+"""Per-request SQL profiling and @query_budget, on an app of its own."""
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core import sql_profiler
+from app.core.config import settings
+from app.core.sql_profiler import QueryBudgetExceeded, SQLProfilerMiddleware, query_budget
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    sql_profiler.install(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def app(engine):
+    app = FastAPI()
+    app.add_middleware(SQLProfilerMiddleware)
+
+    def run_queries(count: int) -> dict:
+        with engine.connect() as connection:
+            for _ in range(count):
+                connection.execute(text("SELECT 1"))
+        return {"queries": count}
+
+    @app.get("/within")
+    @query_budget(2)
+    def within():
+        return run_queries(2)
+
+    @app.get("/over")
+    @query_budget(2)
+    def over():
+        return run_queries(3)
+
+    @app.get("/repeated")
+    def repeated():
+        return run_queries(settings.SQL_PROFILE_REPEAT_THRESHOLD)
+
+    return app
+
+
+@pytest.fixture
+def enforce(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_QUERY_BUDGET_ENFORCE", True)
+
+
+def test_reports_the_queries_in_headers(app):
+    response = TestClient(app).get("/within")
+    assert response.status_code == 200
+    assert response.headers["x-db-query-count"] == "2"
+    assert "x-db-n-plus-one" not in response.headers
+
+
+def test_flags_repeated_statements(app):
+    response = TestClient(app).get("/repeated")
+    assert response.headers["x-db-n-plus-one"] == f"{settings.SQL_PROFILE_REPEAT_THRESHOLD}x"
+
+
+def test_strict_mode_fails_a_handler_over_its_budget(app, enforce):
+    with pytest.raises(QueryBudgetExceeded, match=r"GET /over exceeded its budget of 2 queries"):
+        TestClient(app).get("/over")
+    response = TestClient(app, raise_server_exceptions=False).get("/over")
+    assert response.status_code == 500
+
+
+def test_strict_mode_lets_a_handler_within_its_budget_run(app, enforce):
+    assert TestClient(app).get("/within").status_code == 200
+
+
+def test_without_strict_mode_going_over_budget_is_logged(app, caplog):
+    with caplog.at_level(logging.WARNING, logger="app.core.sql_profiler"):
+        response = TestClient(app).get("/over")
+    assert response.status_code == 200
+    assert response.headers["x-db-query-count"] == "3"
+    assert "3 queries" in caplog.text and "(budget 2)" in caplog.text
@@ -86,6 +86,29 @@ export const apiFetch = async (
   }
 };
 
+// List endpoints return one page at a time, with the cursor of the next
+// page in the X-Next-Cursor header; follows it to the last page
+const apiFetchAllPages = async <T>(endpoint: string, token: string): Promise<T[]> => {
+  const items: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: "1000" });
+    if (cursor) params.set("cursor", cursor);
+    const response = await fetch(`${API_URL}${endpoint}?${params}`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+
+    if (!response.ok) {
+      const text = await response.text();
+      throw new Error(`API call failed: ${response.statusText} - ${text}`);
+    }
+
+    items.push(...((await response.json()) as T[]));
+    cursor = response.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return items;
+};
+
 // ---- Auth ---
 export const login = async (email: string, password: string) => {
   const formData = new URLSearchParams();
@@ -138,9 +161,8 @@ export const register = async (email: string, password: string) => {
 // ---- Links API functions
 
 // ---- Get all links for the user ----
-export const getMyLinks = async (token: string): Promise<Link[]> => {
-  const data = await apiFetch("/links/", {}, token);
-  return data || []; 
+export const getMyLinks = (token: string): Promise<Link[]> => {
+  return apiFetchAllPages<Link>("/links/", token);
 };
 
 // ---- Create a new link ----
@@ -191,11 +213,11 @@ export const getAdminStats = (token: string): Promise<AdminStats> => {
 };
 
 export const getAllUsers = (token: string): Promise<User[]> => {
-  return apiFetch("/admin/users", {}, token);
+  return apiFetchAllPages<User>("/admin/users", token);
 };
 
 export const getAllAdminLinks = (token: string): Promise<Link[]> => {
-  return apiFetch("/admin/links", {}, token);
+  return apiFetchAllPages<Link>("/admin/links", token);
 };
 
 // ---- Admin User Registration Stats ----